@@ -1,3 +1,4 @@
+import csv
 import logging
 import os
 import secrets
@@ -8,7 +9,9 @@ import time
 import webview
 from flask import (
     Flask,
+    abort,
     flash,
+    jsonify,
     redirect,
     render_template,
     send_file,
@@ -17,16 +20,31 @@ from flask import (
     request,
 )
 from flask_apscheduler import APScheduler
-from io import BytesIO
+from io import TextIOWrapper
 from sqlite3 import IntegrityError
+from lib.app.jobs import get_job_manager
+from lib.app.profiling import register_profile_routes, register_profiling
 from lib.app.utils import (
     SchedulerConfig,
     register_entity_routes,
     register_transaction_routes,
     open_export_file_picker,
-    export_to_xlsx,
 )
-from lib.db import utils, customer, purchase, sale, supplier
+from lib.db import (
+    utils,
+    cache,
+    customer,
+    importer,
+    instrumentation,
+    migrations,
+    pool,
+    profiles,
+    purchase,
+    recovery,
+    reports,
+    sale,
+    supplier,
+)
 
 log_path = utils.get_app_data_folder_path() / ".bookkeeppr.log"
 log_path.parent.mkdir(parents=True, exist_ok=True)
@@ -45,18 +63,22 @@ logger = logging.getLogger(__name__)
 app = Flask(__name__)
 app.secret_key = secrets.token_hex(32)
 app.config.from_object(SchedulerConfig())
+app.config["PAGINATE_PER_PAGE"] = 10
 
 # Start scheduler
 scheduler = APScheduler()
 scheduler.init_app(app)
 
+# Opt-in request profiling, listed at /debug/profiles in debug mode
+request_profiler = register_profiling(app)
+
 
 @app.context_processor
 def inject_paginate_per_page():
     """
     Always make current year available to app HTML-Jinja templates
     """
-    return {"paginate_per_page": 10}
+    return {"paginate_per_page": app.config["PAGINATE_PER_PAGE"]}
 
 
 @app.route("/")
@@ -113,37 +135,178 @@ register_transaction_routes(
 
 @app.route("/export", methods=["GET", "POST"])
 def export():
+    jobs = get_job_manager()
+    if request.method == "POST":
+        # Exports run on a worker thread; the page polls for progress
+        job = jobs.submit_export(
+            request.form.get("transaction_type"),
+            request.form.get("start_date"),
+            request.form.get("end_date"),
+        )
+        return redirect(url_for("export", job=job.id))
+
+    job = jobs.get(request.args.get("job", ""))
+    return render_template("export.html", job=job, debug=app.debug)
+
+
+def get_export_job_or_404(job_id):
+    job = get_job_manager().get(job_id)
+    if job is None:
+        abort(404)
+    return job
+
+
+@app.route("/export/jobs/<job_id>", methods=["GET"])
+def export_job_status(job_id):
+    return jsonify(get_export_job_or_404(job_id).to_dict())
+
+
+@app.route("/export/jobs/<job_id>/cancel", methods=["POST"])
+def cancel_export_job(job_id):
+    job = get_export_job_or_404(job_id)
+    get_job_manager().cancel(job.id)
+    return jsonify(job.to_dict())
+
+
+@app.route("/export/jobs/<job_id>/download", methods=["GET"])
+def download_export_job(job_id):
+    job = get_export_job_or_404(job_id)
+    if job.status != "done":
+        abort(409)
+    if not job.available:
+        abort(410)
+    return send_file(
+        job.path,
+        mimetype="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        as_attachment=True,
+        download_name=job.download_name,
+    )
+
+
+@app.route("/export/jobs/<job_id>/save", methods=["POST"])
+def save_export_job(job_id):
+    job = get_export_job_or_404(job_id)
+    if job.status != "done":
+        flash("Export is not ready to save.", "error")
+        return redirect(url_for("export", job=job.id))
+    if not job.available:
+        flash("Export has expired. Please export again.", "error")
+        return redirect(url_for("export"))
+
+    # Production mode: show file picker and save to disk
+    path = open_export_file_picker(job.transaction_name)
+    if not path:
+        flash("Export cancelled — no file selected.", "error")
+        return redirect(url_for("export", job=job.id))
+
+    job.save_to(path)
+    flash(f"Exported to {path}", "success")
+    return redirect(url_for("export"))
+
+
+@app.route("/import", methods=["GET", "POST"])
+def import_transactions():
+    report = None
     if request.method == "POST":
         transaction_type = request.form.get("transaction_type")
-        start_date = request.form.get("start_date")
-        end_date = request.form.get("end_date")
-
-        if app.debug:
-            # Debug mode: send file to browser
-            file_stream = BytesIO()
-            file_stream = export_to_xlsx(
-                transaction_type, start_date, end_date, file_stream
-            )
-            filename = f"{transaction_type}_record.xlsx"
-            return send_file(
-                file_stream,
-                mimetype="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-                as_attachment=True,
-                download_name=filename,
-            )
-        else:
-            # Production mode: show file picker and save to disk
-            path = open_export_file_picker(transaction_type)
-            if not path:
-                flash("Export cancelled — no file selected.", "error")
-                return redirect(url_for("export"))
-
-            _ = export_to_xlsx(transaction_type, start_date, end_date, path)
-
-            flash(f"Exported to {path}", "success")
-            return redirect(url_for("export"))
-
-    return render_template("export.html")
+        upload = request.files.get("file")
+        if not upload or not upload.filename:
+            flash("Import cancelled — no file selected.", "error")
+            return redirect(url_for("import_transactions"))
+
+        # Decode the upload as it is read rather than loading it whole
+        stream = TextIOWrapper(upload.stream, encoding="utf-8-sig", newline="")
+        try:
+            report = importer.import_csv(stream, transaction_type)
+        except (ValueError, UnicodeDecodeError, csv.Error) as err:
+            logger.warning(f"[IMPORT] {err}")
+            flash(f"Import failed: {err}", "error")
+            return redirect(url_for("import_transactions"))
+
+        message = (
+            f"Imported {report.rows_imported} of {report.rows_read} "
+            f"{transaction_type}."
+        )
+        if report.aborted:
+            message = f"Import stopped early. {message} {report.aborted}"
+        flash(
+            message,
+            "error" if report.rows_failed or report.aborted else "success",
+        )
+
+    return render_template("import.html", report=report)
+
+
+@app.route("/recovery", methods=["GET"])
+def recovery_list():
+    batches = recovery.RecoveryJournal().recoverable()
+    return render_template("recovery.html", batches=batches)
+
+
+@app.route("/recovery/<batch_id>/restore", methods=["POST"])
+def restore_deleted(batch_id):
+    try:
+        batch = recovery.RecoveryJournal().restore(batch_id)
+    except recovery.RestoreConflictError as err:
+        logger.warning(f"[RECOVERY] {err}")
+        flash(f"Restore blocked: {err}", "error")
+        return redirect(url_for("recovery_list"))
+    except ValueError as err:
+        flash(str(err), "error")
+        return redirect(url_for("recovery_list"))
+
+    if batch is None:
+        abort(404)
+    message = f"{batch.label} was restored"
+    if batch.cascaded:
+        message += f" with {batch.cascaded} transaction(s)"
+    flash(f"{message}.", "success")
+    return redirect(url_for("recovery_list"))
+
+
+@app.route("/reports/<transaction_name>", methods=["GET"])
+def period_report(transaction_name):
+    period = request.args.get("period", "month")
+    try:
+        summaries = reports.summarize(
+            transaction_name,
+            period,
+            request.args.get("start_date") or None,
+            request.args.get("end_date") or None,
+        )
+    except ValueError as err:
+        return jsonify({"error": str(err)}), 400
+    return jsonify(
+        {
+            "transaction_name": transaction_name.lower(),
+            "period": period,
+            "periods": [summary.to_dict() for summary in summaries],
+            "total": reports.total(summaries).to_dict(),
+        }
+    )
+
+
+def cache_stats():
+    return jsonify(cache.cache_stats())
+
+
+def query_stats():
+    if request.method == "DELETE":
+        instrumentation.reset_stats()
+    return jsonify(instrumentation.get_stats())
+
+
+def register_debug_routes():
+    """
+    Serves cache and query statistics, which expose recent SQL and its
+    parameters, and the request profiles. Only called in debug mode or
+    with instrumentation or profiling enabled.
+    """
+    register_profile_routes(app, request_profiler)
+    app.add_url_rule("/cache/stats", view_func=cache_stats, methods=["GET"])
+    app.add_url_rule(
+        "/debug/queries", view_func=query_stats, methods=["GET", "DELETE"]
+    )
 
 
 def run_flask(debug=False):
@@ -152,16 +315,31 @@ def run_flask(debug=False):
 
 def main():
     debug_mode = len(sys.argv) > 1 and sys.argv[1] == "debug"
+    if debug_mode:
+        instrumentation.enable()
+    if (
+        debug_mode
+        or instrumentation.is_enabled()
+        or app.config["PROFILE_REQUESTS"]
+    ):
+        register_debug_routes()
 
     try:
         utils.init_db()
+        migrations.migrate()
+        db_profile = profiles.get_profile_name()
+        db_settings = profiles.report_profile(
+            pool.get_connection(utils.get_db_path())
+        )
+        logger.info(f"[DB] Performance profile '{db_profile}': {db_settings}")
     except Exception as e:
         logger.error(f"[DB] Failed to initialize or verify database: {e}")
         sys.exit(1)
 
     try:
         logger.info("[CLEANUP] Running startup housekeeping...")
-        utils.delete_old_recovery_dbs(older_than_days=25)
+        recovery.import_legacy_recovery_dbs()
+        recovery.purge_recovery_journal(older_than_days=25)
     except Exception as e:
         logger.error(f"[CLEANUP] Startup housekeeping failed: {e}")
     scheduler.start()
@@ -186,6 +364,8 @@ def main():
             webview.start()
         finally:
             logger.info("[APP] Window closed, exiting...")
+            get_job_manager().shutdown()
+            pool.close_all_connections()
             sys.exit(0)
 
 
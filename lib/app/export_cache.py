@@ -0,0 +1,130 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+from pathlib import Path
+from typing import Optional
+from lib.db import utils as dbutils
+from lib.db.cache import get_data_version
+from lib.db.pool import get_connection
+
+logger = logging.getLogger(__name__)
+
+# Part of every cache key; change it whenever the workbook layout changes
+EXPORT_FORMAT = "xlsx-2"
+DEFAULT_MAX_BYTES = 200 * 1024 * 1024
+
+
+def get_export_cache_path() -> Path:
+    """Returns the folder holding cached export workbooks."""
+    return dbutils.get_app_data_folder_path() / "export_cache"
+
+
+def export_data_version(transaction_name: str) -> Optional[int]:
+    """Returns the current write counter of the table being exported."""
+    conn = get_connection(dbutils.get_db_path())
+    return get_data_version(conn, transaction_name.lower())
+
+
+class ExportCache:
+    """
+    Generated workbooks stored on disk, named by a hash of everything that
+    determines their contents: database, transaction type, date range,
+    format and the data version of the exported table. A write to the table changes the
+    data version, so stale workbooks are never looked up again and age out.
+
+    Files are evicted least recently used first once their total size
+    exceeds `max_bytes`; a file's modification time records its last use.
+    """
+
+    def __init__(
+        self, path: Optional[Path] = None, max_bytes: int = DEFAULT_MAX_BYTES
+    ):
+        self._path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    @property
+    def path(self) -> Path:
+        return self._path or get_export_cache_path()
+
+    @staticmethod
+    def key(
+        transaction_name: str,
+        start_date: str,
+        end_date: str,
+        data_version: int,
+        db_path: Path,
+    ) -> str:
+        payload = json.dumps(
+            [
+                EXPORT_FORMAT,
+                str(Path(db_path).resolve()),
+                transaction_name.lower(),
+                start_date,
+                end_date,
+                data_version,
+            ]
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _file(self, key: str) -> Path:
+        return self.path / f"{key}.xlsx"
+
+    def get(self, key: str) -> Optional[Path]:
+        """Returns the cached workbook for `key`, or None."""
+        with self._lock:
+            file = self._file(key)
+            try:
+                os.utime(file)
+            except FileNotFoundError:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return file
+
+    def put(self, key: str, source: Path) -> Path:
+        """Moves the workbook at `source` into the cache and returns its new path."""
+        with self._lock:
+            self.path.mkdir(parents=True, exist_ok=True)
+            file = self._file(key)
+            os.replace(source, file)
+            os.utime(file)
+            self._evict(keep=file)
+            return file
+
+    def _evict(self, keep: Path) -> None:
+        entries = []
+        for file in self.path.glob("*.xlsx"):
+            try:
+                stat = file.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, file))
+        total = sum(size for _, size, _ in entries)
+        for _, size, file in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            if file == keep:
+                continue
+            try:
+                file.unlink(missing_ok=True)
+            except OSError as err:
+                # e.g. the workbook is open in another program on Windows
+                logger.warning(
+                    f"[EXPORT] Could not evict cached export {file.name}: {err}"
+                )
+                continue
+            total -= size
+            logger.info(f"[EXPORT] Evicted cached export {file.name}")
+
+    def size(self) -> int:
+        return sum(file.stat().st_size for file in self.path.glob("*.xlsx"))
+
+    def clear(self) -> None:
+        with self._lock:
+            for file in self.path.glob("*.xlsx"):
+                file.unlink(missing_ok=True)
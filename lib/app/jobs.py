@@ -0,0 +1,279 @@
+import logging
+import shutil
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, Optional
+from lib.db import utils as dbutils
+from lib.app.export_cache import ExportCache, export_data_version
+from lib.app.utils import export_to_xlsx
+
+logger = logging.getLogger(__name__)
+
+# Finished jobs beyond this many are forgotten, oldest first, and their
+# uncached files deleted
+MAX_FINISHED_JOBS = 20
+
+
+class ExportCancelled(Exception):
+    """Raised inside a running export when its job has been cancelled."""
+
+
+def get_exports_path() -> Path:
+    """Returns the folder holding the files written by export jobs."""
+    return dbutils.get_app_data_folder_path() / "exports"
+
+
+class ExportJob:
+    """
+    An export running on the job manager's worker pool.
+
+    `status` moves from "pending" to "running" and then to one of "done",
+    "cancelled" or "failed". Progress counters are updated by the worker
+    thread and read by request threads. A job with a `cache_key` moves its
+    finished workbook into `cache`, which then owns the file.
+    """
+
+    def __init__(
+        self,
+        transaction_name: str,
+        start_date: str,
+        end_date: str,
+        cache: Optional[ExportCache] = None,
+        cache_key: Optional[str] = None,
+    ):
+        self.id = uuid.uuid4().hex
+        self.transaction_name = transaction_name
+        self.start_date = start_date
+        self.end_date = end_date
+        self.status = "pending"
+        self.rows_written = 0
+        self.sheets_done = 0
+        self.error = None
+        self.path = get_exports_path() / f"{self.id}.xlsx"
+        self.cache = cache
+        self.cache_key = cache_key
+        self.cached = False
+        self.created_at = time.time()
+        self.finished_at = None
+        self._cancel = threading.Event()
+
+    @property
+    def finished(self) -> bool:
+        return self.status in ("done", "cancelled", "failed")
+
+    @property
+    def download_name(self) -> str:
+        return f"{self.transaction_name}_record.xlsx"
+
+    def cancel(self) -> None:
+        self._cancel.set()
+
+    def report_progress(self, rows_written: int, sheets_done: int) -> None:
+        """Progress callback for export_to_xlsx, which also checks for cancellation."""
+        if self._cancel.is_set():
+            raise ExportCancelled()
+        self.rows_written = rows_written
+        self.sheets_done = sheets_done
+
+    def run(self) -> None:
+        if self._cancel.is_set():
+            self._finish("cancelled")
+            return
+        self.status = "running"
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            export_to_xlsx(
+                self.transaction_name,
+                self.start_date,
+                self.end_date,
+                self.path,
+                progress=self.report_progress,
+            )
+        except ExportCancelled:
+            self.path.unlink(missing_ok=True)
+            self._finish("cancelled")
+        except Exception as err:
+            logger.error(f"[EXPORT] Job {self.id} failed: {err}")
+            self.error = str(err)
+            self.path.unlink(missing_ok=True)
+            self._finish("failed")
+        else:
+            if self.cache_key:
+                self._store_in_cache()
+            if self.path.exists():
+                self._finish("done")
+            else:
+                self.error = "The finished export could not be stored"
+                self._finish("failed")
+
+    def _store_in_cache(self) -> None:
+        """
+        Moves the finished workbook into the cache. If that fails, e.g.
+        because Windows holds a cached file open, the job keeps serving its
+        own uncached copy.
+        """
+        try:
+            self.path = self.cache.put(self.cache_key, self.path)
+            self.cached = True
+        except OSError as err:
+            logger.warning(
+                f"[EXPORT] Job {self.id} could not cache its export: {err}"
+            )
+
+    def _finish(self, status: str) -> None:
+        self.finished_at = time.time()
+        self.status = status
+        logger.info(
+            f"[EXPORT] Job {self.id} {status} after "
+            f"{self.finished_at - self.created_at:.2f}s "
+            f"({self.rows_written} rows, {self.sheets_done} sheets)"
+        )
+
+    def serve_from_cache(self, path: Path) -> None:
+        """Completes the job with a workbook already in the cache."""
+        self.path = path
+        self.cached = True
+        self._finish("done")
+
+    @property
+    def available(self) -> bool:
+        """Whether the finished workbook can still be downloaded or saved."""
+        return self.status == "done" and self.path.exists()
+
+    def discard(self) -> None:
+        """Deletes the job's file, unless it belongs to the export cache."""
+        if not self.cached:
+            self.path.unlink(missing_ok=True)
+
+    def save_to(self, destination: Path) -> None:
+        """Copies the finished export to `destination`."""
+        shutil.copyfile(self.path, destination)
+
+    def to_dict(self) -> dict:
+        return {
+            "id": self.id,
+            "transaction_name": self.transaction_name,
+            "start_date": self.start_date,
+            "end_date": self.end_date,
+            "status": self.status,
+            "rows_written": self.rows_written,
+            "sheets_done": self.sheets_done,
+            "error": self.error,
+            "cached": self.cached,
+        }
+
+
+class JobManager:
+    """
+    Runs export jobs on a small pool of worker threads. Exports already in
+    `cache` for the current data version finish at once without a worker.
+    Once shut down, the manager accepts no more jobs.
+    """
+
+    def __init__(
+        self, max_workers: int = 2, cache: Optional[ExportCache] = None
+    ):
+        self.max_workers = max_workers
+        self.cache = cache or ExportCache()
+        self._executor = None
+        self._jobs: Dict[str, ExportJob] = {}
+        self._lock = threading.Lock()
+        self._closed = False
+
+    def submit_export(
+        self, transaction_name: str, start_date: str, end_date: str
+    ) -> ExportJob:
+        """
+        Starts an export, or completes it at once from the cache.
+        :param str transaction_name: sales or purchases
+        :param str start_date: First day to export
+        :param str end_date: Last day to export
+        :return: The job, whose status can be polled
+        :raises RuntimeError: If the manager has been shut down
+        """
+        data_version = export_data_version(transaction_name)
+        cache_key = None
+        if data_version is not None:
+            cache_key = self.cache.key(
+                transaction_name,
+                start_date,
+                end_date,
+                data_version,
+                dbutils.get_db_path(),
+            )
+        job = ExportJob(
+            transaction_name, start_date, end_date, self.cache, cache_key
+        )
+
+        cached = self.cache.get(cache_key) if cache_key else None
+        if cached:
+            job.serve_from_cache(cached)
+            with self._lock:
+                self._check_open()
+                self._jobs[job.id] = job
+                self._prune()
+            return job
+
+        # Submitted under the lock, so that shutdown() either sees the job
+        # to cancel and wait for, or has already closed the manager
+        with self._lock:
+            self._check_open()
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_workers,
+                    thread_name_prefix="export",
+                )
+            self._jobs[job.id] = job
+            self._prune()
+            self._executor.submit(job.run)
+        logger.info(
+            f"[EXPORT] Job {job.id} queued: {transaction_name} "
+            f"{start_date} to {end_date}"
+        )
+        return job
+
+    def get(self, job_id: str) -> Optional[ExportJob]:
+        return self._jobs.get(job_id)
+
+    def cancel(self, job_id: str) -> Optional[ExportJob]:
+        job = self.get(job_id)
+        if job and not job.finished:
+            job.cancel()
+        return job
+
+    def shutdown(self) -> None:
+        """Cancels outstanding jobs, waits for the workers and deletes job files."""
+        with self._lock:
+            self._closed = True
+            for job in self._jobs.values():
+                job.cancel()
+            executor, self._executor = self._executor, None
+        if executor:
+            executor.shutdown(wait=True)
+        with self._lock:
+            for job in self._jobs.values():
+                job.discard()
+            self._jobs.clear()
+
+    def _check_open(self) -> None:
+        if self._closed:
+            raise RuntimeError("The export job manager has been shut down")
+
+    def _prune(self) -> None:
+        finished = sorted(
+            (job for job in self._jobs.values() if job.finished),
+            key=lambda job: job.finished_at,
+        )
+        for job in finished[: max(0, len(finished) - MAX_FINISHED_JOBS)]:
+            del self._jobs[job.id]
+            job.discard()
+
+
+_manager = JobManager()
+
+
+def get_job_manager() -> JobManager:
+    return _manager
@@ -0,0 +1,239 @@
+import cProfile
+import logging
+import os
+import pstats
+import threading
+import time
+import uuid
+from collections import deque
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import List, Optional
+from flask import Flask, g, render_template, request, send_from_directory
+from lib.db import utils as dbutils
+
+logger = logging.getLogger(__name__)
+
+PROFILE_ENV_VAR = "BOOKKEEPPR_PROFILE_REQUESTS"
+# Profiles kept on disk and listed on the index page
+MAX_PROFILES = 100
+# Functions listed per request, by cumulative time
+TOP_FUNCTIONS = 10
+
+# Endpoints which are never profiled
+UNPROFILED_ENDPOINTS = ("static", "profile_index", "profile_file")
+
+
+def get_profiles_path() -> Path:
+    """Returns the folder holding saved request profiles."""
+    return dbutils.get_app_data_folder_path() / "profiles"
+
+
+@dataclass
+class RequestProfile:
+    name: str
+    method: str
+    path: str
+    status: int
+    elapsed_ms: float
+    started_at: str
+    hot_functions: List[dict] = field(default_factory=list)
+
+
+def hot_functions(stats: pstats.Stats, limit: int = TOP_FUNCTIONS) -> list:
+    """
+    Returns the `limit` functions with the most cumulative time in `stats`,
+    with their call counts and own and cumulative times in milliseconds.
+    """
+    functions = []
+    for (file, line, name), (
+        _,
+        calls,
+        own,
+        cumulative,
+        _,
+    ) in stats.stats.items():
+        if name == "<method 'disable' of '_lsprof.Profiler' objects>":
+            continue
+        functions.append(
+            {
+                "function": (
+                    name
+                    if file == "~"
+                    else f"{name} ({Path(file).name}:{line})"
+                ),
+                "calls": calls,
+                "own_ms": own * 1000,
+                "cumulative_ms": cumulative * 1000,
+            }
+        )
+    functions.sort(key=lambda f: f["cumulative_ms"], reverse=True)
+    return functions[:limit]
+
+
+class RequestProfiler:
+    """
+    cProfile profiles of individual requests. Each profile is saved as
+    <name>.prof, which pstats or snakeviz can open, and summarised in
+    memory for the index page. Only the newest `max_profiles` are kept.
+    """
+
+    def __init__(
+        self, path: Optional[Path] = None, max_profiles: int = MAX_PROFILES
+    ):
+        self._path = path
+        self.max_profiles = max_profiles
+        self._recent = deque(maxlen=max_profiles)
+        self._lock = threading.Lock()
+        # Held while a request is being profiled
+        self._active = threading.Lock()
+
+    @property
+    def path(self) -> Path:
+        return self._path or get_profiles_path()
+
+    def start(self) -> Optional[cProfile.Profile]:
+        """
+        Starts profiling, or returns None if a profile is already running.
+        Python allows one active profiler at a time, and from 3.12 it
+        profiles every thread, so a profile also includes any work other
+        threads did while the request ran.
+        """
+        if not self._active.acquire(blocking=False):
+            return None
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError as err:
+            # Another profiling tool, such as a debugger, is active
+            self._active.release()
+            logger.debug(f"[PROFILE] Could not start profiling: {err}")
+            return None
+        return profiler
+
+    def stop(self, profiler: cProfile.Profile) -> None:
+        """Stops `profiler`, letting the next request be profiled."""
+        try:
+            profiler.disable()
+        finally:
+            self._active.release()
+
+    def finish(
+        self,
+        profiler: cProfile.Profile,
+        method: str,
+        path: str,
+        status: int,
+        elapsed_ms: float,
+    ) -> RequestProfile:
+        """Stops `profiler`, then saves and records its profile."""
+        self.stop(profiler)
+        stats = pstats.Stats(profiler)
+        profile = RequestProfile(
+            name=f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:8]}",
+            method=method,
+            path=path,
+            status=status,
+            elapsed_ms=elapsed_ms,
+            started_at=time.strftime("%Y-%m-%d %H:%M:%S"),
+            hot_functions=hot_functions(stats),
+        )
+        with self._lock:
+            self.path.mkdir(parents=True, exist_ok=True)
+            stats.dump_stats(self.path / f"{profile.name}.prof")
+            self._recent.append(profile)
+            self._evict()
+        logger.info(
+            f"[PROFILE] {method} {path} took {elapsed_ms:.1f} ms, "
+            f"saved as {profile.name}.prof"
+        )
+        return profile
+
+    def _evict(self) -> None:
+        files = sorted(self.path.glob("*.prof"), key=os.path.getmtime)
+        for file in files[: max(len(files) - self.max_profiles, 0)]:
+            file.unlink(missing_ok=True)
+
+    def slowest(self) -> List[RequestProfile]:
+        """Returns the recent profiles, slowest first."""
+        with self._lock:
+            return sorted(
+                self._recent, key=lambda p: p.elapsed_ms, reverse=True
+            )
+
+
+def should_profile(app: Flask) -> bool:
+    """
+    Whether to profile the current request: every request when
+    PROFILE_REQUESTS is configured, otherwise in debug mode only requests
+    with ?profile=1 or an X-Profile: 1 header.
+    """
+    if request.endpoint in UNPROFILED_ENDPOINTS:
+        return False
+    if app.config.get("PROFILE_REQUESTS"):
+        return True
+    return app.debug and "1" in (
+        request.args.get("profile"),
+        request.headers.get("X-Profile"),
+    )
+
+
+def register_profiling(
+    app: Flask, profiler: Optional[RequestProfiler] = None
+) -> RequestProfiler:
+    """
+    Adds opt-in request profiling to `app`. The index of the slowest
+    recent requests is added separately by register_profile_routes().
+    """
+    profiler = profiler or RequestProfiler()
+    app.config.setdefault(
+        "PROFILE_REQUESTS",
+        os.getenv(PROFILE_ENV_VAR, "") not in ("", "0"),
+    )
+
+    @app.before_request
+    def start_profile():
+        if should_profile(app) and (request_profiler := profiler.start()):
+            g.request_profile = (request_profiler, time.perf_counter())
+
+    @app.after_request
+    def finish_profile(response):
+        if started := g.pop("request_profile", None):
+            request_profiler, start = started
+            profiler.finish(
+                request_profiler,
+                request.method,
+                request.full_path.rstrip("?"),
+                response.status_code,
+                (time.perf_counter() - start) * 1000,
+            )
+        return response
+
+    @app.teardown_request
+    def stop_profile(exc):
+        # after_request is skipped when the view raises
+        if started := g.pop("request_profile", None):
+            profiler.stop(started[0])
+
+    return profiler
+
+
+def register_profile_routes(app: Flask, profiler: RequestProfiler) -> None:
+    """
+    Lists the slowest recent requests at /debug/profiles, with links to
+    download each saved profile.
+    """
+
+    @app.route("/debug/profiles", methods=["GET"])
+    def profile_index():
+        return render_template(
+            "profiles.html",
+            profiles=profiler.slowest(),
+            enabled=app.config["PROFILE_REQUESTS"],
+        )
+
+    @app.route("/debug/profiles/<name>.prof", methods=["GET"])
+    def profile_file(name):
+        return send_from_directory(
+            profiler.path, f"{name}.prof", as_attachment=True
+        )
@@ -1,11 +1,12 @@
 import calendar
 import logging
 import webview
-from collections import defaultdict
 from datetime import datetime, time
 from io import BytesIO
+from itertools import groupby
 from flask import (
     flash,
+    jsonify,
     make_response,
     redirect,
     render_template,
@@ -13,13 +14,19 @@ from flask import (
     request,
 )
 from openpyxl import Workbook
-from openpyxl.styles import Font, PatternFill
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font, NamedStyle, PatternFill
 from openpyxl.utils import get_column_letter
 from pathlib import Path
 from sqlite3 import IntegrityError
+from typing import Callable, Optional
 from webview import FileDialog
-from lib.db import utils as dbutils
+from lib.db import reports
+from lib.db.entity import SUGGEST_LIMIT
+from lib.db.money import from_pence
+from lib.db.pagination import fetch_page
 from lib.db.purchase import Purchase, PurchaseRepository
+from lib.db.recovery import RecoveryJournal
 from lib.db.sale import Sale, SaleRepository
 
 logger = logging.getLogger(__name__)
@@ -34,7 +41,7 @@ class SchedulerConfig:
     JOBS = [
         {
             "id": "daily_cleanup",
-            "func": "lib.db.utils:delete_old_recovery_dbs",
+            "func": "lib.db.recovery:purge_recovery_journal",
             "args": (30,),  # older_than_days
             "trigger": "cron",
             "hour": 12,
@@ -84,46 +91,37 @@ def create_single_entity_view(entity_name, model_class, repo_class):
                 return response
             case "DELETE":
                 # Assume by this point we have safely confirmed the delete command
-                entity = repo.read(id=entity_id)
-                if not entity:
-                    err_msg = f"{entity_name[:-1].capitalize()} not found."
+                # The entity, its transactions and their backup are deleted
+                # together in one transaction
+                label = f"{entity_name[:-1]} {entity_id}"
+                try:
+                    batch = RecoveryJournal(repo.db_path).delete_entity(
+                        entity_name, entity_id
+                    )
+                except IntegrityError as err:
+                    err_msg = (
+                        f"Delete blocked due to data constraint: {str(err)}"
+                    )
                     logger.warning(f"[DELETE] {err_msg}")
                     flash(err_msg, "error")
-                    response = make_response(err_msg, 404)
-                    response.headers["Content-Type"] = (
-                        "text/plain; charset=utf-8"
-                    )
-                    return response
-
-                safe_to_delete = False
-                # Create the recovery DB
-                try:
-                    dbutils.backup_deleted_entity(entity, repo_class)
-                    safe_to_delete = True
+                    response = make_response(err_msg, 409)
                 except Exception as err:
-                    err_msg = f"Data backup failed. Delete operation on {entity.name} aborted."
+                    err_msg = f"Data backup failed. Delete operation on {label} aborted."
                     logger.warning(f"[DELETE] {err_msg}.\n" + f"{err}")
                     flash(err_msg, "error")
                     response = make_response(err_msg, 500)
-
-                if safe_to_delete:
-                    try:
-                        repo.delete(entity.id)
+                else:
+                    if batch is None:
+                        err_msg = f"{entity_name[:-1].capitalize()} not found."
+                        logger.warning(f"[DELETE] {err_msg}")
+                        flash(err_msg, "error")
+                        response = make_response(err_msg, 404)
+                    else:
                         flash(
-                            f"{entity.name} was successfully deleted.",
+                            f"{batch.record['name']} was successfully deleted.",
                             "success",
                         )
                         response = make_response("OK", 204)
-                    except IntegrityError as err:
-                        err_msg = f"Delete blocked due to data constraint: {str(err)}"
-                        logger.warning(f"[DELETE] {err_msg}")
-                        flash(err_msg, "error")
-                        response = make_response(err_msg, 409)
-                    except Exception as err:
-                        err_msg = f"Unexpected error: {str(err)}"
-                        logger.error(f"[DELETE] {err_msg}")
-                        flash(f"{entity.name} could not be deleted.", "error")
-                        response = make_response(f"{err_msg}", 500)
 
                 response.headers["Content-Type"] = "text/plain; charset=utf-8"
                 return response
@@ -151,6 +149,20 @@ def register_entity_routes(
             template_name, query=query, **{entity_name: results}
         )
 
+    @app.route(
+        f"/{entity_name}/suggest",
+        endpoint=f"suggest_{entity_name}",
+        methods=["GET"],
+    )
+    def suggest_entities():
+        # Names starting with q, for the autocomplete on transaction forms
+        limit = request.args.get("limit", SUGGEST_LIMIT, type=int)
+        limit = max(1, min(limit, SUGGEST_LIMIT))
+        matches = repo_class().suggest(request.args.get("q", ""), limit)
+        return jsonify(
+            [{"id": entity.id, "name": entity.name} for entity in matches]
+        )
+
     @app.route(
         create_endpoint, methods=["POST"], endpoint=create_endpoint_name
     )
@@ -240,10 +252,10 @@ def build_filters(model_class, request):
 
 
 def extract_transaction_to_create(
-    form, model_class, entity_class_name, entities
+    form, model_class, entity_class_name, entity_repo
 ):
     entity_name = form.get(f"{entity_class_name.lower()}_name")
-    entity_obj = next((e for e in entities if e.name == entity_name), None)
+    entity_obj = entity_repo.lookup(name=entity_name) if entity_name else None
     if not entity_obj:
         raise ValueError(f"Invalid {entity_class_name.lower()} selected")
 
@@ -294,8 +306,6 @@ def create_single_transaction_view(
     entity_repo_class,
 ):
     def view(**kwargs):
-        entity_repo = entity_repo_class()
-        entities = entity_repo.all()
         transaction_id = kwargs[f"{transaction_name[:-1]}_id"]
         repo = repo_class()
         match request.method:
@@ -305,13 +315,7 @@ def create_single_transaction_view(
                 context_key = f"{transaction_name[:-1]}_obj"
 
                 if obj:
-                    return render_template(
-                        template,
-                        **{
-                            context_key: obj,
-                            f"{entity_class_name.lower()}s": entities,
-                        },
-                    )
+                    return render_template(template, **{context_key: obj})
                 else:
                     flash(
                         f"{transaction_name[:-1].capitalize()} does not exist",
@@ -352,6 +356,15 @@ def create_single_transaction_view(
                         else:
                             updates[key] = val
 
+                    entity_key = entity_class_name.lower()
+                    if entity_name := updates.get(f"{entity_key}_name"):
+                        entity_obj = entity_repo_class().lookup(
+                            name=entity_name
+                        )
+                        if not entity_obj:
+                            raise ValueError(f"Invalid {entity_key} selected")
+                        updates[f"{entity_key}_id"] = entity_obj.id
+
                     for attr, val in updates.items():
                         setattr(obj, attr, val)
 
@@ -367,61 +380,48 @@ def create_single_transaction_view(
                     flash(err_msg, "error")
                     return make_response(err_msg, 500)
             case "DELETE":
-                transaction = repo.read(id=transaction_id)
-                if not transaction:
+                # The transaction and its backup are deleted together
+                label = f"{transaction_name[:-1]} {transaction_id}"
+                try:
+                    batch = RecoveryJournal(repo.db_path).delete_transaction(
+                        transaction_name, transaction_id
+                    )
+                except IntegrityError as err:
                     err_msg = (
-                        f"{transaction_name[:-1].capitalize()} not found."
+                        f"Delete blocked due to data constraint: {str(err)}"
                     )
                     logger.warning(f"[DELETE] {err_msg}")
                     flash(err_msg, "error")
-                    response = make_response(err_msg, 404)
-                    response.headers["Content-Type"] = (
-                        "text/plain; charset=utf-8"
-                    )
-                    return response
-
-                transaction_invoice = None
-                match model_class.__name__:
-                    case "Sale":
-                        transaction_invoice = transaction.invoice_number
-                    case "Purchase":
-                        transaction_invoice = (
-                            transaction.internal_invoice_number
-                        )
-
-                safe_to_delete = False
-                try:
-                    dbutils.backup_deleted_transactions(
-                        [transaction], repo_class
-                    )
-                    safe_to_delete = True
+                    response = make_response(err_msg, 409)
                 except Exception as err:
-                    err_msg = f"Data backup failed. Delete operation on {transaction_invoice} aborted."
+                    err_msg = f"Data backup failed. Delete operation on {label} aborted."
                     logger.warning(f"[DELETE] {err_msg}.\n" + f"{err}")
                     flash(err_msg, "error")
                     response = make_response(err_msg, 500)
-
-                if safe_to_delete:
-                    try:
-                        repo.delete(transaction.id)
-                        flash(
-                            f"{transaction_invoice} was successfully deleted.",
-                            "success",
+                else:
+                    if batch is None:
+                        err_msg = (
+                            f"{transaction_name[:-1].capitalize()} not found."
                         )
-                        response = make_response("OK", 204)
-                    except IntegrityError as err:
-                        err_msg = f"Delete blocked due to data constraint: {str(err)}"
                         logger.warning(f"[DELETE] {err_msg}")
                         flash(err_msg, "error")
-                        response = make_response(err_msg, 409)
-                    except Exception as err:
-                        err_msg = f"Unexpected error: {str(err)}"
-                        logger.error(f"[DELETE] {err_msg}")
+                        response = make_response(err_msg, 404)
+                    else:
+                        transaction_invoice = None
+                        match model_class.__name__:
+                            case "Sale":
+                                transaction_invoice = batch.record[
+                                    "invoice_number"
+                                ]
+                            case "Purchase":
+                                transaction_invoice = batch.record[
+                                    "internal_invoice_number"
+                                ]
                         flash(
-                            f"{transaction_invoice} could not be deleted.",
-                            "error",
+                            f"{transaction_invoice} was successfully deleted.",
+                            "success",
                         )
-                        response = make_response(f"{err_msg}", 500)
+                        response = make_response("OK", 204)
 
                 response.headers["Content-Type"] = "text/plain; charset=utf-8"
                 return response
@@ -451,22 +451,35 @@ def register_transaction_routes(
     @app.route(list_endpoint, endpoint=list_endpoint_name, methods=["GET"])
     def list_transactions():
         filters = build_filters(model_class, request)
-        all_transactions = repo.all()
-
-        vat_options = sorted(set(t.vat_percent for t in all_transactions))
-        payment_options = sorted(
-            set(t.payment_method for t in all_transactions)
-        )
-        transactions = (
-            repo.search(filters) if any(filters.values()) else all_transactions
+        page = fetch_page(
+            repo,
+            filters,
+            per_page=app.config.get("PAGINATE_PER_PAGE", 10),
+            token=request.args.get("cursor"),
         )
 
+        if request.args.get("partial"):
+            # pagination.js swaps in the rows for the requested page
+            return jsonify(
+                html=render_template(
+                    f"{transaction_name}_rows.html",
+                    **{transaction_name: page.items},
+                ),
+                page=page.page,
+                total=page.total,
+                next=page.next_cursor,
+                prev=page.prev_cursor,
+            )
+
+        facets = repo.facets(filters)
+
         return render_template(
             template_name,
             filters=filters,
-            **{transaction_name: transactions},
-            vat_options=vat_options,
-            payment_options=payment_options,
+            page=page,
+            **{transaction_name: page.items},
+            vat_options=facets["vat_percent"],
+            payment_options=facets["payment_method"],
         )
 
     @app.route(
@@ -474,16 +487,11 @@ def register_transaction_routes(
     )
     def create_transaction():
         entity_repo = entity_repo_class()
-        entities = entity_repo.all()
-        render = render_template(
-            f"create_{transaction_name[:-1]}.html",
-            **{f"{entity_class_name.lower()}s": entities},
-        )
 
         if request.method == "POST":
             try:
                 new_obj = extract_transaction_to_create(
-                    request.form, model_class, entity_class_name, entities
+                    request.form, model_class, entity_class_name, entity_repo
                 )
                 repo.create(new_obj)
                 flash(
@@ -498,7 +506,7 @@ def register_transaction_routes(
                 logger.warning(err)
                 flash(f"Unexpected Error: {str(err)}", "error")
 
-        return render
+        return render_template(f"create_{transaction_name[:-1]}.html")
 
     app.add_url_rule(
         rule=by_id_endpoint,
@@ -515,40 +523,246 @@ def register_transaction_routes(
 
 
 ###
-# def export_to_xlsx(
-#     transaction_type: str, start_date: str, end_date: str
-# ) -> BytesIO:
-#     wb = Workbook()
-#     ws = wb.active
-#     ws.title = "Summary"
-#     ws.append(["Transaction Type", "Start Date", "End Date"])
-#     ws.append([transaction_type, start_date, end_date])
+# Rows are fetched from the database this many at a time while exporting
+EXPORT_BATCH_SIZE = 1000
+# Export progress is reported after this many rows, and after every sheet
+EXPORT_PROGRESS_INTERVAL = 500
+
+# (header, named style, width) for each column of a monthly sheet. Widths
+# are fixed because a write-only sheet needs them before its first row.
+SALES_EXPORT_COLUMNS = [
+    ("Customer", None, 30),
+    ("Invoice Number", None, 18),
+    ("Net", "Export Currency", 12),
+    ("VAT%", "Export Percent", 8),
+    ("VAT", "Export Currency", 12),
+    ("Total", "Export Currency", 12),
+    ("Payment Method", None, 18),
+    ("Date", None, 12),
+]
+PURCHASES_EXPORT_COLUMNS = [
+    ("Supplier", None, 30),
+    ("Invoice Number", None, 18),
+    ("Net", "Export Currency", 12),
+    ("Goods", "Export Currency", 12),
+    ("Utilities", "Export Currency", 12),
+    ("Motor Expenses", "Export Currency", 16),
+    ("Sundries", "Export Currency", 12),
+    ("Miscellaneous", "Export Currency", 15),
+    ("VAT%", "Export Percent", 8),
+    ("VAT", "Export Currency", 12),
+    ("Total", "Export Currency", 12),
+    ("Supplier Invoice", None, 18),
+    ("Payment Method", None, 18),
+    ("Date", None, 12),
+]
+
+
+def register_export_styles(wb: Workbook) -> None:
+    """
+    Adds the named styles used by exported sheets to `wb`, so each cell
+    refers to a shared style instead of carrying its own formatting.
+    """
+    wb.add_named_style(
+        NamedStyle(
+            name="Export Header",
+            font=Font(bold=True, color="FFFFFF"),
+            fill=PatternFill(
+                start_color="5E1791", end_color="5E1791", fill_type="solid"
+            ),
+        )
+    )
+    wb.add_named_style(
+        NamedStyle(name="Export Currency", number_format="£#,##0.00")
+    )
+    wb.add_named_style(
+        NamedStyle(name="Export Percent", number_format="0%;-0%;0%")
+    )
+
+
+def sale_export_row(i: int, ts: datetime, t: Sale) -> list:
+    return [
+        t.customer_name,
+        t.invoice_number,
+        t.net_amount,
+        t.vat_percent,
+        f"=C{i}*D{i}",
+        f"=C{i}+E{i}",
+        t.payment_method,
+        ts.strftime("%d/%m/%Y"),
+    ]
+
+
+def sale_export_totals(last: int) -> list:
+    return [
+        "TOTAL",
+        None,
+        f"=SUM(C2:C{last})",
+        None,
+        f"=SUM(E2:E{last})",
+        f"=SUM(F2:F{last})",
+        None,
+        None,
+    ]
+
+
+def purchase_export_row(i: int, ts: datetime, t: Purchase) -> list:
+    return [
+        t.supplier_name,
+        t.internal_invoice_number,
+        t.net_amount,
+        t.goods,
+        t.utilities,
+        t.motor_expenses,
+        t.sundries,
+        t.miscellaneous,
+        t.vat_percent,
+        f"=C{i}*I{i}",
+        f"=C{i}+J{i}",
+        t.supplier_invoice_code,
+        t.payment_method,
+        ts.strftime("%d/%m/%Y"),
+    ]
+
+
+def purchase_export_totals(last: int) -> list:
+    return [
+        "TOTAL",
+        None,
+        f"=SUM(C2:C{last})",
+        f"=SUM(D2:D{last})",
+        f"=SUM(E2:E{last})",
+        f"=SUM(F2:F{last})",
+        f"=SUM(G2:G{last})",
+        f"=SUM(H2:H{last})",
+        None,
+        f"=SUM(J2:J{last})",
+        f"=SUM(K2:K{last})",
+        None,
+        None,
+        None,
+    ]
 
-#     file_stream = BytesIO()
-#     wb.save(file_stream)
-#     file_stream.seek(0)
-#     return file_stream
+
+def write_front_sheet_totals(ws, summaries: list) -> None:
+    """
+    Appends a row of totals per month, and a grand total, to the front
+    sheet. `summaries` come from lib.db.reports, which reads them from the
+    monthly totals table rather than from every transaction.
+    """
+    categories = list(summaries[0].categories) if summaries else []
+    header = ["Month", "Transactions", "Net", "VAT", "Total"]
+    header += [name.replace("_", " ").title() for name in categories]
+    cells = []
+    for name in header:
+        cell = WriteOnlyCell(ws, value=name)
+        cell.style = "Export Header"
+        cells.append(cell)
+    ws.append(cells)
+
+    labelled = []
+    for summary in summaries:
+        year, month = summary.period.split("-")
+        labelled.append(
+            (f"{calendar.month_abbr[int(month)]} '{year[-2:]}", summary)
+        )
+    labelled.append(("TOTAL", reports.total(summaries)))
+
+    for label, summary in labelled:
+        amounts = [summary.net, summary.vat, summary.gross]
+        amounts += [summary.categories.get(name, 0) for name in categories]
+        row = [label, summary.count]
+        for amount in amounts:
+            cell = WriteOnlyCell(ws, value=from_pence(amount))
+            cell.style = "Export Currency"
+            row.append(cell)
+        ws.append(row)
+
+
+def write_month_sheet(
+    wb: Workbook,
+    title: str,
+    columns: list,
+    rows,
+    make_totals: Callable[[int], list],
+    progress: Optional[Callable[[int], None]] = None,
+) -> int:
+    """
+    Streams a header row, then `rows` as they are produced, then the row
+    returned by `make_totals(last_row)` into a new write-only sheet, so no
+    more than one row is held in memory.
+    `progress(n)` is called every EXPORT_PROGRESS_INTERVAL rows with the
+    number of rows written to the sheet so far.
+    :return: the number of rows written, excluding the header and totals
+    """
+    ws = wb.create_sheet(title=title)
+    for col, (_, _, width) in enumerate(columns, start=1):
+        ws.column_dimensions[get_column_letter(col)].width = width
+
+    header = []
+    for name, _, _ in columns:
+        cell = WriteOnlyCell(ws, value=name)
+        cell.style = "Export Header"
+        header.append(cell)
+    ws.append(header)
+
+    styles = [style for _, style, _ in columns]
+
+    def append(row):
+        cells = []
+        for value, style in zip(row, styles):
+            if style is None or value is None:
+                cells.append(value)
+            else:
+                cell = WriteOnlyCell(ws, value=value)
+                cell.style = style
+                cells.append(cell)
+        ws.append(cells)
+
+    written = 0
+    for written, row in enumerate(rows, start=1):
+        if progress and written % EXPORT_PROGRESS_INTERVAL == 0:
+            progress(written)
+        append(row)
+    append(make_totals(written + 1))
+    return written
 
 
 def export_to_xlsx(
-    transaction_name: str, start_date: str, end_date: str, file: Path | BytesIO
+    transaction_name: str,
+    start_date: str,
+    end_date: str,
+    file: Path | BytesIO,
+    progress: Optional[Callable[[int, int], None]] = None,
 ) -> bool | BytesIO:
     """
     Creates a spreadsheet including transactions of type `transaction_name` which
     are timestamped between `start_date` and `end_date` (inclusive).
+    The workbook is written in openpyxl's write-only mode with transactions
+    streamed from the database, so memory use stays flat however many
+    months are exported.
     If `file` is a Path, return `file.exists()`.
     If `file` is a BytesIO stream, return the stream.
     :param str transaction_name: Sales or Purchases
     :param str start_date: Start of date range for data to export
     :param str end_date: End of date range for data to export
     :param Path|BytesIO file: Destination filepath or filestream
+    :param progress: Called as `progress(rows_written, sheets_done)` while
+        the export runs. An exception raised from it abandons the export.
     """
     repo = None
     match transaction_name.lower():
         case "sales":
             repo = SaleRepository()
+            columns = SALES_EXPORT_COLUMNS
+            make_row, make_totals = sale_export_row, sale_export_totals
         case "purchases":
             repo = PurchaseRepository()
+            columns = PURCHASES_EXPORT_COLUMNS
+            make_row, make_totals = (
+                purchase_export_row,
+                purchase_export_totals,
+            )
 
     start_dt = datetime.strptime(start_date, "%Y-%m-%d")
     end_dt = datetime.strptime(end_date, "%Y-%m-%d")
@@ -557,167 +771,61 @@ def export_to_xlsx(
     start_str = start_dt.strftime("%Y-%m-%d %H:%M:%S")
     end_str = end_dt.replace(microsecond=0).strftime("%Y-%m-%d %H:%M:%S")
 
-    # Get all a list of all <transaction_name>s from the date range, sorted by timestamp
-    transactions = repo.search(
+    transactions = repo.iter_search(
         {
             "timeFrom": start_str,
             "timeTo": end_str,
-        }
+        },
+        batch_size=EXPORT_BATCH_SIZE,
     )
 
+    wb = Workbook(write_only=True)
+    register_export_styles(wb)
+
     # Create the front sheet
-    wb = Workbook()
-    ws_front = wb.active
-    ws_front.title = "Front Sheet"
+    ws_front = wb.create_sheet(title="Front Sheet")
     ws_front.append(["Transaction Type", "Start Date", "End Date"])
     ws_front.append([transaction_name, start_date, end_date])
     ws_front.append([])
+    write_front_sheet_totals(
+        ws_front,
+        reports.summarize(transaction_name, "month", start_date, end_date),
+    )
 
-    # Group transactions by (year, month)
-    months = defaultdict(list)
-    for t in transactions:
-        ts = datetime.strptime(t.timestamp, "%Y-%m-%d %H:%M:%S")
-        key = (ts.year, ts.month)
-        months[key].append((ts, t))
-
-    for (year, month), entries in sorted(months.items()):
-        sheet_name = f"{calendar.month_abbr[month]} '{str(year)[-2:]}"
-        ws = wb.create_sheet(title=sheet_name)
-
-        if transaction_name.lower() == "sales":
-            ws.append(
-                [
-                    "Customer",
-                    "Invoice Number",
-                    "Net",
-                    "VAT%",
-                    "VAT",
-                    "Total",
-                    "Payment Method",
-                    "Date",
-                ]
-            )
-            for i, (ts, t) in enumerate(entries, start=2):
-                row = [
-                    t.customer_name,
-                    t.invoice_number,
-                    t.net_amount,
-                    t.vat_percent,
-                    f"=C{i}*D{i}",
-                    f"=C{i}+E{i}",
-                    t.payment_method,
-                    ts.strftime("%d/%m/%Y"),
-                ]
-                ws.append(row)
-            ws.append(
-                [
-                    "TOTAL",
-                    "",
-                    f"=SUM(C2:C{len(entries)+1})",
-                    "",
-                    f"=SUM(E2:E{len(entries)+1})",
-                    f"=SUM(F2:F{len(entries)+1})",
-                    "",
-                    "",
-                ]
-            )
-        else:
-            ws.append(
-                [
-                    "Supplier",
-                    "Invoice Number",
-                    "Net",
-                    "Goods",
-                    "Utilities",
-                    "Motor Expenses",
-                    "Sundries",
-                    "Miscellaneous",
-                    "VAT%",
-                    "VAT",
-                    "Total",
-                    "Supplier Invoice",
-                    "Payment Method",
-                    "Date",
-                ]
-            )
-            for i, (ts, t) in enumerate(entries, start=2):
-                row = [
-                    t.supplier_name,
-                    t.internal_invoice_number,
-                    t.net_amount,
-                    t.goods,
-                    t.utilities,
-                    t.motor_expenses,
-                    t.sundries,
-                    t.miscellaneous,
-                    t.vat_percent,
-                    f"=C{i}*I{i}",
-                    f"=C{i}+J{i}",
-                    t.supplier_invoice_code,
-                    t.payment_method,
-                    ts.strftime("%d/%m/%Y"),
-                ]
-                ws.append(row)
-            ws.append(
-                [
-                    "TOTAL",
-                    "",
-                    f"=SUM(C2:C{len(entries)+1})",
-                    f"=SUM(D2:D{len(entries)+1})",
-                    f"=SUM(E2:E{len(entries)+1})",
-                    f"=SUM(F2:F{len(entries)+1})",
-                    f"=SUM(G2:G{len(entries)+1})",
-                    f"=SUM(H2:H{len(entries)+1})",
-                    "",
-                    f"=SUM(J2:J{len(entries)+1})",
-                    f"=SUM(K2:K{len(entries)+1})",
-                    "",
-                    "",
-                    "",
-                ]
-            )
+    rows_written = 0
+    sheets_done = 0
 
-        # Style headers
-        header_fill = PatternFill(
-            start_color="5E1791", end_color="5E1791", fill_type="solid"
-        )
-        header_font = Font(bold=True, color="FFFFFF")
-        for cell in ws[1]:
-            cell.fill = header_fill
-            cell.font = header_font
-
-        # Set number formats
-        if transaction_name.lower() == "sales":
-            for row in ws.iter_rows(min_row=2, min_col=3, max_col=3):
-                for cell in row:
-                    cell.number_format = "£#,##0.00"
-            for row in ws.iter_rows(min_row=2, min_col=4, max_col=4):
-                for cell in row:
-                    cell.number_format = "0%;-0%;0%"
-            for row in ws.iter_rows(min_row=2, min_col=5, max_col=6):
-                for cell in row:
-                    cell.number_format = "£#,##0.00"
-        else:
-            for row in ws.iter_rows(min_row=2, min_col=3, max_col=8):
-                for cell in row:
-                    cell.number_format = "£#,##0.00"
-            for row in ws.iter_rows(min_row=2, min_col=9, max_col=9):
-                for cell in row:
-                    cell.number_format = "0%;-0%;0%"
-            for row in ws.iter_rows(min_row=2, min_col=10, max_col=11):
-                for cell in row:
-                    cell.number_format = "£#,##0.00"
-
-        # Auto-adjust column widths
-        for col in ws.columns:
-            max_length = 0
-            column = get_column_letter(col[0].column)
-            for cell in col:
-                try:
-                    max_length = max(max_length, len(str(cell.value)))
-                except:
-                    pass
-            ws.column_dimensions[column].width = max_length + 2
+    def sheet_progress(written):
+        progress(rows_written + written, sheets_done)
+
+    # Transactions arrive in timestamp order, so each month is one run
+    dated = (
+        (datetime.strptime(t.timestamp, "%Y-%m-%d %H:%M:%S"), t)
+        for t in transactions
+    )
+    try:
+        for (year, month), entries in groupby(
+            dated, key=lambda entry: (entry[0].year, entry[0].month)
+        ):
+            sheet_name = f"{calendar.month_abbr[month]} '{str(year)[-2:]}"
+            entry_count = write_month_sheet(
+                wb,
+                sheet_name,
+                columns,
+                (make_row(i, ts, t) for i, (ts, t) in enumerate(entries, 2)),
+                make_totals,
+                progress=sheet_progress if progress else None,
+            )
+            rows_written += entry_count
+            sheets_done += 1
+            if progress:
+                progress(rows_written, sheets_done)
+    except BaseException:
+        # Close the abandoned sheets so their temporary files end cleanly
+        for ws in wb.worksheets:
+            if not ws.closed:
+                ws.close()
+        raise
 
     wb.save(file)
     if isinstance(file, BytesIO):
@@ -0,0 +1,120 @@
+import logging
+import sqlite3
+from itertools import islice
+from typing import Callable, Iterable, Iterator, List, Sequence
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHUNK_SIZE = 1000
+
+
+class BulkCreateError(sqlite3.IntegrityError):
+    """A row in a bulk insert violated a constraint; the whole batch was rolled back."""
+
+    def __init__(self, index: int, record, error: sqlite3.IntegrityError):
+        super().__init__(
+            f"Row {index} ({record!r}) could not be inserted: {error}"
+        )
+        self.index = index
+        self.record = record
+        self.error = error
+
+
+def insert_many(
+    conn: sqlite3.Connection,
+    table: str,
+    columns: Sequence[str],
+    records: Iterable,
+    to_row: Callable,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+) -> List[int]:
+    """
+    Insert `records` (any iterable, consumed lazily) into `table` in a single
+    transaction, using executemany over chunks of `chunk_size` rows.
+
+    `to_row(record)` returns the values for `columns`. Records whose `id` is
+    None get an id assigned by the database; the rest keep their own.
+    :return: the id of every inserted record, in input order
+    :raises BulkCreateError: identifying the first failing record, after
+        rolling back every row of the batch
+    """
+    column_list = ", ".join(columns)
+    placeholders = ", ".join("?" for _ in columns)
+    auto_sql = f"INSERT INTO {table} ({column_list}) VALUES ({placeholders})"
+    explicit_sql = (
+        f"INSERT INTO {table} (id, {column_list}) VALUES (?, {placeholders})"
+    )
+
+    ids = []
+    records = iter(records)
+    offset = 0
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        while chunk := list(islice(records, chunk_size)):
+            explicit = [r for r in chunk if r.id is not None]
+            auto = [r for r in chunk if r.id is None]
+            conn.execute("SAVEPOINT bulk_chunk")
+            try:
+                # Explicit ids first, so that the ids assigned to the rest
+                # are consecutive and can be inferred from the last one.
+                if explicit:
+                    conn.executemany(
+                        explicit_sql, ((r.id, *to_row(r)) for r in explicit)
+                    )
+                if auto:
+                    conn.executemany(auto_sql, (to_row(r) for r in auto))
+            except sqlite3.IntegrityError as err:
+                conn.execute("ROLLBACK TO bulk_chunk")
+                record = _find_failure(
+                    conn, explicit + auto, explicit_sql, auto_sql, to_row
+                )
+                position = offset + next(
+                    i for i, r in enumerate(chunk) if r is record
+                )
+                raise BulkCreateError(position, record, err) from err
+            conn.execute("RELEASE bulk_chunk")
+
+            assigned = iter(())
+            if auto:
+                last = conn.execute("SELECT last_insert_rowid()").fetchone()[0]
+                assigned = iter(range(last - len(auto) + 1, last + 1))
+            ids.extend(
+                r.id if r.id is not None else next(assigned) for r in chunk
+            )
+            offset += len(chunk)
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+
+    logger.info(f"[BULK] Inserted {len(ids)} row(s) into {table}")
+    return ids
+
+
+def _find_failure(conn, ordered, explicit_sql, auto_sql, to_row):
+    """Replay a failed chunk row by row, in execution order, to find the failing record."""
+    for record in ordered:
+        try:
+            if record.id is not None:
+                conn.execute(explicit_sql, (record.id, *to_row(record)))
+            else:
+                conn.execute(auto_sql, to_row(record))
+        except sqlite3.IntegrityError:
+            return record
+    # The chunk failed as a whole but no single row did; blame its first row
+    return ordered[0]
+
+
+def iter_rows(
+    cursor: sqlite3.Cursor, batch_size: int = DEFAULT_CHUNK_SIZE
+) -> Iterator:
+    """
+    Yield the rows of an executed cursor lazily, fetching `batch_size` rows
+    at a time, so that at most one batch is held in memory. The cursor is
+    closed once the rows are exhausted or the caller stops iterating.
+    """
+    try:
+        while rows := cursor.fetchmany(batch_size):
+            yield from rows
+    finally:
+        cursor.close()
@@ -0,0 +1,243 @@
+import json
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Hashable,
+    Iterable,
+    NamedTuple,
+    Optional,
+    Tuple,
+)
+from lib.db.pool import data_version
+
+# Every repository write bumps the generation of its database, which
+# invalidates all results cached against an older generation.
+_generations = {}
+_generations_lock = threading.Lock()
+
+_MISSING = object()
+
+
+def get_generation(db_path) -> int:
+    """Return the write generation of the database at `db_path`."""
+    return _generations.get(str(db_path), 0)
+
+
+def bump_generation(db_path) -> int:
+    """Record a write to the database at `db_path`, invalidating cached results."""
+    key = str(db_path)
+    with _generations_lock:
+        _generations[key] = _generations.get(key, 0) + 1
+        return _generations[key]
+
+
+def get_data_version(conn: sqlite3.Connection, table: str) -> Optional[int]:
+    """
+    Return the persistent write counter of `table`, kept by triggers in the
+    data_versions table, or None if the database has no such counter.
+    """
+    try:
+        row = conn.execute(
+            "SELECT version FROM data_versions WHERE table_name = ?", (table,)
+        ).fetchone()
+    except sqlite3.OperationalError:
+        return None
+    return row[0] if row else None
+
+
+def get_version(db_path) -> tuple:
+    """
+    Return the write generation of `db_path` together with its
+    PRAGMA data_version, which also changes on commits made outside this
+    process's repositories, such as by another instance of the app.
+    """
+    return get_generation(db_path), data_version(db_path)
+
+
+def _normalise(value: Any) -> Any:
+    if isinstance(value, dict):
+        return {
+            k: _normalise(v)
+            for k, v in value.items()
+            if v not in (None, "", [], {})
+        }
+    if isinstance(value, (list, tuple, set)):
+        return sorted((_normalise(v) for v in value), key=repr)
+    return value
+
+
+def cache_key(filters: Optional[dict]) -> str:
+    """
+    Return a canonical, hashable form of a filters dict. Empty filters are
+    dropped and list values sorted, so that equivalent filters as built from
+    different query strings share a key.
+    """
+    return json.dumps(_normalise(filters or {}), sort_keys=True, default=str)
+
+
+# Named caches, whose statistics are reported by cache_stats()
+_caches = {}
+
+
+class QueryCache:
+    """
+    Bounded LRU cache of query results, keyed by database path and an
+    arbitrary hashable key. Entries are only returned while the database's
+    version, by default its write generation, is unchanged since they were
+    stored.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 128,
+        version: Callable[[Any], Hashable] = get_generation,
+        name: Optional[str] = None,
+    ):
+        self.max_entries = max_entries
+        self.version = version
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.stale = self.evictions = 0
+        if name is not None:
+            _caches[name] = self
+
+    def _lookup(self, full_key: tuple, version: Hashable) -> Any:
+        """Return the entry for `full_key` if stored at `version`. Caller holds the lock."""
+        entry = self._entries.get(full_key, _MISSING)
+        if entry is _MISSING:
+            self.misses += 1
+            return _MISSING
+        stored_version, value = entry
+        if stored_version != version:
+            del self._entries[full_key]
+            self.stale += 1
+            self.misses += 1
+            return _MISSING
+        self._entries.move_to_end(full_key)
+        self.hits += 1
+        return value
+
+    def get(self, db_path, key: Hashable, default: Any = None) -> Any:
+        version = self.version(db_path)
+        with self._lock:
+            value = self._lookup((str(db_path), key), version)
+        return default if value is _MISSING else value
+
+    def set(
+        self, db_path, key: Hashable, value: Any, version: Hashable
+    ) -> None:
+        """
+        Store `value`, computed while the database was at `version`.
+        Callers read the version before running their query, so a write
+        that lands mid-query leaves the entry already stale.
+        """
+        full_key = (str(db_path), key)
+        with self._lock:
+            self._entries[full_key] = (version, value)
+            self._entries.move_to_end(full_key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def get_or_compute(
+        self, db_path, key: Hashable, compute: Callable[[], Any]
+    ) -> Any:
+        """
+        Return the cached value for `key`, or store and return `compute()`.
+        The database version is read once, before computing.
+        """
+        version = self.version(db_path)
+        with self._lock:
+            value = self._lookup((str(db_path), key), version)
+        if value is _MISSING:
+            value = compute()
+            self.set(db_path, key, value, version)
+        return value
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "stale": self.stale,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+            }
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+def cache_stats() -> dict:
+    """Return the hit, miss and size statistics of every named cache."""
+    return {name: cache.stats() for name, cache in sorted(_caches.items())}
+
+
+class EntityMaps(NamedTuple):
+    by_name: Dict[str, int]
+    by_id: Dict[int, str]
+
+
+class EntityIndex:
+    """
+    In-process name -> id and id -> name maps of each entity table, keyed by
+    database path and table. Maps are loaded on first lookup and dropped by
+    invalidate(), which repositories call after writing the table, so that
+    lookups on the transaction write path never scan the table.
+    """
+
+    def __init__(self):
+        self._maps = {}
+        # Bumped by invalidate(), so that a load which overlaps a write is
+        # not stored
+        self._versions = {}
+        self._lock = threading.Lock()
+
+    def get(
+        self,
+        db_path,
+        table: str,
+        load: Callable[[], Iterable[Tuple[int, str]]],
+    ) -> EntityMaps:
+        """
+        Return the maps of `table`, calling `load()` for its (id, name) rows
+        if they are not cached.
+        """
+        key = (str(db_path), table)
+        with self._lock:
+            maps = self._maps.get(key)
+            if maps is not None:
+                return maps
+            version = self._versions.get(key, 0)
+
+        rows = list(load())
+        maps = EntityMaps(
+            {name: id for id, name in rows}, {id: name for id, name in rows}
+        )
+        with self._lock:
+            if self._versions.get(key, 0) == version:
+                self._maps[key] = maps
+        return maps
+
+    def invalidate(self, db_path, table: str) -> None:
+        key = (str(db_path), table)
+        with self._lock:
+            self._maps.pop(key, None)
+            self._versions[key] = self._versions.get(key, 0) + 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._maps.clear()
+            self._versions.clear()
+
+
+entity_index = EntityIndex()
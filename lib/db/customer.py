@@ -1,13 +1,25 @@
 import logging
-import sqlite3
 from pathlib import Path
-from typing import Optional, List
-from lib.db.entity import Entity, EntityRepository
+from typing import Iterable, Iterator, List, Optional, Tuple
+from lib.db.entity import SUGGEST_LIMIT, Entity, EntityRepository
 from lib.db.sale import Sale, SaleRepository
+from lib.db.bulk import DEFAULT_CHUNK_SIZE, insert_many, iter_rows
+from lib.db.cache import (
+    QueryCache,
+    bump_generation,
+    entity_index,
+    get_version,
+)
+from lib.db.fts import fts_tables, prefix_pattern, substring_condition
+from lib.db.pool import get_connection
 from lib.db.utils import get_db_path
 
 logger = logging.getLogger(__name__)
 
+# Stored rows are cached, since they are immutable, and each hit
+# hydrates new models from them
+_result_cache = QueryCache(version=get_version, name="customers")
+
 
 class Customer(Entity):
     def __init__(self, id: Optional[int], name: str) -> None:
@@ -30,7 +42,7 @@ class CustomerRepository(EntityRepository[Customer]):
         self.db_path = db_path or get_db_path()
 
     def _connect(self):
-        return sqlite3.connect(self.db_path)
+        return get_connection(self.db_path)
 
     def create(self, customer: Customer) -> Customer:
         created_customer = None
@@ -41,6 +53,8 @@ class CustomerRepository(EntityRepository[Customer]):
                     "INSERT INTO customers (name) VALUES (?)", (customer.name,)
                 )
                 conn.commit()
+                bump_generation(self.db_path)
+                entity_index.invalidate(self.db_path, "customers")
                 created_customer = Customer(cursor.lastrowid, customer.name)
             else:
                 cursor.execute(
@@ -48,9 +62,28 @@ class CustomerRepository(EntityRepository[Customer]):
                     (customer.id, customer.name),
                 )
                 conn.commit()
+                bump_generation(self.db_path)
+                entity_index.invalidate(self.db_path, "customers")
                 created_customer = customer
             return created_customer
 
+    def create_many(
+        self,
+        customers: Iterable[Customer],
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+    ) -> List[int]:
+        ids = insert_many(
+            self._connect(),
+            "customers",
+            ("name",),
+            customers,
+            lambda customer: (customer.name,),
+            chunk_size,
+        )
+        bump_generation(self.db_path)
+        entity_index.invalidate(self.db_path, "customers")
+        return ids
+
     def read(
         self, id: Optional[int] = None, name: Optional[str] = None
     ) -> Optional[Customer]:
@@ -72,6 +105,24 @@ class CustomerRepository(EntityRepository[Customer]):
             row = cursor.fetchone()
             return Customer(*row) if row else None
 
+    def lookup(
+        self, id: Optional[int] = None, name: Optional[str] = None
+    ) -> Optional[Customer]:
+        maps = entity_index.get(self.db_path, "customers", self._names)
+        if id is not None:
+            name = maps.by_id.get(id)
+            return Customer(id, name) if name is not None else None
+        elif name is not None:
+            id = maps.by_name.get(name)
+            return Customer(id, name) if id is not None else None
+        raise ValueError("Either id or name required to look up a customer")
+
+    def _names(self) -> List[tuple]:
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT id, name FROM customers")
+            return cursor.fetchall()
+
     def update(self, customer: Customer) -> Customer:
         with self._connect() as conn:
             cursor = conn.cursor()
@@ -85,6 +136,8 @@ class CustomerRepository(EntityRepository[Customer]):
                 (customer.name, customer.id),
             )
             conn.commit()
+            bump_generation(self.db_path)
+            entity_index.invalidate(self.db_path, "customers")
             return self.read(id=customer.id)
 
     def delete(self, id: int) -> Optional[Customer]:
@@ -97,26 +150,76 @@ class CustomerRepository(EntityRepository[Customer]):
             # Propagate deletion to sales
             cursor.execute("DELETE FROM sales WHERE customer_id = ?", (id,))
             conn.commit()
+            bump_generation(self.db_path)
+            entity_index.invalidate(self.db_path, "customers")
             return customer
 
     def search(self, name_query: str) -> List[Customer]:
+        rows = _result_cache.get_or_compute(
+            self.db_path,
+            ("search", name_query.lower()),
+            lambda: self._search(name_query),
+        )
+        return [Customer(id=row[0], name=row[1]) for row in rows]
+
+    def _search(self, name_query: str) -> Tuple[tuple, ...]:
         with self._connect() as conn:
+            use_fts = "customers_fts" in fts_tables(conn, self.db_path)
             cursor = conn.cursor()
             cursor.execute(
-                "SELECT id, name FROM customers WHERE LOWER(name) LIKE ?",
+                "SELECT id, name FROM customers WHERE "
+                + substring_condition("customers", "name", use_fts),
                 (f"%{name_query.lower()}%",),
             )
+            return tuple(cursor.fetchall())
+
+    def suggest(
+        self, prefix: str, limit: int = SUGGEST_LIMIT
+    ) -> List[Customer]:
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                "SELECT id, name FROM customers WHERE name LIKE ? ESCAPE '\\' "
+                "ORDER BY name COLLATE NOCASE LIMIT ?",
+                (prefix_pattern(prefix), limit),
+            )
             rows = cursor.fetchall()
             return [Customer(id=row[0], name=row[1]) for row in rows]
 
+    def iter_search(
+        self, name_query: str, batch_size: int = DEFAULT_CHUNK_SIZE
+    ) -> Iterator[Customer]:
+        with self._connect() as conn:
+            use_fts = "customers_fts" in fts_tables(conn, self.db_path)
+            cursor = conn.cursor()
+            cursor.execute(
+                "SELECT id, name FROM customers WHERE "
+                + substring_condition("customers", "name", use_fts),
+                (f"%{name_query.lower()}%",),
+            )
+            for row in iter_rows(cursor, batch_size):
+                yield Customer(id=row[0], name=row[1])
+
     def all(self) -> List[Customer]:
+        rows = _result_cache.get_or_compute(self.db_path, ("all",), self._all)
+        return [Customer(id=row[0], name=row[1]) for row in rows]
+
+    def _all(self) -> Tuple[tuple, ...]:
         with self._connect() as conn:
             cursor = conn.cursor()
             cursor.execute(
                 "SELECT id, name FROM customers",
             )
-            rows = cursor.fetchall()
-            return [Customer(id=row[0], name=row[1]) for row in rows]
+            return tuple(cursor.fetchall())
+
+    def iter_all(
+        self, batch_size: int = DEFAULT_CHUNK_SIZE
+    ) -> Iterator[Customer]:
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT id, name FROM customers")
+            for row in iter_rows(cursor, batch_size):
+                yield Customer(id=row[0], name=row[1])
 
     def transaction_repository(
         self, db_path: Optional[Path] = None
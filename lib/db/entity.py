@@ -1,6 +1,7 @@
 from abc import ABC, abstractmethod
 from pathlib import Path
-from typing import Generic, List, Optional, TypeVar
+from typing import Generic, Iterable, Iterator, List, Optional, TypeVar
+from lib.db.bulk import DEFAULT_CHUNK_SIZE
 from lib.db.transaction import Transaction, TransactionRepository
 
 
@@ -9,6 +10,9 @@ class Entity(ABC):
     name: str
 
 
+# The most names returned by EntityRepository.suggest
+SUGGEST_LIMIT = 10
+
 T = TypeVar("T", bound=Entity)
 U = TypeVar("U", bound=Transaction)
 V = TypeVar("V", bound=TransactionRepository)
@@ -25,6 +29,13 @@ class EntityRepository(ABC, Generic[T]):
         """Creates an entity record in the database."""
         pass
 
+    @abstractmethod
+    def create_many(
+        self, entities: Iterable[T], chunk_size: int = DEFAULT_CHUNK_SIZE
+    ) -> List[int]:
+        """Creates entity records in chunked inserts within one transaction, returning their ids in order."""
+        pass
+
     @abstractmethod
     def read(
         self, id: Optional[int] = None, name: Optional[str] = None
@@ -32,6 +43,13 @@ class EntityRepository(ABC, Generic[T]):
         """Get an entity by its ID or name, or return None."""
         pass
 
+    @abstractmethod
+    def lookup(
+        self, id: Optional[int] = None, name: Optional[str] = None
+    ) -> Optional[T]:
+        """Get an entity by its ID or name from the in-process entity index, which is invalidated by every write to the entity table, or return None."""
+        pass
+
     @abstractmethod
     def update(self, entity: T) -> Optional[T]:
         """Updates an existing entity record, and propagates the change to corresponding transactions."""
@@ -47,11 +65,28 @@ class EntityRepository(ABC, Generic[T]):
         """Returns a list of entities whose lowercase names have name_query as a substring."""
         pass
 
+    @abstractmethod
+    def suggest(self, prefix: str, limit: int = SUGGEST_LIMIT) -> List[T]:
+        """Returns up to limit entities whose names start with prefix, ignoring case, in name order."""
+        pass
+
+    @abstractmethod
+    def iter_search(
+        self, name_query: str, batch_size: int = DEFAULT_CHUNK_SIZE
+    ) -> Iterator[T]:
+        """Yields the entities whose lowercase names have name_query as a substring, fetching batch_size rows at a time."""
+        pass
+
     @abstractmethod
     def all(self) -> List[T]:
         """Returns a list of all entities."""
         pass
 
+    @abstractmethod
+    def iter_all(self, batch_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[T]:
+        """Yields every entity, fetching batch_size rows at a time."""
+        pass
+
     @abstractmethod
     def transaction_repository(self, db_path: Optional[Path] = None) -> V:
         """Returns an instance of the repository class for transactions which correspond to the entity type of this class."""
@@ -0,0 +1,123 @@
+"""
+Compiles the filter dicts built by build_filters() into SQL.
+
+compile() reduces a filters dict to a shape, which records which
+conditions apply but none of their values, and the parameters to bind.
+The SQL for each shape is generated once and then reused. Filters with
+the same shape therefore always run the same statement text, which hits
+SQLite's prepared statement cache.
+"""
+
+import functools
+import logging
+from typing import Dict, List, Optional, Tuple
+from lib.db.fts import substring_condition
+from lib.db.money import to_basis_points, to_pence
+from lib.db.utils import normalize_datetime
+
+logger = logging.getLogger(__name__)
+
+# Distinct (prefix, shape, suffix) statements kept per table
+SQL_CACHE_SIZE = 256
+
+
+class FilterCompiler:
+    """
+    Filters on one transaction table.
+
+    :param table: the table filtered
+    :param substrings: filter name -> column matched as a substring
+    :param ranges: filter name -> money column matched by an
+        {"eq"} or {"min", "max"} range in pounds
+    :param flags: filter name -> column which must be at least the
+        filter's boolean value
+    """
+
+    def __init__(
+        self,
+        table: str,
+        substrings: Dict[str, str],
+        ranges: Dict[str, str],
+        flags: Optional[Dict[str, str]] = None,
+    ):
+        self.table = table
+        self.substrings = substrings
+        self.ranges = ranges
+        self.flags = flags or {}
+        self.sql = functools.lru_cache(maxsize=SQL_CACHE_SIZE)(self._sql)
+
+    def compile(
+        self, filters: dict, use_fts: bool = False
+    ) -> Tuple[tuple, List]:
+        """
+        Returns the (shape, params) of the supplied filters. With use_fts,
+        substring filters are answered from the full-text index.
+        """
+        shape = [use_fts]
+        params = []
+
+        for name, column in self.substrings.items():
+            if substring := filters.get(name):
+                shape.append(("like", column))
+                params.append(f"%{substring.lower()}%")
+
+        for name, column in self.ranges.items():
+            bounds = filters.get(name) or {}
+            if "eq" in bounds:
+                shape.append(("=", column))
+                params.append(to_pence(bounds["eq"]))
+                continue
+            if "min" in bounds:
+                shape.append((">=", column))
+                params.append(to_pence(bounds["min"]))
+            if "max" in bounds:
+                shape.append(("<=", column))
+                params.append(to_pence(bounds["max"]))
+
+        # Lists bind one parameter per value, so their length is part of
+        # the shape
+        if vat_filter := filters.get("vat"):
+            shape.append(("in", "vat_percent", len(vat_filter)))
+            params.extend(to_basis_points(vat) for vat in vat_filter)
+        if payment_filter := filters.get("payment"):
+            shape.append(("in", "payment_method", len(payment_filter)))
+            params.extend(payment_filter)
+
+        if time_from := normalize_datetime(filters.get("timeFrom")):
+            shape.append((">=", "timestamp"))
+            params.append(time_from)
+        if time_to := normalize_datetime(filters.get("timeTo")):
+            shape.append(("<=", "timestamp"))
+            params.append(time_to)
+
+        for name, column in self.flags.items():
+            if flag := filters.get(name):
+                flag = {"True": True, "False": False}.get(flag, flag)
+                shape.append((">=", column))
+                params.append(int(flag))
+
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"[FILTERS] {self.table} {shape} {params}")
+        return tuple(shape), params
+
+    def conditions(self, shape: tuple) -> str:
+        """Returns the SQL conditions of a shape, each prefixed with AND."""
+        use_fts, *terms = shape
+        sql = ""
+        for op, column, *size in terms:
+            if op == "like":
+                condition = substring_condition(self.table, column, use_fts)
+            elif op == "in":
+                placeholders = ",".join("?" * size[0])
+                condition = f"{column} IN ({placeholders})"
+            else:
+                condition = f"{column} {op} ?"
+            sql += " AND " + condition
+        return sql
+
+    def _sql(self, prefix: str, shape: tuple, suffix: str = "") -> str:
+        """
+        Returns `prefix`, the WHERE clause of `shape`, then `suffix`.
+        Results are cached per distinct arguments.
+        """
+        return f"{prefix} WHERE 1=1{self.conditions(shape)}{suffix}"
@@ -0,0 +1,72 @@
+import logging
+import sqlite3
+import threading
+
+logger = logging.getLogger(__name__)
+
+# db_path -> names of the full-text shadow tables present in that database
+_fts_tables = {}
+_fts_tables_lock = threading.Lock()
+
+
+def fts5_trigram_available(conn: sqlite3.Connection) -> bool:
+    """Return whether this SQLite build supports FTS5 with the trigram tokenizer."""
+    try:
+        conn.execute(
+            "CREATE VIRTUAL TABLE temp.fts5_probe USING fts5(x, tokenize='trigram')"
+        )
+        conn.execute("DROP TABLE temp.fts5_probe")
+        return True
+    except sqlite3.OperationalError as err:
+        logger.info(f"[FTS] FTS5 trigram search unavailable: {err}")
+        return False
+
+
+def fts_tables(conn: sqlite3.Connection, db_path) -> set:
+    """
+    Return the names of the full-text shadow tables (e.g. "sales_fts") in
+    the database at `db_path`. Looked up once per database and cached.
+    """
+    key = str(db_path)
+    tables = _fts_tables.get(key)
+    if tables is None:
+        rows = conn.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'table' AND name LIKE '%!_fts' ESCAPE '!'"
+        ).fetchall()
+        tables = {row[0] for row in rows}
+        with _fts_tables_lock:
+            _fts_tables[key] = tables
+    return tables
+
+
+def forget_fts_tables(db_path=None) -> None:
+    """Drop cached table lookups, e.g. after migrations change the schema."""
+    with _fts_tables_lock:
+        if db_path is None:
+            _fts_tables.clear()
+        else:
+            _fts_tables.pop(str(db_path), None)
+
+
+def substring_condition(table: str, column: str, use_fts: bool) -> str:
+    """
+    Return an SQL condition on `table` matching rows whose `column` contains
+    the bound parameter (a LIKE pattern such as '%abc%'), case-insensitively.
+
+    With `use_fts` the pattern is matched against the trigram index in
+    `<table>_fts`, which answers LIKE queries without scanning the table.
+    """
+    if use_fts:
+        return f"id IN (SELECT rowid FROM {table}_fts WHERE {column} LIKE ?)"
+    return f"LOWER({column}) LIKE ?"
+
+
+def prefix_pattern(prefix: str) -> str:
+    """
+    Return a LIKE pattern, for use with ESCAPE '\\', matching values which
+    start with `prefix`. Wildcards in the prefix are matched literally.
+    """
+    escaped = (
+        prefix.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    )
+    return f"{escaped}%"
@@ -0,0 +1,280 @@
+import csv
+import logging
+import math
+import time
+from dataclasses import dataclass, field
+from itertools import islice
+from pathlib import Path
+from typing import Iterable, Iterator, List, Optional, TextIO, Tuple
+from lib.db.bulk import DEFAULT_CHUNK_SIZE, BulkCreateError
+from lib.db.customer import CustomerRepository
+from lib.db.purchase import Purchase, PurchaseRepository
+from lib.db.sale import Sale, SaleRepository
+from lib.db.supplier import SupplierRepository
+from lib.db.utils import normalize_datetime
+
+logger = logging.getLogger(__name__)
+
+# Row errors beyond this many are counted but not kept, so that a file full
+# of bad rows cannot grow the report without bound
+MAX_REPORTED_ERRORS = 1000
+
+AMOUNT_COLUMNS = {
+    "sales": ("net_amount", "vat_percent"),
+    "purchases": (
+        "net_amount",
+        "vat_percent",
+        "goods",
+        "utilities",
+        "motor_expenses",
+        "sundries",
+        "miscellaneous",
+    ),
+}
+# Columns which may be left blank, meaning zero
+OPTIONAL_AMOUNTS = {
+    "goods",
+    "utilities",
+    "motor_expenses",
+    "sundries",
+    "miscellaneous",
+}
+TRUE_VALUES = {"1", "true", "yes", "y"}
+
+
+@dataclass
+class ImportReport:
+    transaction_name: str
+    rows_read: int = 0
+    rows_imported: int = 0
+    rows_failed: int = 0
+    errors: List[Tuple[int, str]] = field(default_factory=list)
+    seconds: float = 0.0
+    # Why the file stopped being read, if it could not be read to the end
+    aborted: Optional[str] = None
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.rows_read / self.seconds if self.seconds else 0.0
+
+    def add_error(self, line: int, message: str) -> None:
+        self.rows_failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append((line, message))
+
+
+class RowError(ValueError):
+    """A CSV row could not be turned into a transaction."""
+
+
+def import_csv(
+    file: TextIO,
+    transaction_name: str,
+    db_path: Optional[Path] = None,
+    batch_size: int = DEFAULT_CHUNK_SIZE,
+) -> ImportReport:
+    """
+    Streams sales or purchases from a CSV file into the database.
+
+    The header row names the model fields, e.g. customer_name,
+    invoice_number, net_amount, vat_percent, payment_method, timestamp.
+    Rows flow through a generator pipeline and are inserted `batch_size`
+    at a time, so memory use does not depend on the size of the file.
+    Rows which fail are skipped and listed in the report by line number.
+    If the file itself cannot be read, e.g. it is not UTF-8 or a quote is
+    never closed, reading stops there; the rows before that point are
+    still imported and the report's `aborted` says why it stopped.
+    :param TextIO file: Open text stream of CSV data
+    :param str transaction_name: sales or purchases
+    :param Path db_path: Database to import into
+    :param int batch_size: Number of rows inserted per transaction
+    """
+    match transaction_name.lower():
+        case "sales":
+            repo = SaleRepository(db_path)
+            entity_repo = CustomerRepository(db_path)
+        case "purchases":
+            repo = PurchaseRepository(db_path)
+            entity_repo = SupplierRepository(db_path)
+        case _:
+            raise ValueError(f"Cannot import {transaction_name}")
+
+    transaction_name = transaction_name.lower()
+    report = ImportReport(transaction_name)
+    started = time.perf_counter()
+
+    rows = parse_rows(file, report)
+    rows = normalize_rows(rows, transaction_name, report)
+    rows = resolve_entities(rows, entity_repo, transaction_name, report)
+    transactions = build_transactions(rows, transaction_name, report)
+    report.rows_imported = insert_batches(
+        repo, transactions, batch_size, report
+    )
+
+    report.seconds = time.perf_counter() - started
+    logger.info(
+        f"[IMPORT] {report.rows_imported}/{report.rows_read} {transaction_name} "
+        f"imported in {report.seconds:.2f}s "
+        f"({report.rows_per_second:.0f} rows/s, {report.rows_failed} failed)"
+    )
+    if report.aborted:
+        logger.warning(f"[IMPORT] Stopped reading: {report.aborted}")
+    return report
+
+
+def parse_rows(
+    file: TextIO, report: ImportReport
+) -> Iterator[Tuple[int, dict]]:
+    """
+    Yields (line number, row) for each CSV record, with blank fields stripped.
+    Malformed CSV or undecodable bytes end the rows rather than raising, so
+    the rows already read can still be inserted.
+    """
+    reader = csv.DictReader(file)
+    try:
+        for row in reader:
+            report.rows_read += 1
+            yield reader.line_num, {
+                key.strip(): (value or "").strip()
+                for key, value in row.items()
+                if key is not None
+            }
+    except (csv.Error, UnicodeDecodeError) as err:
+        report.aborted = f"Unreadable data after line {reader.line_num}: {err}"
+
+
+def normalize_rows(
+    rows: Iterable[Tuple[int, dict]],
+    transaction_name: str,
+    report: ImportReport,
+) -> Iterator[Tuple[int, dict]]:
+    """Converts timestamps, amounts and flags to the types the models expect."""
+    for line, row in rows:
+        try:
+            timestamp = normalize_datetime(row.get("timestamp"))
+            if timestamp is None:
+                raise RowError(
+                    f"Unrecognised timestamp: '{row.get('timestamp', '')}'"
+                )
+            row["timestamp"] = timestamp
+
+            for column in AMOUNT_COLUMNS[transaction_name]:
+                value = row.get(column, "")
+                if not value and column in OPTIONAL_AMOUNTS:
+                    row[column] = 0.0
+                    continue
+                try:
+                    row[column] = float(value)
+                except ValueError:
+                    raise RowError(f"Invalid {column}: '{value}'")
+                # float() accepts nan and inf, which cannot be stored
+                if not math.isfinite(row[column]):
+                    raise RowError(f"Invalid {column}: '{value}'")
+
+            if transaction_name == "purchases":
+                row["capital_spend"] = (
+                    row.get("capital_spend", "").lower() in TRUE_VALUES
+                )
+        except RowError as err:
+            report.add_error(line, str(err))
+            continue
+        yield line, row
+
+
+def resolve_entities(
+    rows: Iterable[Tuple[int, dict]],
+    entity_repo,
+    transaction_name: str,
+    report: ImportReport,
+) -> Iterator[Tuple[int, dict]]:
+    """Looks up the customer or supplier named on each row, once per name."""
+    entity_key = "customer" if transaction_name == "sales" else "supplier"
+    ids = {}
+    for line, row in rows:
+        name = row.get(f"{entity_key}_name", "")
+        if name not in ids:
+            entity = entity_repo.read(name=name) if name else None
+            ids[name] = entity.id if entity else None
+        if ids[name] is None:
+            report.add_error(line, f"Unknown {entity_key}: '{name}'")
+            continue
+        row[f"{entity_key}_id"] = ids[name]
+        yield line, row
+
+
+def build_transactions(
+    rows: Iterable[Tuple[int, dict]],
+    transaction_name: str,
+    report: ImportReport,
+) -> Iterator[Tuple[int, Sale | Purchase]]:
+    """Creates model objects, which validates the purchase cost breakdown."""
+    for line, row in rows:
+        try:
+            if transaction_name == "sales":
+                transaction = Sale(
+                    None,
+                    row["customer_id"],
+                    row["customer_name"],
+                    row.get("invoice_number") or None,
+                    row["net_amount"],
+                    row["vat_percent"],
+                    row.get("payment_method", ""),
+                    row["timestamp"],
+                )
+            else:
+                transaction = Purchase(
+                    None,
+                    row["supplier_id"],
+                    row["supplier_name"],
+                    row.get("supplier_invoice_code", ""),
+                    row.get("internal_invoice_number") or None,
+                    row["net_amount"],
+                    row["vat_percent"],
+                    row["goods"],
+                    row["utilities"],
+                    row["motor_expenses"],
+                    row["sundries"],
+                    row["miscellaneous"],
+                    row.get("payment_method", ""),
+                    row["timestamp"],
+                    row["capital_spend"],
+                )
+        except ValueError as err:
+            report.add_error(line, str(err))
+            continue
+        yield line, transaction
+
+
+def insert_batches(
+    repo,
+    transactions: Iterable[Tuple[int, Sale | Purchase]],
+    batch_size: int,
+    report: ImportReport,
+) -> int:
+    """
+    Inserts transactions `batch_size` at a time, each batch in its own
+    transaction. A row rejected by the database is reported; the rows
+    before it, which were valid, and the rows after it are then inserted
+    separately, so each row is attempted a bounded number of times.
+    """
+    imported = 0
+    transactions = iter(transactions)
+    while batch := list(islice(transactions, batch_size)):
+        # (start, end) ranges of the batch still to insert, last one first
+        pending = [(0, len(batch))]
+        while pending:
+            start, end = pending.pop()
+            if start == end:
+                continue
+            try:
+                repo.create_many(
+                    (t for _, t in batch[start:end]), chunk_size=batch_size
+                )
+            except BulkCreateError as err:
+                failed = start + err.index
+                report.add_error(batch[failed][0], str(err.error))
+                pending.append((failed + 1, end))
+                pending.append((start, failed))
+                continue
+            imported += end - start
+    return imported
@@ -0,0 +1,360 @@
+"""
+Per-statement query timing, for finding slow repository calls.
+
+When enabled, the pool opens InstrumentedConnection connections. Their
+cursors time each statement from execute() until its rows have been
+fetched, and count the rows returned or changed. The SQLite trace
+callback counts the statements each execution actually ran, including
+those nested in triggers and full-text index lookups, and records the
+statement text with its parameters expanded.
+
+Statistics are kept per (caller, statement), where the caller is the
+repository method that executed the statement. Executions slower than
+the slow query threshold are logged with their EXPLAIN QUERY PLAN. The
+log shows the statement with placeholders; its expanded text, which
+contains the parameter values, is only kept in the in-memory slow log.
+
+Instrumentation is off by default. Enable it with enable() before
+connections are opened, or by setting BOOKKEEPPR_QUERY_STATS=1.
+"""
+
+import bisect
+import logging
+import os
+import sqlite3
+import sys
+import threading
+import time
+from collections import deque
+from typing import List, Optional
+
+logger = logging.getLogger(__name__)
+
+ENABLED_ENV_VAR = "BOOKKEEPPR_QUERY_STATS"
+SLOW_MS_ENV_VAR = "BOOKKEEPPR_SLOW_QUERY_MS"
+DEFAULT_SLOW_MS = 100.0
+
+# Upper bounds (ms) of the latency histogram buckets; the last bucket
+# counts everything slower
+LATENCY_BUCKETS_MS = (1, 5, 25, 100, 500)
+
+# Number of slow executions kept for the debug route
+SLOW_LOG_SIZE = 50
+
+_enabled = None
+_slow_ms = None
+
+
+def is_enabled() -> bool:
+    """Return whether new connections are instrumented."""
+    if _enabled is not None:
+        return _enabled
+    return os.getenv(ENABLED_ENV_VAR, "") not in ("", "0")
+
+
+def get_slow_ms() -> float:
+    """Return the latency (ms) above which executions are logged as slow."""
+    if _slow_ms is not None:
+        return _slow_ms
+    try:
+        return float(os.getenv(SLOW_MS_ENV_VAR) or DEFAULT_SLOW_MS)
+    except ValueError:
+        logger.warning(
+            f"[QUERY] Invalid {SLOW_MS_ENV_VAR}, using {DEFAULT_SLOW_MS} ms"
+        )
+        return DEFAULT_SLOW_MS
+
+
+def enable(slow_ms: Optional[float] = None) -> None:
+    """
+    Instrument connections opened from now on.
+    :param slow_ms: the slow query threshold, in milliseconds
+    """
+    global _enabled, _slow_ms
+    _enabled = True
+    if slow_ms is not None:
+        _slow_ms = slow_ms
+
+
+def disable() -> None:
+    """Stop instrumenting connections opened from now on."""
+    global _enabled
+    _enabled = False
+
+
+class QueryStats:
+    """Thread-safe latency statistics and slow query log."""
+
+    def __init__(self, slow_log_size: int = SLOW_LOG_SIZE):
+        self._lock = threading.Lock()
+        # (caller, sql) -> statistics dict
+        self._statements = {}
+        self._slow = deque(maxlen=slow_log_size)
+
+    def record(
+        self,
+        caller: str,
+        sql: str,
+        elapsed_ms: float,
+        rows: int,
+        statements: int,
+    ) -> None:
+        bucket = bisect.bisect_left(LATENCY_BUCKETS_MS, elapsed_ms)
+        with self._lock:
+            entry = self._statements.get((caller, sql))
+            if entry is None:
+                entry = self._statements[(caller, sql)] = {
+                    "caller": caller,
+                    "sql": sql,
+                    "calls": 0,
+                    "rows": 0,
+                    "statements": 0,
+                    "total_ms": 0.0,
+                    "max_ms": 0.0,
+                    "histogram": [0] * (len(LATENCY_BUCKETS_MS) + 1),
+                }
+            entry["calls"] += 1
+            entry["rows"] += rows
+            entry["statements"] += statements
+            entry["total_ms"] += elapsed_ms
+            entry["max_ms"] = max(entry["max_ms"], elapsed_ms)
+            entry["histogram"][bucket] += 1
+
+    def record_slow(self, slow_query: dict) -> None:
+        with self._lock:
+            self._slow.append(slow_query)
+
+    def statements(self) -> List[dict]:
+        """Return a copy of the statistics, by total time descending."""
+        with self._lock:
+            entries = [
+                {**entry, "histogram": list(entry["histogram"])}
+                for entry in self._statements.values()
+            ]
+        for entry in entries:
+            entry["mean_ms"] = entry["total_ms"] / entry["calls"]
+        return sorted(entries, key=lambda e: e["total_ms"], reverse=True)
+
+    def slow_queries(self) -> List[dict]:
+        """Return the most recent slow executions, newest first."""
+        with self._lock:
+            return list(reversed(self._slow))
+
+    def reset(self) -> None:
+        with self._lock:
+            self._statements.clear()
+            self._slow.clear()
+
+
+query_stats = QueryStats()
+
+
+def _caller() -> str:
+    """
+    Return the repository method which is executing a statement, or else
+    the nearest function outside this module.
+    """
+    frame = sys._getframe(1)
+    fallback = None
+    while frame is not None:
+        code = frame.f_code
+        if code.co_filename != __file__:
+            if "Repository." in code.co_qualname:
+                return code.co_qualname
+            if fallback is None:
+                module = frame.f_globals.get("__name__", "")
+                fallback = f"{module.rsplit('.', 1)[-1]}.{code.co_qualname}"
+        frame = frame.f_back
+    return fallback or "?"
+
+
+class TimedCursor(sqlite3.Cursor):
+    """
+    Cursor which records the latency of each execution, from execute()
+    until its last row is fetched, the cursor is reused or it is closed.
+    """
+
+    _pending = None
+
+    def _start(self, sql: str, parameters, many: bool = False) -> None:
+        self._finish()
+        conn = self.connection
+        conn.expanded_sql = None
+        self._pending = {
+            "caller": _caller(),
+            "sql": sql,
+            "parameters": None if many else parameters,
+            "statements": conn.traced_statements,
+            "expanded_sql": None,
+            "rows": 0,
+            "elapsed": 0.0,
+        }
+
+    def _timed(self, start: float, rows: int = 0) -> None:
+        pending = self._pending
+        if pending is not None:
+            pending["elapsed"] += time.perf_counter() - start
+            pending["rows"] += rows
+            pending["expanded_sql"] = (
+                pending["expanded_sql"] or self.connection.expanded_sql
+            )
+
+    def _finish(self, with_plan: bool = True) -> None:
+        pending, self._pending = self._pending, None
+        if pending is None:
+            return
+        conn = self.connection
+        # Writes return no rows, so count the rows they changed instead
+        rows = pending["rows"] or max(self.rowcount, 0)
+        statements = conn.traced_statements - pending["statements"]
+        elapsed_ms = pending["elapsed"] * 1000
+        query_stats.record(
+            pending["caller"], pending["sql"], elapsed_ms, rows, statements
+        )
+        if elapsed_ms >= get_slow_ms():
+            self._log_slow(pending, elapsed_ms, rows, with_plan)
+
+    def _log_slow(
+        self, pending: dict, elapsed_ms: float, rows: int, with_plan: bool
+    ) -> None:
+        plan = []
+        if with_plan:
+            plan = explain(
+                self.connection, pending["sql"], pending["parameters"]
+            )
+        slow_query = {
+            "caller": pending["caller"],
+            "sql": pending["sql"],
+            "expanded_sql": pending["expanded_sql"] or pending["sql"],
+            "elapsed_ms": elapsed_ms,
+            "rows": rows,
+            "plan": plan,
+            "at": time.strftime("%Y-%m-%d %H:%M:%S"),
+        }
+        query_stats.record_slow(slow_query)
+        logger.warning(
+            f"[QUERY] Slow query ({elapsed_ms:.1f} ms, {rows} rows) in "
+            f"{pending['caller']}: {pending['sql']} | plan: "
+            f"{'; '.join(plan) or 'not explained'}"
+        )
+
+    def execute(self, sql, parameters=()):
+        self._start(sql, parameters)
+        start = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            self._timed(start)
+
+    def executemany(self, sql, seq_of_parameters):
+        self._start(sql, None, many=True)
+        start = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            self._timed(start)
+
+    def fetchone(self):
+        start = time.perf_counter()
+        row = super().fetchone()
+        self._timed(start, row is not None)
+        if row is None:
+            self._finish()
+        return row
+
+    def fetchmany(self, size=None):
+        start = time.perf_counter()
+        size = self.arraysize if size is None else size
+        rows = super().fetchmany(size)
+        self._timed(start, len(rows))
+        if len(rows) < size:
+            self._finish()
+        return rows
+
+    def __next__(self):
+        start = time.perf_counter()
+        try:
+            row = super().__next__()
+        except StopIteration:
+            self._finish()
+            raise
+        self._timed(start, 1)
+        return row
+
+    def fetchall(self):
+        start = time.perf_counter()
+        rows = super().fetchall()
+        self._timed(start, len(rows))
+        self._finish()
+        return rows
+
+    def close(self):
+        self._finish()
+        super().close()
+
+    def __del__(self):
+        # Statistics must never break garbage collection, and running
+        # EXPLAIN from a finalizer could touch a connection in use elsewhere
+        try:
+            self._finish(with_plan=False)
+        except Exception:
+            pass
+
+
+class InstrumentedConnection(sqlite3.Connection):
+    """Connection whose cursors, including those of execute(), are timed."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.traced_statements = 0
+        # The first statement traced since the last execute(), with its
+        # parameters expanded
+        self.expanded_sql = None
+        self.set_trace_callback(self._trace)
+
+    def _trace(self, sql: str) -> None:
+        self.traced_statements += 1
+        if self.expanded_sql is None and not sql.startswith("BEGIN"):
+            self.expanded_sql = sql
+
+    def cursor(self, factory=TimedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+
+def explain(conn: sqlite3.Connection, sql: str, parameters=None) -> List[str]:
+    """
+    Return the EXPLAIN QUERY PLAN of `sql` on `conn`, one line per step,
+    or an empty list when it cannot be explained.
+    """
+    if parameters is None:
+        return []
+    try:
+        # A plain cursor, so that explaining is not itself instrumented
+        cursor = sqlite3.Cursor(conn)
+        cursor.execute(f"EXPLAIN QUERY PLAN {sql}", parameters)
+        return [row[-1] for row in cursor.fetchall()]
+    except sqlite3.Error as err:
+        logger.debug(f"[QUERY] Cannot explain {sql}: {err}")
+        return []
+
+
+def get_stats() -> dict:
+    """Return the instrumentation settings, statistics and slow queries."""
+    return {
+        "enabled": is_enabled(),
+        "slow_ms": get_slow_ms(),
+        "buckets_ms": list(LATENCY_BUCKETS_MS),
+        "statements": query_stats.statements(),
+        "slow_queries": query_stats.slow_queries(),
+    }
+
+
+def reset_stats() -> None:
+    """Forget all statistics and slow queries recorded so far."""
+    query_stats.reset()
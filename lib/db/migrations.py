@@ -0,0 +1,259 @@
+"""
+Versioned schema migrations.
+
+Migrations are SQL scripts in lib/db/sql/migrations named NNNN_description.sql.
+The database records the number of the last migration applied in
+PRAGMA user_version; migrate() applies every later script in order, each in
+its own transaction together with the user_version bump, so a failed
+migration leaves the database at the previous version.
+
+A script whose first lines include "-- requires: <feature>" is only run if
+the SQLite build supports that feature (see FEATURES); otherwise it is
+skipped, and the version still advances so later migrations can run. Skipped
+migrations are recorded in the skipped_migrations table and applied by a
+later run once the feature is available.
+
+Usage: python -m lib.db.migrations [--dry-run] [--db PATH]
+"""
+
+import argparse
+import logging
+import re
+import sqlite3
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import List, Optional
+from lib.db.fts import forget_fts_tables, fts5_trigram_available
+from lib.db.utils import get_db_path, get_migrations_path
+
+logger = logging.getLogger(__name__)
+
+MIGRATION_FILENAME = re.compile(r"^(\d{4})_(\w+)\.sql$")
+REQUIRES_DIRECTIVE = re.compile(r"^--\s*requires:\s*([\w-]+)\s*$")
+
+# Optional SQLite features a migration can depend on
+FEATURES = {"fts5-trigram": fts5_trigram_available}
+
+# Migrations skipped for a missing feature, retried on every run
+SKIPPED_TABLE = "skipped_migrations"
+
+
+@dataclass(frozen=True)
+class Migration:
+    version: int
+    name: str
+    path: Path
+
+    def requires(self) -> List[str]:
+        """Return the features named in the script's leading comment lines."""
+        features = []
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                if not line.startswith("--"):
+                    break
+                if match := REQUIRES_DIRECTIVE.match(line.strip()):
+                    if match[1] not in FEATURES:
+                        raise ValueError(
+                            f"[MIGRATE] {self.path.name} requires unknown feature {match[1]}"
+                        )
+                    features.append(match[1])
+        return features
+
+    def statements(self) -> List[str]:
+        """Split the script into complete SQL statements, keeping trigger bodies intact."""
+        statements = []
+        buffer = ""
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                buffer += line
+                if sqlite3.complete_statement(buffer):
+                    statements.append(buffer.strip())
+                    buffer = ""
+        if buffer.strip() and not _is_comment_only(buffer):
+            raise ValueError(
+                f"[MIGRATE] Incomplete statement at end of {self.path.name}"
+            )
+        return statements
+
+
+def _is_comment_only(sql: str) -> bool:
+    return all(
+        not line.strip() or line.strip().startswith("--")
+        for line in sql.splitlines()
+    )
+
+
+def discover_migrations(
+    migrations_path: Optional[Path] = None,
+) -> List[Migration]:
+    """Return all migration scripts, ordered by version."""
+    migrations_path = migrations_path or get_migrations_path()
+    migrations = []
+    for path in migrations_path.glob("*.sql"):
+        match = MIGRATION_FILENAME.match(path.name)
+        if not match:
+            logger.warning(f"[MIGRATE] Ignoring unrecognised file {path.name}")
+            continue
+        migrations.append(Migration(int(match[1]), match[2], path))
+    migrations.sort(key=lambda m: m.version)
+    versions = [m.version for m in migrations]
+    if len(versions) != len(set(versions)):
+        raise ValueError("[MIGRATE] Duplicate migration version numbers")
+    return migrations
+
+
+def get_schema_version(conn: sqlite3.Connection) -> int:
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def get_skipped_versions(conn: sqlite3.Connection) -> set:
+    """Return the versions of migrations skipped for a missing feature."""
+    exists = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?",
+        (SKIPPED_TABLE,),
+    ).fetchone()
+    if not exists:
+        return set()
+    return {
+        row[0] for row in conn.execute(f"SELECT version FROM {SKIPPED_TABLE}")
+    }
+
+
+def _missing_features(conn: sqlite3.Connection, migration: Migration) -> list:
+    return [
+        feature
+        for feature in migration.requires()
+        if not FEATURES[feature](conn)
+    ]
+
+
+def _apply(
+    conn: sqlite3.Connection, migration: Migration, retry: bool = False
+) -> None:
+    """
+    Run `migration`, or record it as skipped if SQLite lacks a feature it
+    requires. With `retry`, it was skipped before and is now cleared.
+    """
+    if missing := _missing_features(conn, migration):
+        logger.warning(
+            f"[MIGRATE] Skipping {migration.version:04d}_{migration.name}: "
+            f"SQLite lacks {', '.join(missing)}"
+        )
+        conn.execute(f"""
+            CREATE TABLE IF NOT EXISTS {SKIPPED_TABLE} (
+                version INTEGER PRIMARY KEY,
+                name TEXT NOT NULL
+            )""")
+        conn.execute(
+            f"INSERT OR IGNORE INTO {SKIPPED_TABLE} VALUES (?, ?)",
+            (migration.version, migration.name),
+        )
+        return
+    for statement in migration.statements():
+        conn.execute(statement)
+    if retry:
+        conn.execute(
+            f"DELETE FROM {SKIPPED_TABLE} WHERE version = ?",
+            (migration.version,),
+        )
+
+
+def migrate(
+    db_path: Optional[Path] = None,
+    dry_run: bool = False,
+    migrations_path: Optional[Path] = None,
+) -> List[tuple]:
+    """
+    Apply pending migrations to the database at `db_path`.
+
+    With `dry_run`, every pending migration is executed and timed, then the
+    whole run is rolled back, leaving the database untouched.
+    :return: a list of (version, name, seconds) for each migration run
+    """
+    db_path = db_path or get_db_path()
+    migrations = discover_migrations(migrations_path)
+    results = []
+
+    conn = sqlite3.connect(db_path)
+    try:
+        current = get_schema_version(conn)
+        skipped = get_skipped_versions(conn)
+        # Skipped migrations whose features have since become available
+        retried = [
+            m
+            for m in migrations
+            if m.version in skipped and not _missing_features(conn, m)
+        ]
+        pending = retried + [m for m in migrations if m.version > current]
+        if migrations and current > migrations[-1].version:
+            logger.warning(
+                f"[MIGRATE] Database version {current} is newer than the latest known migration"
+            )
+        if not pending:
+            logger.info(
+                f"[MIGRATE] Database is up to date (version {current})"
+            )
+            return results
+
+        if dry_run:
+            conn.execute("BEGIN")
+        for migration in pending:
+            start = time.perf_counter()
+            try:
+                if not dry_run:
+                    conn.execute("BEGIN")
+                _apply(conn, migration, retry=migration in retried)
+                # A retried migration never moves the version backwards
+                current = max(current, migration.version)
+                conn.execute(f"PRAGMA user_version = {current}")
+                if not dry_run:
+                    conn.commit()
+            except sqlite3.Error as err:
+                conn.rollback()
+                if migration in retried and not dry_run:
+                    # Still recorded as skipped, so it is tried again later
+                    logger.warning(
+                        f"[MIGRATE] Retrying {migration.version:04d}_{migration.name} failed: {err}"
+                    )
+                    continue
+                logger.error(
+                    f"[MIGRATE] Migration {migration.version:04d}_{migration.name} failed: {err}"
+                )
+                raise
+            elapsed = time.perf_counter() - start
+            results.append((migration.version, migration.name, elapsed))
+            logger.info(
+                f"[MIGRATE] {'Dry-ran' if dry_run else 'Applied'} "
+                f"{migration.version:04d}_{migration.name} in {elapsed:.3f}s"
+            )
+        if dry_run:
+            conn.rollback()
+    finally:
+        conn.close()
+        forget_fts_tables(db_path)
+
+    return results
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Apply database migrations.")
+    parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="run pending migrations and print timings, then roll back",
+    )
+    parser.add_argument("--db", type=Path, help="database path")
+    args = parser.parse_args(argv)
+
+    results = migrate(db_path=args.db, dry_run=args.dry_run)
+    if not results:
+        print("No pending migrations.")
+    for version, name, elapsed in results:
+        print(f"{version:04d}_{name}: {elapsed * 1000:.1f} ms")
+    if args.dry_run and results:
+        print("Dry run: all changes rolled back.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,41 @@
+from decimal import ROUND_HALF_UP, Decimal
+from typing import Optional
+
+# Money is stored as integer pence and VAT rates as integer basis points,
+# so that sums and comparisons in SQL and Python are exact. Models keep
+# amounts in pounds and rates as fractions (0.2 for 20%); repositories
+# convert at the database boundary.
+PENCE_PER_POUND = 100
+BASIS_POINTS_PER_UNIT = 10000
+
+
+def _to_units(value, scale: int) -> Optional[int]:
+    if value is None:
+        return None
+    # str() gives the shortest repr of a float, so 0.1 + 0.2 becomes 30p
+    scaled = Decimal(str(value)) * scale
+    return int(scaled.quantize(Decimal(1), rounding=ROUND_HALF_UP))
+
+
+def to_pence(amount) -> Optional[int]:
+    """Convert an amount in pounds to integer pence, rounding half up."""
+    return _to_units(amount, PENCE_PER_POUND)
+
+
+def from_pence(pence: Optional[int]) -> Optional[float]:
+    """Convert integer pence to pounds."""
+    if pence is None:
+        return None
+    return pence / PENCE_PER_POUND
+
+
+def to_basis_points(rate) -> Optional[int]:
+    """Convert a fractional rate (0.2 for 20%) to integer basis points."""
+    return _to_units(rate, BASIS_POINTS_PER_UNIT)
+
+
+def from_basis_points(basis_points: Optional[int]) -> Optional[float]:
+    """Convert integer basis points to a fractional rate."""
+    if basis_points is None:
+        return None
+    return basis_points / BASIS_POINTS_PER_UNIT
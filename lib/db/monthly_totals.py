@@ -0,0 +1,147 @@
+"""
+The monthly_totals summary table.
+
+Triggers added by migration 0006 keep one row of running totals per
+(kind, year, month, vat_percent, payment_method), so that period reports
+read O(months) rows rather than every transaction. rebuild() recomputes
+the table from sales and purchases; check() lists the groups where the
+stored totals differ from a fresh computation.
+
+Usage: python -m lib.db.monthly_totals [--check] [--db PATH]
+"""
+
+import argparse
+import logging
+import sqlite3
+from pathlib import Path
+from typing import List, Optional
+from lib.db.cache import bump_generation
+from lib.db.pool import get_connection
+from lib.db.utils import get_db_path
+
+logger = logging.getLogger(__name__)
+
+KEY_COLUMNS = ("kind", "year", "month", "vat_percent", "payment_method")
+TOTAL_COLUMNS = (
+    "count",
+    "net",
+    "vat",
+    "goods",
+    "utilities",
+    "motor_expenses",
+    "sundries",
+    "miscellaneous",
+)
+
+_GROUPS = """
+    CAST(strftime('%Y', timestamp) AS INTEGER),
+    CAST(strftime('%m', timestamp) AS INTEGER),
+    COALESCE(vat_percent, 0),
+    COALESCE(payment_method, ''),
+    COUNT(*),
+    COALESCE(SUM(net_amount), 0),
+    COALESCE(SUM(CAST(ROUND(net_amount * vat_percent / 10000.0) AS INTEGER)), 0)
+"""
+
+# Totals computed from the transactions, in the column order of the table
+EXPECTED_TOTALS = f"""
+    SELECT 'sales', {_GROUPS}, 0, 0, 0, 0, 0
+    FROM sales WHERE timestamp IS NOT NULL
+    GROUP BY 2, 3, 4, 5
+    UNION ALL
+    SELECT 'purchases', {_GROUPS},
+        COALESCE(SUM(goods), 0),
+        COALESCE(SUM(utilities), 0),
+        COALESCE(SUM(motor_expenses), 0),
+        COALESCE(SUM(sundries), 0),
+        COALESCE(SUM(miscellaneous), 0)
+    FROM purchases WHERE timestamp IS NOT NULL
+    GROUP BY 2, 3, 4, 5
+"""
+
+STORED_TOTALS = (
+    f"SELECT {', '.join(KEY_COLUMNS + TOTAL_COLUMNS)} FROM monthly_totals"
+)
+
+
+def rebuild(db_path: Optional[Path] = None) -> int:
+    """
+    Recomputes monthly_totals from scratch in one transaction.
+    :return: the number of groups written
+    """
+    db_path = db_path or get_db_path()
+    with get_connection(db_path) as conn:
+        cursor = conn.cursor()
+        cursor.execute("DELETE FROM monthly_totals")
+        cursor.execute(
+            f"INSERT INTO monthly_totals "
+            f"({', '.join(KEY_COLUMNS + TOTAL_COLUMNS)}) {EXPECTED_TOTALS}"
+        )
+        groups = cursor.rowcount
+        conn.commit()
+    bump_generation(db_path)
+    logger.info(f"[TOTALS] Rebuilt monthly totals ({groups} groups)")
+    return groups
+
+
+def check(db_path: Optional[Path] = None) -> List[tuple]:
+    """
+    Compares monthly_totals with totals computed from the transactions.
+    :return: the (source, *row) of every differing group, where source is
+        "stored" for rows only in monthly_totals and "expected" for rows
+        missing from it; empty when the table is consistent
+    """
+    with get_connection(db_path or get_db_path()) as conn:
+        cursor = conn.cursor()
+        cursor.execute(f"""
+            WITH expected AS ({EXPECTED_TOTALS}),
+                stored AS ({STORED_TOTALS})
+            SELECT 'stored', * FROM (
+                SELECT * FROM stored EXCEPT SELECT * FROM expected
+            )
+            UNION ALL
+            SELECT 'expected', * FROM (
+                SELECT * FROM expected EXCEPT SELECT * FROM stored
+            )
+            ORDER BY 2, 3, 4, 5, 6, 1
+            """)
+        mismatches = cursor.fetchall()
+    if mismatches:
+        logger.warning(
+            f"[TOTALS] {len(mismatches)} monthly total rows are inconsistent"
+        )
+    return mismatches
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(
+        description="Rebuild or check the monthly totals summary table."
+    )
+    parser.add_argument(
+        "--check",
+        action="store_true",
+        help="report inconsistent groups instead of rebuilding",
+    )
+    parser.add_argument("--db", type=Path, help="database path")
+    args = parser.parse_args(argv)
+
+    try:
+        if args.check:
+            mismatches = check(args.db)
+            for mismatch in mismatches:
+                print(*mismatch, sep="\t")
+            print(
+                f"{len(mismatches)} inconsistent rows."
+                if mismatches
+                else "Monthly totals are consistent."
+            )
+            if mismatches:
+                raise SystemExit(1)
+        else:
+            print(f"Rebuilt {rebuild(args.db)} monthly total groups.")
+    except sqlite3.OperationalError as err:
+        raise SystemExit(f"Cannot use monthly totals: {err}")
+
+
+if __name__ == "__main__":
+    main()
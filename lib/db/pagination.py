@@ -0,0 +1,117 @@
+import base64
+import binascii
+import json
+import logging
+from typing import List, NamedTuple, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class Cursor(NamedTuple):
+    """
+    Position in a list of transactions ordered by (timestamp, id).
+
+    `direction` is "next" to read the rows after (timestamp, id), or "prev" to
+    read the rows before it. `page` is the number of the page being fetched,
+    carried along so the UI can show it without counting preceding rows.
+    """
+
+    timestamp: str
+    id: int
+    direction: str
+    page: int
+
+
+class Page(NamedTuple):
+    items: List
+    total: int
+    page: int
+    next_cursor: Optional[str]
+    prev_cursor: Optional[str]
+
+
+def encode_cursor(cursor: Cursor) -> str:
+    """Encode a cursor as an opaque URL-safe token."""
+    payload = json.dumps(list(cursor), separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(token: Optional[str]) -> Optional[Cursor]:
+    """Decode a token from encode_cursor(), or return None if it is missing or invalid."""
+    if not token:
+        return None
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(token.encode("ascii")))
+        cursor = Cursor(*payload)
+    except (binascii.Error, ValueError, TypeError, UnicodeError) as err:
+        logger.warning(f"[PAGINATE] Ignoring invalid cursor {token!r}: {err}")
+        return None
+    if cursor.direction not in ("next", "prev"):
+        logger.warning(
+            f"[PAGINATE] Ignoring cursor with direction {cursor.direction!r}"
+        )
+        return None
+    return cursor
+
+
+def keyset_clause(cursor: Optional[Cursor]) -> tuple:
+    """
+    Return (condition, params, order) SQL fragments that select the rows
+    after or before `cursor` in (timestamp, id) order.
+    """
+    if cursor is None:
+        return "", [], " ORDER BY timestamp, id"
+    if cursor.direction == "prev":
+        return (
+            " AND (timestamp, id) < (?, ?)",
+            [cursor.timestamp, cursor.id],
+            " ORDER BY timestamp DESC, id DESC",
+        )
+    return (
+        " AND (timestamp, id) > (?, ?)",
+        [cursor.timestamp, cursor.id],
+        " ORDER BY timestamp, id",
+    )
+
+
+def fetch_page(
+    repo, filters: dict, per_page: int, token: Optional[str] = None
+) -> Page:
+    """
+    Fetch one page of transactions from `repo` matching `filters`, starting
+    at the position encoded in `token` (or the first page if None).
+    """
+    cursor = decode_cursor(token)
+    page_number = cursor.page if cursor else 1
+    # One extra row tells us whether there is anything beyond this page
+    items = repo.search(filters, limit=per_page + 1, page_cursor=cursor)
+    more = len(items) > per_page
+
+    if cursor and cursor.direction == "prev":
+        # Rows come back in ascending order, so the extra row is the first
+        items = items[-per_page:]
+        has_prev, has_next = more, True
+    else:
+        items = items[:per_page]
+        has_prev, has_next = cursor is not None, more
+
+    has_prev = has_prev and page_number > 1
+    next_cursor = prev_cursor = None
+    if items and has_next:
+        last = items[-1]
+        next_cursor = encode_cursor(
+            Cursor(last.timestamp, last.id, "next", page_number + 1)
+        )
+    if items and has_prev:
+        first = items[0]
+        prev_cursor = encode_cursor(
+            Cursor(first.timestamp, first.id, "prev", page_number - 1)
+        )
+
+    return Page(
+        items=items,
+        total=repo.count(filters),
+        page=page_number,
+        next_cursor=next_cursor,
+        prev_cursor=prev_cursor,
+    )
@@ -0,0 +1,183 @@
+import atexit
+import logging
+import sqlite3
+import threading
+from pathlib import Path
+from lib.db import instrumentation
+from lib.db.profiles import apply_profile
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_SIZE = 16
+
+
+class ConnectionPool:
+    """
+    Thread-local pool of SQLite connections, keyed by database path.
+
+    Each thread gets at most one connection per database, which it reuses for
+    every repository call. Reusing connections avoids the cost of opening the
+    file on every operation and keeps SQLite's prepared statement cache warm.
+    Connections are only ever used by the thread that opened them; the pool
+    keeps a registry of them so that they can be reaped when their thread
+    exits and closed together at shutdown.
+    """
+
+    def __init__(self, max_size: int = DEFAULT_MAX_SIZE, health_check=True):
+        self.max_size = max_size
+        self.health_check = health_check
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        # (thread, db_path) -> connection, for every pooled connection
+        self._registry = {}
+        # db_path -> connection used only to read PRAGMA data_version
+        self._watchers = {}
+
+    def _thread_connections(self) -> dict:
+        conns = getattr(self._local, "connections", None)
+        if conns is None:
+            conns = self._local.connections = {}
+        return conns
+
+    def _is_healthy(self, conn) -> bool:
+        try:
+            conn.execute("SELECT 1")
+            return True
+        except sqlite3.Error as err:
+            logger.warning(f"[POOL] Discarding unhealthy connection: {err}")
+            return False
+
+    def _open(self, db_path) -> sqlite3.Connection:
+        # Connections are only used by their owning thread, but may be closed
+        # from another thread by close_all() or reaping.
+        options = {"check_same_thread": False}
+        if instrumentation.is_enabled():
+            options["factory"] = instrumentation.InstrumentedConnection
+        conn = sqlite3.connect(db_path, **options)
+        apply_profile(conn)
+        return conn
+
+    def _reap_dead_threads(self) -> None:
+        """Close connections owned by threads that have exited. Caller holds the lock."""
+        for key in [k for k in self._registry if not k[0].is_alive()]:
+            conn = self._registry.pop(key)
+            try:
+                conn.close()
+            except sqlite3.Error:
+                pass
+
+    def connect(self, db_path) -> sqlite3.Connection:
+        """Return this thread's connection to `db_path`, opening one if needed."""
+        key = str(db_path)
+        conns = self._thread_connections()
+        conn = conns.get(key)
+        if conn is not None:
+            if not self.health_check or self._is_healthy(conn):
+                return conn
+            self._discard(key)
+
+        conn = self._open(db_path)
+        thread = threading.current_thread()
+        with self._lock:
+            if len(self._registry) >= self.max_size:
+                self._reap_dead_threads()
+            if len(self._registry) >= self.max_size:
+                # Pool is full of live connections: hand out an unpooled
+                # connection, which is closed when it is garbage collected.
+                logger.debug("[POOL] Pool full, opening unpooled connection")
+                return conn
+            self._registry[(thread, key)] = conn
+        conns[key] = conn
+        return conn
+
+    def _discard(self, key: str) -> None:
+        conns = self._thread_connections()
+        conn = conns.pop(key, None)
+        with self._lock:
+            self._registry.pop((threading.current_thread(), key), None)
+        if conn is not None:
+            try:
+                conn.close()
+            except sqlite3.Error:
+                pass
+
+    def release(self, db_path=None) -> None:
+        """Close the calling thread's connection to `db_path`, or all of them if None."""
+        keys = (
+            [str(db_path)]
+            if db_path is not None
+            else list(self._thread_connections())
+        )
+        for key in keys:
+            self._discard(key)
+
+    def data_version(self, db_path) -> int:
+        """
+        Return PRAGMA data_version of a long-lived connection to `db_path`.
+        The value changes whenever any other connection, in this process or
+        another, commits to the database. A fresh connection cannot tell
+        whether writes happened before it opened, so one watcher connection
+        per database is kept open, shared by all threads.
+        """
+        key = str(db_path)
+        with self._lock:
+            conn = self._watchers.get(key)
+            if conn is None:
+                conn = sqlite3.connect(db_path, check_same_thread=False)
+                self._watchers[key] = conn
+            return conn.execute("PRAGMA data_version").fetchone()[0]
+
+    def close_all(self) -> None:
+        """Close every pooled connection, across all threads."""
+        with self._lock:
+            registry, self._registry = self._registry, {}
+            watchers, self._watchers = self._watchers, {}
+        for conn in [*registry.values(), *watchers.values()]:
+            try:
+                conn.close()
+            except sqlite3.Error as err:
+                logger.warning(f"[POOL] Failed to close connection: {err}")
+        # Dropping the thread-local also forgets this thread's connections.
+        self._local = threading.local()
+        if registry:
+            logger.info(f"[POOL] Closed {len(registry)} pooled connection(s)")
+
+    def size(self) -> int:
+        """Return the number of pooled connections currently open."""
+        with self._lock:
+            return len(self._registry)
+
+
+_pool = ConnectionPool()
+
+
+def get_pool() -> ConnectionPool:
+    """Return the shared connection pool used by all repositories."""
+    return _pool
+
+
+def configure_pool(
+    max_size: int = DEFAULT_MAX_SIZE, health_check=True
+) -> None:
+    """Replace the shared pool, closing any connections held by the old one."""
+    global _pool
+    _pool.close_all()
+    _pool = ConnectionPool(max_size=max_size, health_check=health_check)
+
+
+def get_connection(db_path: Path) -> sqlite3.Connection:
+    """Return a pooled connection to `db_path` for the calling thread."""
+    return _pool.connect(db_path)
+
+
+def data_version(db_path: Path) -> int:
+    """Return a counter which changes whenever `db_path` is committed to."""
+    return _pool.data_version(db_path)
+
+
+def close_all_connections() -> None:
+    """Close every connection held by the shared pool."""
+    _pool.close_all()
+
+
+atexit.register(close_all_connections)
@@ -1,15 +1,61 @@
 import logging
-import sqlite3
 from datetime import datetime
 from pathlib import Path
-from typing import List, Optional
+from typing import Iterable, Iterator, List, Optional, Tuple
+from lib.db.bulk import DEFAULT_CHUNK_SIZE, insert_many, iter_rows
+from lib.db.cache import (
+    QueryCache,
+    bump_generation,
+    cache_key,
+    get_version,
+)
+from lib.db.filters import FilterCompiler
+from lib.db.fts import fts_tables
+from lib.db.money import (
+    from_basis_points,
+    from_pence,
+    to_basis_points,
+    to_pence,
+)
+from lib.db.pagination import Cursor, keyset_clause
+from lib.db.pool import get_connection
 from lib.db.transaction import Transaction, TransactionRepository
-from lib.db.utils import get_db_path, normalize_datetime
+from lib.db.utils import (
+    canonical_datetime,
+    get_db_path,
+    normalize_datetime,
+)
 
 logger = logging.getLogger(__name__)
 
+# Results are reused until a write, in this process or another, changes
+# the database version. Stored rows are cached, since they are immutable,
+# and each hit hydrates new models from them.
+_result_cache = QueryCache(
+    max_entries=256, version=get_version, name="purchases"
+)
+_facet_cache = QueryCache(version=get_version, name="purchases_facets")
+
 
 class Purchase(Transaction):
+    __slots__ = (
+        "id",
+        "supplier_id",
+        "supplier_name",
+        "supplier_invoice_code",
+        "internal_invoice_number",
+        "net_amount",
+        "vat_percent",
+        "goods",
+        "utilities",
+        "motor_expenses",
+        "sundries",
+        "miscellaneous",
+        "payment_method",
+        "timestamp",
+        "capital_spend",
+    )
+
     def __init__(
         self,
         id: Optional[int],
@@ -29,13 +75,14 @@ class Purchase(Transaction):
         capital_spend: bool,
     ):
         # Fail fast if the cost breakdown is incorrect
-        component_sum = sum(
-            [goods, utilities, motor_expenses, sundries, miscellaneous]
+        self.check_breakdown(
+            net_amount,
+            goods,
+            utilities,
+            motor_expenses,
+            sundries,
+            miscellaneous,
         )
-        if net_amount != round(component_sum, 2):
-            raise ValueError(
-                f"Net amount ({net_amount}) does not equal sum of components ({component_sum})."
-            )
         self.id = id
         self.supplier_id = supplier_id
         self.supplier_name = supplier_name
@@ -56,19 +103,154 @@ class Purchase(Transaction):
             self.timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         self.capital_spend = capital_spend
 
+    @staticmethod
+    def check_breakdown(net_amount: float, *components: float) -> None:
+        """
+        Raises ValueError unless the cost components add up to the net
+        amount, comparing whole pence.
+        """
+        component_sum = sum(to_pence(c) for c in components)
+        if to_pence(net_amount) != component_sum:
+            raise ValueError(
+                f"Net amount ({net_amount}) does not equal sum of components ({from_pence(component_sum)})."
+            )
+
+    @classmethod
+    def from_row(cls, row) -> "Purchase":
+        """
+        Builds a purchase from a stored (id, *COLUMNS) row. _to_row()
+        validates and normalises every row written, so the cost breakdown
+        and timestamp are not checked again.
+        """
+        purchase = cls.__new__(cls)
+        (
+            purchase.id,
+            purchase.supplier_id,
+            purchase.supplier_name,
+            purchase.supplier_invoice_code,
+            purchase.internal_invoice_number,
+            net_amount,
+            vat_percent,
+            goods,
+            utilities,
+            motor_expenses,
+            sundries,
+            miscellaneous,
+            purchase.payment_method,
+            purchase.timestamp,
+            capital_spend,
+        ) = row
+        purchase.net_amount = from_pence(net_amount)
+        purchase.vat_percent = from_basis_points(vat_percent)
+        purchase.goods = from_pence(goods)
+        purchase.utilities = from_pence(utilities)
+        purchase.motor_expenses = from_pence(motor_expenses)
+        purchase.sundries = from_pence(sundries)
+        purchase.miscellaneous = from_pence(miscellaneous)
+        purchase.capital_spend = bool(capital_spend)
+        return purchase
+
+    def _values(self) -> tuple:
+        return tuple(getattr(self, name) for name in self.__slots__)
+
     def __eq__(self, other: object) -> bool:
-        return isinstance(other, Purchase) and self.__dict__ == other.__dict__
+        return (
+            isinstance(other, Purchase) and self._values() == other._values()
+        )
 
     def __repr__(self):
         return f"Purchase(id={self.id}, internal_invoice_number='{self.internal_invoice_number}', supplier_name='{self.supplier_name}')"
 
 
 class PurchaseRepository(TransactionRepository[Purchase]):
+    COLUMNS = (
+        "supplier_id",
+        "supplier_name",
+        "supplier_invoice_code",
+        "internal_invoice_number",
+        "net_amount",
+        "vat_percent",
+        "goods",
+        "utilities",
+        "motor_expenses",
+        "sundries",
+        "miscellaneous",
+        "payment_method",
+        "timestamp",
+        "capital_spend",
+    )
+    SELECT = f"SELECT id, {', '.join(COLUMNS)} FROM purchases"
+
+    # Facet column -> the filter on that column, which is ignored when
+    # counting its own values so that every option stays selectable
+    FACETS = {"vat_percent": "vat", "payment_method": "payment"}
+
+    # Filter name -> the columns it matches
+    FILTERS = FilterCompiler(
+        "purchases",
+        substrings={
+            "supplier": "supplier_name",
+            "supplier_invoice": "supplier_invoice_code",
+            "internal_invoice": "internal_invoice_number",
+        },
+        ranges={
+            "net": "net_amount",
+            "goods": "goods",
+            "utilities": "utilities",
+            "motor_expenses": "motor_expenses",
+            "sundries": "sundries",
+            "miscellaneous": "miscellaneous",
+        },
+        flags={"capital_spend": "capital_spend"},
+    )
+
     def __init__(self, db_path: Optional[Path] = None):
         self.db_path = db_path or get_db_path()
 
     def _connect(self):
-        return sqlite3.connect(self.db_path)
+        return get_connection(self.db_path)
+
+    @staticmethod
+    def _to_row(purchase: Purchase) -> tuple:
+        """
+        Returns the COLUMNS values stored for a purchase, with money in
+        pence. The cost breakdown is checked and the timestamp normalised
+        again, since callers may have set them directly.
+        """
+        Purchase.check_breakdown(
+            purchase.net_amount,
+            purchase.goods,
+            purchase.utilities,
+            purchase.motor_expenses,
+            purchase.sundries,
+            purchase.miscellaneous,
+        )
+        return (
+            purchase.supplier_id,
+            purchase.supplier_name,
+            purchase.supplier_invoice_code,
+            purchase.internal_invoice_number,
+            to_pence(purchase.net_amount),
+            to_basis_points(purchase.vat_percent),
+            to_pence(purchase.goods),
+            to_pence(purchase.utilities),
+            to_pence(purchase.motor_expenses),
+            to_pence(purchase.sundries),
+            to_pence(purchase.miscellaneous),
+            purchase.payment_method,
+            canonical_datetime(purchase.timestamp),
+            int(purchase.capital_spend),
+        )
+
+    @staticmethod
+    def _row_factory(cursor, row) -> Purchase:
+        return Purchase.from_row(row)
+
+    def _model_cursor(self, conn):
+        """Returns a cursor which hydrates each fetched row as a Purchase."""
+        cursor = conn.cursor()
+        cursor.row_factory = self._row_factory
+        return cursor
 
     def create(self, purchase: Purchase) -> Purchase:
         created_purchase = None
@@ -82,24 +264,10 @@ class PurchaseRepository(TransactionRepository[Purchase]):
                         vat_percent, goods, utilities, motor_expenses, sundries, miscellaneous,
                         payment_method, timestamp, capital_spend
                     ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
-                    (
-                        purchase.supplier_id,
-                        purchase.supplier_name,
-                        purchase.supplier_invoice_code,
-                        purchase.internal_invoice_number,
-                        purchase.net_amount,
-                        purchase.vat_percent,
-                        purchase.goods,
-                        purchase.utilities,
-                        purchase.motor_expenses,
-                        purchase.sundries,
-                        purchase.miscellaneous,
-                        purchase.payment_method,
-                        purchase.timestamp,
-                        int(purchase.capital_spend),
-                    ),
+                    self._to_row(purchase),
                 )
                 conn.commit()
+                bump_generation(self.db_path)
                 created_purchase = Purchase(
                     cursor.lastrowid,
                     purchase.supplier_id,
@@ -125,31 +293,32 @@ class PurchaseRepository(TransactionRepository[Purchase]):
                         net_amount, vat_percent, goods, utilities, motor_expenses, sundries, miscellaneous,
                         payment_method, timestamp, capital_spend
                     ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
-                    (
-                        purchase.id,
-                        purchase.supplier_id,
-                        purchase.supplier_name,
-                        purchase.supplier_invoice_code,
-                        purchase.internal_invoice_number,
-                        purchase.net_amount,
-                        purchase.vat_percent,
-                        purchase.goods,
-                        purchase.utilities,
-                        purchase.motor_expenses,
-                        purchase.sundries,
-                        purchase.miscellaneous,
-                        purchase.payment_method,
-                        purchase.timestamp,
-                        int(purchase.capital_spend),
-                    ),
+                    (purchase.id, *self._to_row(purchase)),
                 )
                 conn.commit()
+                bump_generation(self.db_path)
                 created_purchase = purchase
         return created_purchase
 
+    def create_many(
+        self,
+        purchases: Iterable[Purchase],
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+    ) -> List[int]:
+        ids = insert_many(
+            self._connect(),
+            "purchases",
+            self.COLUMNS,
+            purchases,
+            self._to_row,
+            chunk_size,
+        )
+        bump_generation(self.db_path)
+        return ids
+
     def read(self, id: int) -> Optional[Purchase]:
         with self._connect() as conn:
-            cursor = conn.cursor()
+            cursor = self._model_cursor(conn)
             cursor.execute(
                 """
                 SELECT id, supplier_id, supplier_name, supplier_invoice_code, internal_invoice_number, net_amount,
@@ -158,13 +327,7 @@ class PurchaseRepository(TransactionRepository[Purchase]):
                 FROM purchases WHERE id = ?""",
                 (id,),
             )
-            row = cursor.fetchone()
-            if row:
-                # Convert capital_spend from int to bool
-                row = list(row)
-                row[-1] = bool(row[-1])
-                return Purchase(*row)
-            return None
+            return cursor.fetchone()
 
     def update(self, purchase: Purchase) -> Optional[Purchase]:
         with self._connect() as conn:
@@ -176,25 +339,10 @@ class PurchaseRepository(TransactionRepository[Purchase]):
                     vat_percent = ?, goods = ?, utilities = ?, motor_expenses = ?, sundries = ?, miscellaneous = ?,
                     payment_method = ?, timestamp = ?, capital_spend = ?
                 WHERE id = ?""",
-                (
-                    purchase.supplier_id,
-                    purchase.supplier_name,
-                    purchase.supplier_invoice_code,
-                    purchase.internal_invoice_number,
-                    purchase.net_amount,
-                    purchase.vat_percent,
-                    purchase.goods,
-                    purchase.utilities,
-                    purchase.motor_expenses,
-                    purchase.sundries,
-                    purchase.miscellaneous,
-                    purchase.payment_method,
-                    purchase.timestamp,
-                    int(purchase.capital_spend),
-                    purchase.id,
-                ),
+                (*self._to_row(purchase), purchase.id),
             )
             conn.commit()
+            bump_generation(self.db_path)
             return self.read(purchase.id)
 
     def delete(self, id: int) -> Optional[Purchase]:
@@ -205,125 +353,151 @@ class PurchaseRepository(TransactionRepository[Purchase]):
             cursor = conn.cursor()
             cursor.execute("DELETE FROM purchases WHERE id = ?", (id,))
             conn.commit()
+            bump_generation(self.db_path)
             return purchase
 
-    def search(self, filters: dict) -> List[Purchase]:
-        query = """
-            SELECT id, supplier_id, supplier_name, supplier_invoice_code, internal_invoice_number, net_amount, vat_percent, goods, utilities, motor_expenses, sundries, miscellaneous, payment_method, timestamp, capital_spend
-            FROM purchases WHERE 1=1
-        """
-        params = []
-        logger.info(f"Query filters: {filters}")
-        # Filter by supplier and/or invoice number
-        substring_filters = {
-            filters.get("supplier"): "supplier_name",
-            filters.get("supplier_invoice"): "supplier_invoice_code",
-            filters.get("internal_invoice"): "internal_invoice_number",
-        }
-        for substring in substring_filters.keys():
-            if substring:
-                query += f" AND LOWER({substring_filters[substring]}) LIKE ?"
-                params.append(f"%{substring.lower()}%")
-
-        # Filter by cost or cost breakdown
-        range_filters = [
-            {"name": "net_amount", "values": filters.get("net", {})},
-            {"name": "goods", "values": filters.get("goods", {})},
-            {"name": "utilities", "values": filters.get("utilities", {})},
-            {
-                "name": "motor_expenses",
-                "values": filters.get("motor_expenses", {}),
-            },
-            {"name": "sundries", "values": filters.get("sundries", {})},
-            {
-                "name": "miscellaneous",
-                "values": filters.get("miscellaneous", {}),
-            },
-        ]
-        logger.info(f"Range filters: {range_filters}")
-        for range in range_filters:
-            if "eq" in range["values"]:
-                query += f" AND {range["name"]} = ?"
-                params.append(range["values"]["eq"])
-                logger.info(
-                    f"Added {query},{range["values"]["eq"]} to query,params."
-                )
-            else:
-                if "min" in range["values"]:
-                    query += f" AND {range["name"]} >= ?"
-                    params.append(range["values"]["min"])
-                    logger.info(
-                        f"Added {query},{range["values"]["min"]} to query,params."
-                    )
-                if "max" in range["values"]:
-                    query += f" AND {range["name"]} <= ?"
-                    params.append(range["values"]["max"])
-                    logger.info(
-                        f"Added {query},{range["values"]["max"]} to query,params."
-                    )
-
-        # Filter by vat_percent
-        vat_filter = filters.get("vat")
-        if vat_filter:
-            placeholders = ",".join("?" for _ in vat_filter)
-            query += f" AND vat_percent IN ({placeholders})"
-            params.extend(vat_filter)
-
-        # Filter by payment_method
-        payment_filter = filters.get("payment")
-        if payment_filter:
-            placeholders = ",".join("?" for _ in payment_filter)
-            query += f" AND payment_method IN ({placeholders})"
-            params.extend(payment_filter)
-
-        # Filter by timestamp
-        timeFrom = normalize_datetime(filters.get("timeFrom"))
-        timeTo = normalize_datetime(filters.get("timeTo"))
-        if timeFrom:
-            query += " AND timestamp >= ?"
-            params.append(timeFrom)
-        if timeTo:
-            query += " AND timestamp <= ?"
-            params.append(timeTo)
-
-        # Filter by capital spend
-        if capital_spend := filters.get("capital_spend"):
-            if capital_spend == "True":
-                capital_spend = True
-            if capital_spend == "False":
-                capital_spend = False
-            query += " AND capital_spend >= ?"
-            params.append(int(capital_spend))
-
-        logger.info(f"query={query},params={params}")
+    def _use_fts(self) -> bool:
+        return "purchases_fts" in fts_tables(self._connect(), self.db_path)
+
+    def _search_query(
+        self,
+        filters: dict,
+        limit: Optional[int] = None,
+        page_cursor: Optional[Cursor] = None,
+    ) -> tuple:
+        shape, params = self.FILTERS.compile(filters, self._use_fts())
+        keyset, keyset_params, order = keyset_clause(page_cursor)
+        params += keyset_params
+        suffix = keyset + order
+        if limit is not None:
+            suffix += " LIMIT ?"
+            params.append(limit)
+        query = self.FILTERS.sql(self.SELECT, shape, suffix)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"[SEARCH] query={query},params={params}")
+        return query, params
+
+    def search(
+        self,
+        filters: dict,
+        limit: Optional[int] = None,
+        page_cursor: Optional[Cursor] = None,
+    ) -> List[Purchase]:
+        key = ("search", cache_key(filters), limit, page_cursor)
+        rows = _result_cache.get_or_compute(
+            self.db_path,
+            key,
+            lambda: self._search(filters, limit, page_cursor),
+        )
+        return [Purchase.from_row(row) for row in rows]
 
+    def _search(
+        self,
+        filters: dict,
+        limit: Optional[int] = None,
+        page_cursor: Optional[Cursor] = None,
+    ) -> Tuple[tuple, ...]:
+        query, params = self._search_query(filters, limit, page_cursor)
         with self._connect() as conn:
             cursor = conn.cursor()
             cursor.execute(query, params)
             rows = cursor.fetchall()
-            return [Purchase(*row) for row in rows]
+        if page_cursor and page_cursor.direction == "prev":
+            rows.reverse()
+        return tuple(rows)
 
-    def search_by_parent(self, entity) -> List[Purchase]:
+    def iter_search(
+        self, filters: dict, batch_size: int = DEFAULT_CHUNK_SIZE
+    ) -> Iterator[Purchase]:
+        query, params = self._search_query(filters)
+        yield from self._iter_query(query, params, batch_size)
+
+    def count(self, filters: dict) -> int:
+        return _result_cache.get_or_compute(
+            self.db_path,
+            ("count", cache_key(filters)),
+            lambda: self._count(filters),
+        )
+
+    def _count(self, filters: dict) -> int:
+        shape, params = self.FILTERS.compile(filters, self._use_fts())
         with self._connect() as conn:
             cursor = conn.cursor()
             cursor.execute(
-                """
-                SELECT id, supplier_id, supplier_name, supplier_invoice_code, internal_invoice_number, net_amount, vat_percent, goods, utilities, motor_expenses, sundries, miscellaneous, payment_method, timestamp, capital_spend
-                FROM purchases WHERE supplier_id = ?
-                """,
+                self.FILTERS.sql("SELECT COUNT(*) FROM purchases", shape),
+                params,
+            )
+            return cursor.fetchone()[0]
+
+    def facets(self, filters: Optional[dict] = None) -> dict:
+        filters = filters or {}
+        return _facet_cache.get_or_compute(
+            self.db_path, cache_key(filters), lambda: self._facets(filters)
+        )
+
+    def _facets(self, filters: dict) -> dict:
+        facets = {}
+        use_fts = self._use_fts()
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            for column, filter_name in self.FACETS.items():
+                shape, params = self.FILTERS.compile(
+                    {**filters, filter_name: []}, use_fts
+                )
+                query = self.FILTERS.sql(
+                    f"SELECT {column}, COUNT(*) FROM purchases",
+                    shape,
+                    f" GROUP BY {column} ORDER BY {column}",
+                )
+                cursor.execute(query, params)
+                rows = cursor.fetchall()
+                if column == "vat_percent":
+                    rows = [(from_basis_points(v), n) for v, n in rows]
+                facets[column] = rows
+        return facets
+
+    def _iter_query(
+        self, query: str, params=(), batch_size: int = DEFAULT_CHUNK_SIZE
+    ) -> Iterator[Purchase]:
+        with self._connect() as conn:
+            cursor = self._model_cursor(conn)
+            cursor.execute(query, params)
+            yield from iter_rows(cursor, batch_size)
+
+    def search_by_parent(self, entity) -> List[Purchase]:
+        with self._connect() as conn:
+            cursor = self._model_cursor(conn)
+            cursor.execute(
+                self.SELECT + " WHERE supplier_id = ?",
                 (entity.id,),
             )
-            rows = cursor.fetchall()
-            return [Purchase(*row) for row in rows]
+            return cursor.fetchall()
+
+    def iter_by_parent(
+        self, entity, batch_size: int = DEFAULT_CHUNK_SIZE
+    ) -> Iterator[Purchase]:
+        yield from self._iter_query(
+            self.SELECT + " WHERE supplier_id = ?",
+            (entity.id,),
+            batch_size,
+        )
 
     def all(self) -> List[Purchase]:
+        rows = _result_cache.get_or_compute(self.db_path, ("all",), self._all)
+        return [Purchase.from_row(row) for row in rows]
+
+    def _all(self) -> Tuple[tuple, ...]:
         with self._connect() as conn:
             cursor = conn.cursor()
             cursor.execute(
-                """
-                SELECT id, supplier_id, supplier_name, supplier_invoice_code, internal_invoice_number, net_amount, vat_percent, goods, utilities, motor_expenses, sundries, miscellaneous, payment_method, timestamp, capital_spend 
-                FROM purchases
-            """,
+                self.SELECT,
             )
-            rows = cursor.fetchall()
-            return [Purchase(*row) for row in rows]
+            return tuple(cursor.fetchall())
+
+    def iter_all(
+        self, batch_size: int = DEFAULT_CHUNK_SIZE
+    ) -> Iterator[Purchase]:
+        yield from self._iter_query(
+            self.SELECT,
+            batch_size=batch_size,
+        )
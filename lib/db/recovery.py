@@ -0,0 +1,530 @@
+"""
+Recovery journal for deleted records.
+
+Deleted rows are copied, as JSON of their stored columns, into the
+append-only deleted_records table of a single journal database. The
+journal is ATTACHed to the live database's connection as "recovery", so
+that listing and restoring batches can join it with the live tables. A
+delete commits its backup to the journal before the delete itself. Every
+record removed by one delete shares a batch_id, and a whole batch is
+restored at once.
+"""
+
+import json
+import logging
+import sqlite3
+import uuid
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import List, Optional, Tuple
+from lib.db.cache import bump_generation, entity_index
+from lib.db.pool import get_connection
+from lib.db.utils import (
+    get_db_path,
+    get_recovery_journal_path,
+    get_recovery_path,
+)
+
+logger = logging.getLogger(__name__)
+
+JOURNAL_SCHEMA = "recovery"
+DEFAULT_RETENTION_DAYS = 30
+
+# Entity table -> (transaction table, column referencing the entity)
+ENTITY_TRANSACTIONS = {
+    "customers": ("sales", "customer_id"),
+    "suppliers": ("purchases", "supplier_id"),
+}
+TRANSACTION_TABLES = {"sales", "purchases"}
+# Table -> column which must be unique besides id
+UNIQUE_COLUMNS = {
+    "customers": "name",
+    "suppliers": "name",
+    "sales": "invoice_number",
+    "purchases": "internal_invoice_number",
+}
+
+# Earlier versions backed up each delete to its own recovery/<timestamp>.db,
+# a copy of schema.sql which stores money as REAL
+LEGACY_SCHEMA = "legacy"
+LEGACY_NAME_FORMAT = "%Y%m%d_%H%M%S"
+# Legacy tables in journal order, so an entity comes before its transactions
+LEGACY_TABLES = ("customers", "suppliers", "sales", "purchases")
+# REAL column -> multiplier to its stored integer, as in migration 0005
+LEGACY_MONEY_COLUMNS = {
+    "net_amount": 100,
+    "vat_percent": 10000,
+    "goods": 100,
+    "utilities": 100,
+    "motor_expenses": 100,
+    "sundries": 100,
+    "miscellaneous": 100,
+}
+
+JOURNAL_DDL = [
+    f"""
+    CREATE TABLE IF NOT EXISTS {JOURNAL_SCHEMA}.deleted_records (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        batch_id TEXT NOT NULL,
+        table_name TEXT NOT NULL,
+        record_id INTEGER NOT NULL,
+        payload TEXT NOT NULL,
+        deleted_at TEXT NOT NULL
+    )""",
+    f"""
+    CREATE INDEX IF NOT EXISTS {JOURNAL_SCHEMA}.deleted_records_deleted_at
+    ON deleted_records (deleted_at)""",
+    f"""
+    CREATE INDEX IF NOT EXISTS {JOURNAL_SCHEMA}.deleted_records_batch
+    ON deleted_records (batch_id)""",
+    f"""
+    CREATE TABLE IF NOT EXISTS {JOURNAL_SCHEMA}.restored_batches (
+        batch_id TEXT PRIMARY KEY,
+        restored_at TEXT NOT NULL
+    )""",
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {JOURNAL_SCHEMA}.deleted_records_append_only
+    BEFORE UPDATE ON deleted_records BEGIN
+        SELECT RAISE(ABORT, 'deleted_records is append-only');
+    END""",
+]
+
+
+def attach_journal(
+    conn: sqlite3.Connection, journal_path: Optional[Path] = None
+) -> None:
+    """ATTACHes the journal to `conn` as "recovery", creating it if needed."""
+    attached = {row[1] for row in conn.execute("PRAGMA database_list")}
+    if JOURNAL_SCHEMA in attached:
+        return
+    journal_path = journal_path or get_recovery_journal_path()
+    journal_path.parent.mkdir(parents=True, exist_ok=True)
+    conn.execute(
+        f"ATTACH DATABASE ? AS {JOURNAL_SCHEMA}", (str(journal_path),)
+    )
+    for statement in JOURNAL_DDL:
+        conn.execute(statement)
+    conn.commit()
+
+
+@dataclass
+class DeletedBatch:
+    """
+    One journaled delete: the stored columns of the record deleted from
+    `table`, and how many transactions were deleted along with it.
+    """
+
+    batch_id: str
+    table: str
+    record: dict
+    deleted_at: str
+    cascaded: int = 0
+
+    @property
+    def label(self) -> str:
+        """The name or invoice number identifying the deleted record."""
+        return self.record.get(UNIQUE_COLUMNS[self.table]) or str(
+            self.record.get("id")
+        )
+
+
+class RestoreConflictError(sqlite3.IntegrityError):
+    """Restoring a batch would clash with live records; nothing was restored."""
+
+    def __init__(self, batch_id: str, conflicts: List[Tuple[str, int, str]]):
+        super().__init__(
+            f"Batch {batch_id} conflicts with {len(conflicts)} live record(s): "
+            + ", ".join(
+                f"{table} {record_id} ({column})"
+                for table, record_id, column in conflicts[:5]
+            )
+        )
+        self.batch_id = batch_id
+        self.conflicts = conflicts
+
+
+def _columns(cursor: sqlite3.Cursor, table: str) -> List[str]:
+    return [
+        row[1] for row in cursor.execute(f"PRAGMA main.table_info({table})")
+    ]
+
+
+class RecoveryJournal:
+    def __init__(
+        self,
+        db_path: Optional[Path] = None,
+        journal_path: Optional[Path] = None,
+    ):
+        self.db_path = db_path or get_db_path()
+        self.journal_path = journal_path or get_recovery_journal_path()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = get_connection(self.db_path)
+        attach_journal(conn, self.journal_path)
+        return conn
+
+    def _delete_rows(
+        self,
+        cursor: sqlite3.Cursor,
+        table: str,
+        condition: str,
+        params: tuple,
+    ) -> List[Tuple[int, str]]:
+        """
+        Deletes the rows of `table` matching `condition`, returning the id
+        of each and its payload, built with json_object.
+        """
+        columns = _columns(cursor, table)
+        payload = ", ".join(f"'{column}', {column}" for column in columns)
+        return cursor.execute(
+            f"""
+            DELETE FROM main.{table} WHERE {condition}
+            RETURNING id, json_object({payload})""",
+            params,
+        ).fetchall()
+
+    @staticmethod
+    def _journal(
+        journal_conn: sqlite3.Connection,
+        batch_id: str,
+        deleted_at: str,
+        table: str,
+        rows: List[Tuple[int, str]],
+    ) -> None:
+        journal_conn.executemany(
+            """
+            INSERT INTO deleted_records
+                (batch_id, table_name, record_id, payload, deleted_at)
+            VALUES (?, ?, ?, ?, ?)""",
+            [
+                (batch_id, table, record_id, payload, deleted_at)
+                for record_id, payload in rows
+            ],
+        )
+
+    def _delete(
+        self, table: str, id: int, cascade: Optional[tuple] = None
+    ) -> Optional[DeletedBatch]:
+        """
+        Journals and deletes the record `id` of `table`, and with `cascade`
+        the (child table, parent column) rows referring to it.
+
+        SQLite only commits ATTACHed databases atomically with a rollback
+        journal, and the default profile uses WAL. So the rows are deleted
+        under the live database's write lock, their backup is committed to
+        the journal, and only then is the delete committed. A crash in
+        between leaves a batch whose records are still live, which restore
+        reports as conflicts, but never a delete without its backup.
+        """
+        batch_id = uuid.uuid4().hex
+        deleted_at = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        conn = self._connect()
+        journal_conn = get_connection(self.journal_path)
+        cursor = conn.cursor()
+        try:
+            cursor.execute("BEGIN")
+            children = []
+            if cascade:
+                child_table, parent_column = cascade
+                children = self._delete_rows(
+                    cursor, child_table, f"{parent_column} = ?", (id,)
+                )
+            deleted = self._delete_rows(cursor, table, "id = ?", (id,))
+            if not deleted:
+                conn.rollback()
+                return None
+            with journal_conn:
+                self._journal(
+                    journal_conn, batch_id, deleted_at, table, deleted
+                )
+                if cascade:
+                    self._journal(
+                        journal_conn,
+                        batch_id,
+                        deleted_at,
+                        child_table,
+                        children,
+                    )
+        except Exception:
+            conn.rollback()
+            raise
+        try:
+            conn.commit()
+        except sqlite3.Error:
+            with journal_conn:
+                journal_conn.execute(
+                    "DELETE FROM deleted_records WHERE batch_id = ?",
+                    (batch_id,),
+                )
+            raise
+        batch = DeletedBatch(
+            batch_id,
+            table,
+            json.loads(deleted[0][1]),
+            deleted_at,
+            len(children),
+        )
+        bump_generation(self.db_path)
+        if table in ENTITY_TRANSACTIONS:
+            entity_index.invalidate(self.db_path, table)
+        logger.info(
+            f"[RECOVERY] Journaled {1 + batch.cascaded} record(s) deleted "
+            f"from {table} in batch {batch_id}"
+        )
+        return batch
+
+    def delete_transaction(
+        self, table: str, id: int
+    ) -> Optional[DeletedBatch]:
+        """
+        Deletes a sale or purchase, journaling it first.
+        :return: the journaled deletion, or None if there was no such record
+        """
+        if table not in TRANSACTION_TABLES:
+            raise ValueError(f"Cannot delete from {table}")
+        return self._delete(table, id)
+
+    def delete_entity(self, table: str, id: int) -> Optional[DeletedBatch]:
+        """
+        Deletes a customer or supplier and all of its transactions,
+        journaling them first.
+        :return: the journaled deletion, or None if there was no such record
+        """
+        if table not in ENTITY_TRANSACTIONS:
+            raise ValueError(f"Cannot delete from {table}")
+        return self._delete(table, id, ENTITY_TRANSACTIONS[table])
+
+    def recoverable(self, limit: int = 100) -> List[DeletedBatch]:
+        """Returns the most recent deletions which have not been restored."""
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                f"""
+                SELECT d.batch_id, d.table_name, d.payload, d.deleted_at,
+                    b.records - 1
+                FROM (
+                    SELECT batch_id, MIN(id) AS first_id, COUNT(*) AS records
+                    FROM {JOURNAL_SCHEMA}.deleted_records
+                    GROUP BY batch_id
+                ) AS b
+                JOIN {JOURNAL_SCHEMA}.deleted_records AS d ON d.id = b.first_id
+                WHERE b.batch_id NOT IN (
+                    SELECT batch_id FROM {JOURNAL_SCHEMA}.restored_batches
+                )
+                ORDER BY d.id DESC
+                LIMIT ?""",
+                (limit,),
+            )
+            rows = cursor.fetchall()
+        return [
+            DeletedBatch(batch_id, table, json.loads(payload), deleted_at, n)
+            for batch_id, table, payload, deleted_at, n in rows
+        ]
+
+    def _conflicts(
+        self, cursor: sqlite3.Cursor, batch_id: str, tables: List[str]
+    ) -> List[Tuple[str, int, str]]:
+        """
+        Finds the journaled records whose id or unique column is already
+        taken in the live tables, with one set-based query.
+        """
+        queries = []
+        params = []
+        for table in tables:
+            unique = UNIQUE_COLUMNS[table]
+            for column, match in (
+                ("id", "t.id = d.record_id"),
+                (
+                    unique,
+                    f"t.{unique} = json_extract(d.payload, '$.{unique}')",
+                ),
+            ):
+                queries.append(f"""
+                    SELECT d.table_name, d.record_id, '{column}'
+                    FROM {JOURNAL_SCHEMA}.deleted_records AS d
+                    JOIN main.{table} AS t ON {match}
+                    WHERE d.batch_id = ? AND d.table_name = ?""")
+                params += [batch_id, table]
+        cursor.execute(" UNION ALL ".join(queries), params)
+        return cursor.fetchall()
+
+    def restore(self, batch_id: str) -> Optional[DeletedBatch]:
+        """
+        Restores every record of a journaled deletion with one
+        INSERT ... SELECT per table, in a single transaction.
+        :return: the restored deletion, or None if there is no such batch
+        :raises RestoreConflictError: if any record's id or unique column
+            is taken by a live record
+        :raises ValueError: if the batch was already restored
+        """
+        restored_at = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        conn = self._connect()
+        with conn:
+            cursor = conn.cursor()
+            cursor.execute("BEGIN IMMEDIATE")
+            cursor.execute(
+                f"""
+                SELECT table_name, payload, deleted_at, COUNT(*) OVER ()
+                FROM {JOURNAL_SCHEMA}.deleted_records
+                WHERE batch_id = ? ORDER BY id LIMIT 1""",
+                (batch_id,),
+            )
+            first = cursor.fetchone()
+            if first is None:
+                return None
+            table, payload, deleted_at, records = first
+            batch = DeletedBatch(
+                batch_id, table, json.loads(payload), deleted_at, records - 1
+            )
+            cursor.execute(
+                f"SELECT 1 FROM {JOURNAL_SCHEMA}.restored_batches WHERE batch_id = ?",
+                (batch_id,),
+            )
+            if cursor.fetchone():
+                raise ValueError(f"Batch {batch_id} was already restored")
+
+            tables = [table]
+            if table in ENTITY_TRANSACTIONS:
+                tables.append(ENTITY_TRANSACTIONS[table][0])
+            if conflicts := self._conflicts(cursor, batch_id, tables):
+                raise RestoreConflictError(batch_id, conflicts)
+
+            # Entities are restored before their transactions
+            for table in tables:
+                columns = _columns(cursor, table)
+                values = ", ".join(
+                    f"json_extract(payload, '$.{column}')"
+                    for column in columns
+                )
+                cursor.execute(
+                    f"""
+                    INSERT INTO main.{table} ({", ".join(columns)})
+                    SELECT {values} FROM {JOURNAL_SCHEMA}.deleted_records
+                    WHERE batch_id = ? AND table_name = ?
+                    ORDER BY id""",
+                    (batch_id, table),
+                )
+            cursor.execute(
+                f"""
+                INSERT INTO {JOURNAL_SCHEMA}.restored_batches
+                    (batch_id, restored_at)
+                VALUES (?, ?)""",
+                (batch_id, restored_at),
+            )
+        bump_generation(self.db_path)
+        if batch.table in ENTITY_TRANSACTIONS:
+            entity_index.invalidate(self.db_path, batch.table)
+        logger.info(
+            f"[RECOVERY] Restored {records} record(s) to {batch.table} "
+            f"from batch {batch_id}"
+        )
+        return batch
+
+    def purge(self, older_than_days: int = DEFAULT_RETENTION_DAYS) -> int:
+        """Deletes journal records older than `older_than_days`, returning how many."""
+        cutoff = (datetime.now() - timedelta(days=older_than_days)).strftime(
+            "%Y-%m-%d %H:%M:%S"
+        )
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                f"DELETE FROM {JOURNAL_SCHEMA}.deleted_records WHERE deleted_at < ?",
+                (cutoff,),
+            )
+            purged = cursor.rowcount
+            cursor.execute(f"""
+                DELETE FROM {JOURNAL_SCHEMA}.restored_batches
+                WHERE batch_id NOT IN (
+                    SELECT batch_id FROM {JOURNAL_SCHEMA}.deleted_records
+                )""")
+            conn.commit()
+        logger.info(f"[CLEANUP] Purged {purged} old recovery record(s).")
+        return purged
+
+    def import_legacy_backups(
+        self, recovery_dir: Optional[Path] = None
+    ) -> int:
+        """
+        Moves the per-delete backup databases written by earlier versions
+        into the journal, one batch per file, then deletes each file.
+        Files which cannot be imported are left in place and logged.
+        :return: the number of files imported
+        """
+        recovery_dir = recovery_dir or get_recovery_path()
+        imported = 0
+        for legacy_path in sorted(recovery_dir.glob("*.db")):
+            try:
+                deleted_at = datetime.strptime(
+                    legacy_path.stem, LEGACY_NAME_FORMAT
+                ).strftime("%Y-%m-%d %H:%M:%S")
+            except ValueError:
+                continue
+            try:
+                records = self._import_legacy(legacy_path, deleted_at)
+                legacy_path.unlink()
+            except (sqlite3.Error, OSError) as err:
+                logger.warning(
+                    f"[RECOVERY] Skipped legacy backup {legacy_path.name}: {err}"
+                )
+                continue
+            imported += 1
+            logger.info(
+                f"[RECOVERY] Imported {records} record(s) from legacy "
+                f"backup {legacy_path.name}"
+            )
+        return imported
+
+    def _import_legacy(self, legacy_path: Path, deleted_at: str) -> int:
+        conn = self._connect()
+        conn.execute(
+            f"ATTACH DATABASE ? AS {LEGACY_SCHEMA}", (str(legacy_path),)
+        )
+        try:
+            records = 0
+            batch_id = uuid.uuid4().hex
+            with conn:
+                cursor = conn.cursor()
+                cursor.execute("BEGIN IMMEDIATE")
+                for table in LEGACY_TABLES:
+                    legacy_columns = {
+                        row[1]
+                        for row in cursor.execute(
+                            f"PRAGMA {LEGACY_SCHEMA}.table_info({table})"
+                        )
+                    }
+                    if not legacy_columns:
+                        continue
+                    payload = []
+                    for column in _columns(cursor, table):
+                        value = column if column in legacy_columns else "NULL"
+                        if value == column and column in LEGACY_MONEY_COLUMNS:
+                            value = (
+                                f"CAST(ROUND({column} * "
+                                f"{LEGACY_MONEY_COLUMNS[column]}) AS INTEGER)"
+                            )
+                        payload.append(f"'{column}', {value}")
+                    cursor.execute(
+                        f"""
+                        INSERT INTO {JOURNAL_SCHEMA}.deleted_records
+                            (batch_id, table_name, record_id, payload, deleted_at)
+                        SELECT ?, ?, id, json_object({", ".join(payload)}), ?
+                        FROM {LEGACY_SCHEMA}.{table} ORDER BY id""",
+                        (batch_id, table, deleted_at),
+                    )
+                    records += cursor.rowcount
+        finally:
+            conn.execute(f"DETACH DATABASE {LEGACY_SCHEMA}")
+        return records
+
+
+def purge_recovery_journal(
+    older_than_days: int = DEFAULT_RETENTION_DAYS,
+) -> int:
+    """Scheduled retention job for the default recovery journal."""
+    return RecoveryJournal().purge(older_than_days)
+
+
+def import_legacy_recovery_dbs() -> int:
+    """Startup job moving legacy backups into the default recovery journal."""
+    return RecoveryJournal().import_legacy_backups()
@@ -0,0 +1,251 @@
+import sqlite3
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, List, Optional
+from lib.db.money import BASIS_POINTS_PER_UNIT, from_pence
+from lib.db.pool import get_connection
+from lib.db.utils import get_db_path
+
+# SQL expression naming the period a transaction's timestamp falls in.
+# Every key sorts chronologically as text.
+PERIODS = {
+    "day": "strftime('%Y-%m-%d', timestamp)",
+    "month": "strftime('%Y-%m', timestamp)",
+    "quarter": (
+        "strftime('%Y', timestamp) || '-Q' || "
+        "((CAST(strftime('%m', timestamp) AS INTEGER) + 2) / 3)"
+    ),
+    "year": "strftime('%Y', timestamp)",
+}
+# The same periods named from the year and month of a monthly_totals row
+MONTHLY_PERIODS = {
+    "month": "printf('%04d-%02d', year, month)",
+    "quarter": "printf('%04d-Q%d', year, (month + 2) / 3)",
+    "year": "printf('%04d', year)",
+}
+
+PURCHASE_CATEGORIES = (
+    "goods",
+    "utilities",
+    "motor_expenses",
+    "sundries",
+    "miscellaneous",
+)
+
+# VAT is rounded to the penny on each transaction, as it is on the invoice,
+# before it is summed
+VAT_PENCE = (
+    f"CAST(ROUND(net_amount * vat_percent * 1.0 / {BASIS_POINTS_PER_UNIT})"
+    " AS INTEGER)"
+)
+
+
+@dataclass(frozen=True)
+class PeriodSummary:
+    """
+    Totals for the transactions in one period. Amounts are integer pence;
+    `categories` holds the purchase cost breakdown and is empty for sales.
+    """
+
+    period: str
+    count: int
+    net: int
+    vat: int
+    categories: Dict[str, int] = field(default_factory=dict)
+
+    @property
+    def gross(self) -> int:
+        return self.net + self.vat
+
+    def __add__(self, other: "PeriodSummary") -> "PeriodSummary":
+        return PeriodSummary(
+            self.period,
+            self.count + other.count,
+            self.net + other.net,
+            self.vat + other.vat,
+            {
+                name: self.categories.get(name, 0)
+                + other.categories.get(name, 0)
+                for name in {**self.categories, **other.categories}
+            },
+        )
+
+    def to_dict(self) -> dict:
+        """Returns the summary with amounts in pounds, for JSON responses."""
+        summary = {
+            "period": self.period,
+            "count": self.count,
+            "net": from_pence(self.net),
+            "vat": from_pence(self.vat),
+            "gross": from_pence(self.gross),
+        }
+        if self.categories:
+            summary["categories"] = {
+                name: from_pence(amount)
+                for name, amount in self.categories.items()
+            }
+        return summary
+
+
+def _parse_range(start_date: Optional[str], end_date: Optional[str]):
+    """Returns the range as datetimes, the end being the day after `end_date`."""
+    start = datetime.strptime(start_date, "%Y-%m-%d") if start_date else None
+    end = None
+    if end_date:
+        end = datetime.strptime(end_date, "%Y-%m-%d") + timedelta(days=1)
+    return start, end
+
+
+def _whole_months(start: Optional[datetime], end: Optional[datetime]) -> bool:
+    return (start is None or start.day == 1) and (end is None or end.day == 1)
+
+
+def _date_range_clause(
+    start: Optional[datetime], end: Optional[datetime]
+) -> tuple:
+    """Returns conditions selecting timestamps from `start` up to `end`."""
+    query = ""
+    params = []
+    if start:
+        query += " AND timestamp >= ?"
+        params.append(start.strftime("%Y-%m-%d %H:%M:%S"))
+    if end:
+        query += " AND timestamp < ?"
+        params.append(end.strftime("%Y-%m-%d %H:%M:%S"))
+    return query, params
+
+
+def _month_range_clause(
+    start: Optional[datetime], end: Optional[datetime]
+) -> tuple:
+    """Returns conditions selecting the monthly_totals rows from `start` up to `end`."""
+    query = ""
+    params = []
+    if start:
+        query += " AND year * 100 + month >= ?"
+        params.append(start.year * 100 + start.month)
+    if end:
+        query += " AND year * 100 + month < ?"
+        params.append(end.year * 100 + end.month)
+    return query, params
+
+
+def summarize(
+    transaction_name: str,
+    period: str = "month",
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    db_path: Optional[Path] = None,
+) -> List[PeriodSummary]:
+    """
+    Totals sales or purchases per period with a single GROUP BY query,
+    oldest period first. Periods without transactions are left out.
+    Reports by month, quarter or year over whole months read the
+    monthly_totals table, so they cost O(months) rather than
+    O(transactions).
+    :param str transaction_name: sales or purchases
+    :param str period: day, month, quarter or year
+    :param str start_date: First day to include (YYYY-MM-DD)
+    :param str end_date: Last day to include (YYYY-MM-DD)
+    :param Path db_path: Database to report on
+    """
+    transaction_name = transaction_name.lower()
+    if transaction_name == "sales":
+        categories = ()
+    elif transaction_name == "purchases":
+        categories = PURCHASE_CATEGORIES
+    else:
+        raise ValueError(f"Cannot report on {transaction_name}")
+    if period not in PERIODS:
+        raise ValueError(f"Unknown period: {period}")
+
+    start, end = _parse_range(start_date, end_date)
+    rows = None
+    if period in MONTHLY_PERIODS and _whole_months(start, end):
+        rows = _summarize_monthly_totals(
+            transaction_name, period, categories, start, end, db_path
+        )
+    if rows is None:
+        rows = _summarize_transactions(
+            transaction_name, period, categories, start, end, db_path
+        )
+
+    summaries = []
+    for period_key, count, net, vat, *amounts in rows:
+        summaries.append(
+            PeriodSummary(
+                period_key,
+                count,
+                net or 0,
+                vat or 0,
+                {
+                    name: amount or 0
+                    for name, amount in zip(categories, amounts)
+                },
+            )
+        )
+    return summaries
+
+
+def _fetch(query: str, params: list, db_path: Optional[Path]) -> list:
+    with get_connection(db_path or get_db_path()) as conn:
+        cursor = conn.cursor()
+        cursor.execute(query, params)
+        return cursor.fetchall()
+
+
+def _summarize_transactions(
+    transaction_name: str,
+    period: str,
+    categories: tuple,
+    start: Optional[datetime],
+    end: Optional[datetime],
+    db_path: Optional[Path],
+) -> list:
+    """Groups and totals the transactions themselves."""
+    sums = ["SUM(net_amount)", f"SUM({VAT_PENCE})"]
+    sums += [f"SUM({column})" for column in categories]
+    conditions, params = _date_range_clause(start, end)
+    return _fetch(
+        f"SELECT {PERIODS[period]} AS period, COUNT(*), {', '.join(sums)} "
+        f"FROM {transaction_name} WHERE 1=1{conditions} "
+        "GROUP BY period ORDER BY period",
+        params,
+        db_path,
+    )
+
+
+def _summarize_monthly_totals(
+    transaction_name: str,
+    period: str,
+    categories: tuple,
+    start: Optional[datetime],
+    end: Optional[datetime],
+    db_path: Optional[Path],
+) -> Optional[list]:
+    """
+    Reads the totals for whole months from the trigger-maintained
+    monthly_totals table, or returns None if the database has no such table.
+    """
+    sums = ["SUM(count)", "SUM(net)", "SUM(vat)"]
+    sums += [f"SUM({column})" for column in categories]
+    conditions, params = _month_range_clause(start, end)
+    try:
+        return _fetch(
+            f"SELECT {MONTHLY_PERIODS[period]} AS period, {', '.join(sums)} "
+            f"FROM monthly_totals WHERE kind = ?{conditions} "
+            "GROUP BY period ORDER BY period",
+            [transaction_name, *params],
+            db_path,
+        )
+    except sqlite3.OperationalError:
+        return None
+
+
+def total(summaries: List[PeriodSummary]) -> PeriodSummary:
+    """Adds up per-period summaries into one summary for the whole range."""
+    grand_total = PeriodSummary("total", 0, 0, 0)
+    for summary in summaries:
+        grand_total += summary
+    return grand_total
@@ -1,15 +1,52 @@
 import logging
-import sqlite3
 from datetime import datetime
 from pathlib import Path
-from typing import List, Optional
+from typing import Iterable, Iterator, List, Optional, Tuple
+from lib.db.bulk import DEFAULT_CHUNK_SIZE, insert_many, iter_rows
+from lib.db.cache import (
+    QueryCache,
+    bump_generation,
+    cache_key,
+    get_version,
+)
+from lib.db.filters import FilterCompiler
+from lib.db.fts import fts_tables
+from lib.db.money import (
+    from_basis_points,
+    from_pence,
+    to_basis_points,
+    to_pence,
+)
+from lib.db.pagination import Cursor, keyset_clause
+from lib.db.pool import get_connection
 from lib.db.transaction import Transaction, TransactionRepository
-from lib.db.utils import get_db_path, normalize_datetime
+from lib.db.utils import (
+    canonical_datetime,
+    get_db_path,
+    normalize_datetime,
+)
 
 logger = logging.getLogger(__name__)
 
+# Results are reused until a write, in this process or another, changes
+# the database version. Stored rows are cached, since they are immutable,
+# and each hit hydrates new models from them.
+_result_cache = QueryCache(max_entries=256, version=get_version, name="sales")
+_facet_cache = QueryCache(version=get_version, name="sales_facets")
+
 
 class Sale(Transaction):
+    __slots__ = (
+        "id",
+        "customer_id",
+        "customer_name",
+        "invoice_number",
+        "net_amount",
+        "vat_percent",
+        "payment_method",
+        "timestamp",
+    )
+
     def __init__(
         self,
         id: Optional[int],
@@ -34,19 +71,92 @@ class Sale(Transaction):
         else:
             self.timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
 
+    @classmethod
+    def from_row(cls, row) -> "Sale":
+        """
+        Builds a sale from a stored (id, *COLUMNS) row. _to_row()
+        normalises every row written, so the timestamp is not normalised
+        again.
+        """
+        sale = cls.__new__(cls)
+        (
+            sale.id,
+            sale.customer_id,
+            sale.customer_name,
+            sale.invoice_number,
+            net_amount,
+            vat_percent,
+            sale.payment_method,
+            sale.timestamp,
+        ) = row
+        sale.net_amount = from_pence(net_amount)
+        sale.vat_percent = from_basis_points(vat_percent)
+        return sale
+
+    def _values(self) -> tuple:
+        return tuple(getattr(self, name) for name in self.__slots__)
+
     def __eq__(self, other: object) -> bool:
-        return isinstance(other, Sale) and self.__dict__ == other.__dict__
+        return isinstance(other, Sale) and self._values() == other._values()
 
     def __repr__(self):
         return f"Sale(id={self.id}, invoice_number='{self.invoice_number}', customer_name='{self.customer_name}')"
 
 
 class SaleRepository(TransactionRepository[Sale]):
+    COLUMNS = (
+        "customer_id",
+        "customer_name",
+        "invoice_number",
+        "net_amount",
+        "vat_percent",
+        "payment_method",
+        "timestamp",
+    )
+    SELECT = f"SELECT id, {', '.join(COLUMNS)} FROM sales"
+
+    # Facet column -> the filter on that column, which is ignored when
+    # counting its own values so that every option stays selectable
+    FACETS = {"vat_percent": "vat", "payment_method": "payment"}
+
+    # Filter name -> the columns it matches
+    FILTERS = FilterCompiler(
+        "sales",
+        substrings={"customer": "customer_name", "invoice": "invoice_number"},
+        ranges={"net": "net_amount"},
+    )
+
     def __init__(self, db_path: Optional[Path] = None):
         self.db_path = db_path or get_db_path()
 
     def _connect(self):
-        return sqlite3.connect(self.db_path)
+        return get_connection(self.db_path)
+
+    @staticmethod
+    def _to_row(sale: Sale) -> tuple:
+        """
+        Returns the COLUMNS values stored for a sale, with money in pence.
+        The timestamp is normalised, since callers may have set it directly.
+        """
+        return (
+            sale.customer_id,
+            sale.customer_name,
+            sale.invoice_number,
+            to_pence(sale.net_amount),
+            to_basis_points(sale.vat_percent),
+            sale.payment_method,
+            canonical_datetime(sale.timestamp),
+        )
+
+    @staticmethod
+    def _row_factory(cursor, row) -> Sale:
+        return Sale.from_row(row)
+
+    def _model_cursor(self, conn):
+        """Returns a cursor which hydrates each fetched row as a Sale."""
+        cursor = conn.cursor()
+        cursor.row_factory = self._row_factory
+        return cursor
 
     def create(self, sale: Sale) -> Sale:
         created_sale = None
@@ -57,17 +167,10 @@ class SaleRepository(TransactionRepository[Sale]):
                     """
                     INSERT INTO sales (customer_id, customer_name, invoice_number, net_amount, vat_percent, payment_method, timestamp)
                     VALUES (?, ?, ?, ?, ?, ?, ?)""",
-                    (
-                        sale.customer_id,
-                        sale.customer_name,
-                        sale.invoice_number,
-                        sale.net_amount,
-                        sale.vat_percent,
-                        sale.payment_method,
-                        sale.timestamp,
-                    ),
+                    self._to_row(sale),
                 )
                 conn.commit()
+                bump_generation(self.db_path)
                 created_sale = Sale(
                     cursor.lastrowid,
                     sale.customer_id,
@@ -83,31 +186,36 @@ class SaleRepository(TransactionRepository[Sale]):
                     """
                     INSERT INTO sales (id, customer_id, customer_name, invoice_number, net_amount, vat_percent, payment_method, timestamp)
                     VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
-                    (
-                        sale.id,
-                        sale.customer_id,
-                        sale.customer_name,
-                        sale.invoice_number,
-                        sale.net_amount,
-                        sale.vat_percent,
-                        sale.payment_method,
-                        sale.timestamp,
-                    ),
+                    (sale.id, *self._to_row(sale)),
                 )
                 conn.commit()
+                bump_generation(self.db_path)
                 created_sale = sale
 
         return created_sale
 
+    def create_many(
+        self, sales: Iterable[Sale], chunk_size: int = DEFAULT_CHUNK_SIZE
+    ) -> List[int]:
+        ids = insert_many(
+            self._connect(),
+            "sales",
+            self.COLUMNS,
+            sales,
+            self._to_row,
+            chunk_size,
+        )
+        bump_generation(self.db_path)
+        return ids
+
     def read(self, id: int) -> Optional[Sale]:
         with self._connect() as conn:
-            cursor = conn.cursor()
+            cursor = self._model_cursor(conn)
             cursor.execute(
                 "SELECT id, customer_id, customer_name, invoice_number, net_amount, vat_percent, payment_method, timestamp FROM sales WHERE id = ?",
                 (id,),
             )
-            row = cursor.fetchone()
-            return Sale(*row) if row else None
+            return cursor.fetchone()
 
     def update(self, sale: Sale) -> Optional[Sale]:
         with self._connect() as conn:
@@ -118,18 +226,10 @@ class SaleRepository(TransactionRepository[Sale]):
                     customer_id = ?, customer_name = ?, invoice_number = ?, net_amount = ?,
                     vat_percent = ?, payment_method = ?, timestamp = ?
                 WHERE id = ?""",
-                (
-                    sale.customer_id,
-                    sale.customer_name,
-                    sale.invoice_number,
-                    sale.net_amount,
-                    sale.vat_percent,
-                    sale.payment_method,
-                    sale.timestamp,
-                    sale.id,
-                ),
+                (*self._to_row(sale), sale.id),
             )
             conn.commit()
+            bump_generation(self.db_path)
             return self.read(sale.id)
 
     def delete(self, id: int) -> Optional[Sale]:
@@ -140,89 +240,148 @@ class SaleRepository(TransactionRepository[Sale]):
             cursor = conn.cursor()
             cursor.execute("DELETE FROM sales WHERE id = ?", (id,))
             conn.commit()
+            bump_generation(self.db_path)
             return sale
 
-    def search(self, filters: dict) -> List[Sale]:
-        query = """
-            SELECT id, customer_id, customer_name, invoice_number, net_amount, vat_percent, payment_method, timestamp
-            FROM sales WHERE 1=1
-        """
-        params = []
-
-        # Filter by customer name (if joined externally, skip here)
-        if customer_substring := filters.get("customer"):
-            query += " AND LOWER(customer_name) LIKE ?"
-            params.append(f"%{customer_substring.lower()}%")
-
-        # Filter by invoice_number
-        if invoice_substring := filters.get("invoice"):
-            query += " AND LOWER(invoice_number) LIKE ?"
-            params.append(f"%{invoice_substring.lower()}%")
-
-        # Filter by net amount
-        net_filters = filters.get("net", {})
-        if "eq" in net_filters:
-            query += " AND net_amount = ?"
-            params.append(net_filters["eq"])
-        else:
-            if "min" in net_filters:
-                query += " AND net_amount >= ?"
-                params.append(net_filters["min"])
-            if "max" in net_filters:
-                query += " AND net_amount <= ?"
-                params.append(net_filters["max"])
-
-        # Filter by vat_percent
-        vat_filter = filters.get("vat")
-        if vat_filter:
-            placeholders = ",".join("?" for _ in vat_filter)
-            query += f" AND vat_percent IN ({placeholders})"
-            params.extend(vat_filter)
-
-        # Filter by payment_method
-        payment_filter = filters.get("payment")
-        if payment_filter:
-            placeholders = ",".join("?" for _ in payment_filter)
-            query += f" AND payment_method IN ({placeholders})"
-            params.extend(payment_filter)
-
-        # Filter by timestamp
-        timeFrom = normalize_datetime(filters.get("timeFrom"))
-        timeTo = normalize_datetime(filters.get("timeTo"))
-        if timeFrom:
-            query += " AND timestamp >= ?"
-            params.append(timeFrom)
-        if timeTo:
-            query += " AND timestamp <= ?"
-            params.append(timeTo)
+    def _use_fts(self) -> bool:
+        return "sales_fts" in fts_tables(self._connect(), self.db_path)
+
+    def _search_query(
+        self,
+        filters: dict,
+        limit: Optional[int] = None,
+        page_cursor: Optional[Cursor] = None,
+    ) -> tuple:
+        shape, params = self.FILTERS.compile(filters, self._use_fts())
+        keyset, keyset_params, order = keyset_clause(page_cursor)
+        params += keyset_params
+        suffix = keyset + order
+        if limit is not None:
+            suffix += " LIMIT ?"
+            params.append(limit)
+        query = self.FILTERS.sql(self.SELECT, shape, suffix)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"[SEARCH] query={query},params={params}")
+        return query, params
 
+    def search(
+        self,
+        filters: dict,
+        limit: Optional[int] = None,
+        page_cursor: Optional[Cursor] = None,
+    ) -> List[Sale]:
+        key = ("search", cache_key(filters), limit, page_cursor)
+        rows = _result_cache.get_or_compute(
+            self.db_path,
+            key,
+            lambda: self._search(filters, limit, page_cursor),
+        )
+        return [Sale.from_row(row) for row in rows]
+
+    def _search(
+        self,
+        filters: dict,
+        limit: Optional[int] = None,
+        page_cursor: Optional[Cursor] = None,
+    ) -> Tuple[tuple, ...]:
+        query, params = self._search_query(filters, limit, page_cursor)
         with self._connect() as conn:
             cursor = conn.cursor()
             cursor.execute(query, params)
             rows = cursor.fetchall()
-            return [Sale(*row) for row in rows]
+        if page_cursor and page_cursor.direction == "prev":
+            rows.reverse()
+        return tuple(rows)
 
-    def search_by_parent(self, entity) -> List[Sale]:
+    def iter_search(
+        self, filters: dict, batch_size: int = DEFAULT_CHUNK_SIZE
+    ) -> Iterator[Sale]:
+        query, params = self._search_query(filters)
+        yield from self._iter_query(query, params, batch_size)
+
+    def count(self, filters: dict) -> int:
+        return _result_cache.get_or_compute(
+            self.db_path,
+            ("count", cache_key(filters)),
+            lambda: self._count(filters),
+        )
+
+    def _count(self, filters: dict) -> int:
+        shape, params = self.FILTERS.compile(filters, self._use_fts())
         with self._connect() as conn:
             cursor = conn.cursor()
             cursor.execute(
-                """
-                SELECT id, customer_id, customer_name, invoice_number, net_amount, vat_percent, payment_method, timestamp
-                FROM sales WHERE customer_id = ?
-                """,
+                self.FILTERS.sql("SELECT COUNT(*) FROM sales", shape), params
+            )
+            return cursor.fetchone()[0]
+
+    def facets(self, filters: Optional[dict] = None) -> dict:
+        filters = filters or {}
+        return _facet_cache.get_or_compute(
+            self.db_path, cache_key(filters), lambda: self._facets(filters)
+        )
+
+    def _facets(self, filters: dict) -> dict:
+        facets = {}
+        use_fts = self._use_fts()
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            for column, filter_name in self.FACETS.items():
+                shape, params = self.FILTERS.compile(
+                    {**filters, filter_name: []}, use_fts
+                )
+                query = self.FILTERS.sql(
+                    f"SELECT {column}, COUNT(*) FROM sales",
+                    shape,
+                    f" GROUP BY {column} ORDER BY {column}",
+                )
+                cursor.execute(query, params)
+                rows = cursor.fetchall()
+                if column == "vat_percent":
+                    rows = [(from_basis_points(v), n) for v, n in rows]
+                facets[column] = rows
+        return facets
+
+    def _iter_query(
+        self, query: str, params=(), batch_size: int = DEFAULT_CHUNK_SIZE
+    ) -> Iterator[Sale]:
+        with self._connect() as conn:
+            cursor = self._model_cursor(conn)
+            cursor.execute(query, params)
+            yield from iter_rows(cursor, batch_size)
+
+    def search_by_parent(self, entity) -> List[Sale]:
+        with self._connect() as conn:
+            cursor = self._model_cursor(conn)
+            cursor.execute(
+                self.SELECT + " WHERE customer_id = ?",
                 (entity.id,),
             )
-            rows = cursor.fetchall()
-            return [Sale(*row) for row in rows]
+            return cursor.fetchall()
+
+    def iter_by_parent(
+        self, entity, batch_size: int = DEFAULT_CHUNK_SIZE
+    ) -> Iterator[Sale]:
+        yield from self._iter_query(
+            self.SELECT + " WHERE customer_id = ?",
+            (entity.id,),
+            batch_size,
+        )
 
     def all(self) -> List[Sale]:
+        rows = _result_cache.get_or_compute(self.db_path, ("all",), self._all)
+        return [Sale.from_row(row) for row in rows]
+
+    def _all(self) -> Tuple[tuple, ...]:
         with self._connect() as conn:
             cursor = conn.cursor()
             cursor.execute(
-                """
-                SELECT id, customer_id, customer_name, invoice_number, net_amount, vat_percent, payment_method, timestamp 
-                FROM sales
-            """,
+                self.SELECT,
             )
-            rows = cursor.fetchall()
-            return [Sale(*row) for row in rows]
+            return tuple(cursor.fetchall())
+
+    def iter_all(self, batch_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[Sale]:
+        yield from self._iter_query(
+            self.SELECT,
+            batch_size=batch_size,
+        )
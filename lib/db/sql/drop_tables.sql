@@ -1,4 +1,9 @@
 DROP TABLE IF EXISTS customers;
 DROP TABLE IF EXISTS suppliers;
 DROP TABLE IF EXISTS sales;
-DROP TABLE IF EXISTS purchases;
\ No newline at end of file
+DROP TABLE IF EXISTS purchases;
+DROP TABLE IF EXISTS data_versions;
+DROP TABLE IF EXISTS monthly_totals;
+
+-- Schema is recreated from scratch, so migrations must run again
+PRAGMA user_version = 0;
\ No newline at end of file
@@ -0,0 +1,5 @@
+-- Date range filters, keyset pagination and exports order and filter by timestamp.
+CREATE INDEX IF NOT EXISTS idx_sales_timestamp ON sales(timestamp);
+
+-- Looking up a customer's sales (search_by_parent, cascading deletes).
+CREATE INDEX IF NOT EXISTS idx_sales_customer_id ON sales(customer_id);
@@ -0,0 +1,5 @@
+-- Date range filters, keyset pagination and exports order and filter by timestamp.
+CREATE INDEX IF NOT EXISTS idx_purchases_timestamp ON purchases(timestamp);
+
+-- Looking up a supplier's purchases (search_by_parent, cascading deletes).
+CREATE INDEX IF NOT EXISTS idx_purchases_supplier_id ON purchases(supplier_id);
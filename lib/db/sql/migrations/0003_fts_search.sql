@@ -0,0 +1,108 @@
+-- requires: fts5-trigram
+-- Trigram full-text indexes over the columns searched by substring, so that
+-- LIKE '%abc%' filters are answered from the index instead of a table scan.
+-- Each is an external-content table over its source table, kept in sync by
+-- triggers; rowid is the source row's id.
+
+CREATE VIRTUAL TABLE customers_fts USING fts5(
+    name, content='customers', content_rowid='id', tokenize='trigram'
+);
+INSERT INTO customers_fts(customers_fts) VALUES ('rebuild');
+
+CREATE TRIGGER customers_fts_insert AFTER INSERT ON customers BEGIN
+    INSERT INTO customers_fts(rowid, name) VALUES (new.id, new.name);
+END;
+CREATE TRIGGER customers_fts_delete AFTER DELETE ON customers BEGIN
+    INSERT INTO customers_fts(customers_fts, rowid, name)
+    VALUES ('delete', old.id, old.name);
+END;
+CREATE TRIGGER customers_fts_update AFTER UPDATE ON customers BEGIN
+    INSERT INTO customers_fts(customers_fts, rowid, name)
+    VALUES ('delete', old.id, old.name);
+    INSERT INTO customers_fts(rowid, name) VALUES (new.id, new.name);
+END;
+
+CREATE VIRTUAL TABLE suppliers_fts USING fts5(
+    name, content='suppliers', content_rowid='id', tokenize='trigram'
+);
+INSERT INTO suppliers_fts(suppliers_fts) VALUES ('rebuild');
+
+CREATE TRIGGER suppliers_fts_insert AFTER INSERT ON suppliers BEGIN
+    INSERT INTO suppliers_fts(rowid, name) VALUES (new.id, new.name);
+END;
+CREATE TRIGGER suppliers_fts_delete AFTER DELETE ON suppliers BEGIN
+    INSERT INTO suppliers_fts(suppliers_fts, rowid, name)
+    VALUES ('delete', old.id, old.name);
+END;
+CREATE TRIGGER suppliers_fts_update AFTER UPDATE ON suppliers BEGIN
+    INSERT INTO suppliers_fts(suppliers_fts, rowid, name)
+    VALUES ('delete', old.id, old.name);
+    INSERT INTO suppliers_fts(rowid, name) VALUES (new.id, new.name);
+END;
+
+CREATE VIRTUAL TABLE sales_fts USING fts5(
+    customer_name, invoice_number,
+    content='sales', content_rowid='id', tokenize='trigram'
+);
+INSERT INTO sales_fts(sales_fts) VALUES ('rebuild');
+
+CREATE TRIGGER sales_fts_insert AFTER INSERT ON sales BEGIN
+    INSERT INTO sales_fts(rowid, customer_name, invoice_number)
+    VALUES (new.id, new.customer_name, new.invoice_number);
+END;
+CREATE TRIGGER sales_fts_delete AFTER DELETE ON sales BEGIN
+    INSERT INTO sales_fts(sales_fts, rowid, customer_name, invoice_number)
+    VALUES ('delete', old.id, old.customer_name, old.invoice_number);
+END;
+CREATE TRIGGER sales_fts_update
+AFTER UPDATE OF id, customer_name, invoice_number ON sales BEGIN
+    INSERT INTO sales_fts(sales_fts, rowid, customer_name, invoice_number)
+    VALUES ('delete', old.id, old.customer_name, old.invoice_number);
+    INSERT INTO sales_fts(rowid, customer_name, invoice_number)
+    VALUES (new.id, new.customer_name, new.invoice_number);
+END;
+
+CREATE VIRTUAL TABLE purchases_fts USING fts5(
+    supplier_name, supplier_invoice_code, internal_invoice_number,
+    content='purchases', content_rowid='id', tokenize='trigram'
+);
+INSERT INTO purchases_fts(purchases_fts) VALUES ('rebuild');
+
+CREATE TRIGGER purchases_fts_insert AFTER INSERT ON purchases BEGIN
+    INSERT INTO purchases_fts(
+        rowid, supplier_name, supplier_invoice_code, internal_invoice_number
+    )
+    VALUES (
+        new.id, new.supplier_name, new.supplier_invoice_code,
+        new.internal_invoice_number
+    );
+END;
+CREATE TRIGGER purchases_fts_delete AFTER DELETE ON purchases BEGIN
+    INSERT INTO purchases_fts(
+        purchases_fts, rowid, supplier_name, supplier_invoice_code,
+        internal_invoice_number
+    )
+    VALUES (
+        'delete', old.id, old.supplier_name, old.supplier_invoice_code,
+        old.internal_invoice_number
+    );
+END;
+CREATE TRIGGER purchases_fts_update
+AFTER UPDATE OF id, supplier_name, supplier_invoice_code, internal_invoice_number
+ON purchases BEGIN
+    INSERT INTO purchases_fts(
+        purchases_fts, rowid, supplier_name, supplier_invoice_code,
+        internal_invoice_number
+    )
+    VALUES (
+        'delete', old.id, old.supplier_name, old.supplier_invoice_code,
+        old.internal_invoice_number
+    );
+    INSERT INTO purchases_fts(
+        rowid, supplier_name, supplier_invoice_code, internal_invoice_number
+    )
+    VALUES (
+        new.id, new.supplier_name, new.supplier_invoice_code,
+        new.internal_invoice_number
+    );
+END;
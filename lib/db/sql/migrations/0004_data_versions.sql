@@ -0,0 +1,33 @@
+-- A persistent write counter per transaction table. Unlike PRAGMA
+-- data_version it survives restarts and counts writes from every
+-- connection, so it can key results cached on disk such as exports.
+CREATE TABLE IF NOT EXISTS data_versions (
+    table_name TEXT PRIMARY KEY,
+    version INTEGER NOT NULL DEFAULT 0
+);
+
+INSERT OR IGNORE INTO data_versions (table_name) VALUES ('sales'), ('purchases');
+
+CREATE TRIGGER IF NOT EXISTS sales_version_ai AFTER INSERT ON sales BEGIN
+    UPDATE data_versions SET version = version + 1 WHERE table_name = 'sales';
+END;
+
+CREATE TRIGGER IF NOT EXISTS sales_version_ad AFTER DELETE ON sales BEGIN
+    UPDATE data_versions SET version = version + 1 WHERE table_name = 'sales';
+END;
+
+CREATE TRIGGER IF NOT EXISTS sales_version_au AFTER UPDATE ON sales BEGIN
+    UPDATE data_versions SET version = version + 1 WHERE table_name = 'sales';
+END;
+
+CREATE TRIGGER IF NOT EXISTS purchases_version_ai AFTER INSERT ON purchases BEGIN
+    UPDATE data_versions SET version = version + 1 WHERE table_name = 'purchases';
+END;
+
+CREATE TRIGGER IF NOT EXISTS purchases_version_ad AFTER DELETE ON purchases BEGIN
+    UPDATE data_versions SET version = version + 1 WHERE table_name = 'purchases';
+END;
+
+CREATE TRIGGER IF NOT EXISTS purchases_version_au AFTER UPDATE ON purchases BEGIN
+    UPDATE data_versions SET version = version + 1 WHERE table_name = 'purchases';
+END;
@@ -0,0 +1,43 @@
+-- Store money as integer pence and VAT rates as integer basis points, so
+-- that sums and comparisons are exact. Each REAL column is replaced by an
+-- INTEGER column of the same name; triggers on other columns are kept.
+
+ALTER TABLE sales ADD COLUMN net_amount_int INTEGER;
+ALTER TABLE sales ADD COLUMN vat_percent_int INTEGER;
+UPDATE sales SET
+    net_amount_int = CAST(ROUND(net_amount * 100) AS INTEGER),
+    vat_percent_int = CAST(ROUND(vat_percent * 10000) AS INTEGER);
+ALTER TABLE sales DROP COLUMN net_amount;
+ALTER TABLE sales DROP COLUMN vat_percent;
+ALTER TABLE sales RENAME COLUMN net_amount_int TO net_amount;
+ALTER TABLE sales RENAME COLUMN vat_percent_int TO vat_percent;
+
+ALTER TABLE purchases ADD COLUMN net_amount_int INTEGER;
+ALTER TABLE purchases ADD COLUMN vat_percent_int INTEGER;
+ALTER TABLE purchases ADD COLUMN goods_int INTEGER;
+ALTER TABLE purchases ADD COLUMN utilities_int INTEGER;
+ALTER TABLE purchases ADD COLUMN motor_expenses_int INTEGER;
+ALTER TABLE purchases ADD COLUMN sundries_int INTEGER;
+ALTER TABLE purchases ADD COLUMN miscellaneous_int INTEGER;
+UPDATE purchases SET
+    net_amount_int = CAST(ROUND(net_amount * 100) AS INTEGER),
+    vat_percent_int = CAST(ROUND(vat_percent * 10000) AS INTEGER),
+    goods_int = CAST(ROUND(goods * 100) AS INTEGER),
+    utilities_int = CAST(ROUND(utilities * 100) AS INTEGER),
+    motor_expenses_int = CAST(ROUND(motor_expenses * 100) AS INTEGER),
+    sundries_int = CAST(ROUND(sundries * 100) AS INTEGER),
+    miscellaneous_int = CAST(ROUND(miscellaneous * 100) AS INTEGER);
+ALTER TABLE purchases DROP COLUMN net_amount;
+ALTER TABLE purchases DROP COLUMN vat_percent;
+ALTER TABLE purchases DROP COLUMN goods;
+ALTER TABLE purchases DROP COLUMN utilities;
+ALTER TABLE purchases DROP COLUMN motor_expenses;
+ALTER TABLE purchases DROP COLUMN sundries;
+ALTER TABLE purchases DROP COLUMN miscellaneous;
+ALTER TABLE purchases RENAME COLUMN net_amount_int TO net_amount;
+ALTER TABLE purchases RENAME COLUMN vat_percent_int TO vat_percent;
+ALTER TABLE purchases RENAME COLUMN goods_int TO goods;
+ALTER TABLE purchases RENAME COLUMN utilities_int TO utilities;
+ALTER TABLE purchases RENAME COLUMN motor_expenses_int TO motor_expenses;
+ALTER TABLE purchases RENAME COLUMN sundries_int TO sundries;
+ALTER TABLE purchases RENAME COLUMN miscellaneous_int TO miscellaneous;
@@ -0,0 +1,246 @@
+-- Running totals of sales and purchases per calendar month, VAT rate and
+-- payment method, kept up to date by triggers so that period reports read
+-- one row per group instead of every transaction. Amounts are pence and
+-- VAT is rounded per transaction, matching lib/db/reports.py.
+-- Rebuild or check with: python -m lib.db.monthly_totals [--check]
+CREATE TABLE IF NOT EXISTS monthly_totals (
+    kind TEXT NOT NULL,
+    year INTEGER NOT NULL,
+    month INTEGER NOT NULL,
+    vat_percent INTEGER NOT NULL,
+    payment_method TEXT NOT NULL,
+    count INTEGER NOT NULL DEFAULT 0,
+    net INTEGER NOT NULL DEFAULT 0,
+    vat INTEGER NOT NULL DEFAULT 0,
+    goods INTEGER NOT NULL DEFAULT 0,
+    utilities INTEGER NOT NULL DEFAULT 0,
+    motor_expenses INTEGER NOT NULL DEFAULT 0,
+    sundries INTEGER NOT NULL DEFAULT 0,
+    miscellaneous INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (kind, year, month, vat_percent, payment_method)
+) WITHOUT ROWID;
+
+INSERT INTO monthly_totals (kind, year, month, vat_percent, payment_method, count, net, vat)
+SELECT 'sales',
+    CAST(strftime('%Y', timestamp) AS INTEGER),
+    CAST(strftime('%m', timestamp) AS INTEGER),
+    COALESCE(vat_percent, 0),
+    COALESCE(payment_method, ''),
+    COUNT(*),
+    COALESCE(SUM(net_amount), 0),
+    COALESCE(SUM(CAST(ROUND(net_amount * vat_percent / 10000.0) AS INTEGER)), 0)
+FROM sales WHERE timestamp IS NOT NULL
+GROUP BY 2, 3, 4, 5;
+
+INSERT INTO monthly_totals (kind, year, month, vat_percent, payment_method, count, net, vat, goods, utilities, motor_expenses, sundries, miscellaneous)
+SELECT 'purchases',
+    CAST(strftime('%Y', timestamp) AS INTEGER),
+    CAST(strftime('%m', timestamp) AS INTEGER),
+    COALESCE(vat_percent, 0),
+    COALESCE(payment_method, ''),
+    COUNT(*),
+    COALESCE(SUM(net_amount), 0),
+    COALESCE(SUM(CAST(ROUND(net_amount * vat_percent / 10000.0) AS INTEGER)), 0),
+    COALESCE(SUM(goods), 0),
+    COALESCE(SUM(utilities), 0),
+    COALESCE(SUM(motor_expenses), 0),
+    COALESCE(SUM(sundries), 0),
+    COALESCE(SUM(miscellaneous), 0)
+FROM purchases WHERE timestamp IS NOT NULL
+GROUP BY 2, 3, 4, 5;
+
+-- A removed transaction is added with negative amounts; groups left with
+-- no transactions are deleted. The WHERE clauses on the SELECTs skip rows
+-- without a timestamp and keep ON CONFLICT from parsing as a join.
+
+CREATE TRIGGER IF NOT EXISTS sales_monthly_ai AFTER INSERT ON sales BEGIN
+    INSERT INTO monthly_totals (kind, year, month, vat_percent, payment_method, count, net, vat)
+    SELECT 'sales',
+        CAST(strftime('%Y', NEW.timestamp) AS INTEGER),
+        CAST(strftime('%m', NEW.timestamp) AS INTEGER),
+        COALESCE(NEW.vat_percent, 0),
+        COALESCE(NEW.payment_method, ''),
+        1,
+        COALESCE(NEW.net_amount, 0),
+        COALESCE(CAST(ROUND(NEW.net_amount * NEW.vat_percent / 10000.0) AS INTEGER), 0)
+    WHERE NEW.timestamp IS NOT NULL
+    ON CONFLICT DO UPDATE SET
+        count = count + excluded.count,
+        net = net + excluded.net,
+        vat = vat + excluded.vat;
+END;
+
+CREATE TRIGGER IF NOT EXISTS sales_monthly_ad AFTER DELETE ON sales BEGIN
+    INSERT INTO monthly_totals (kind, year, month, vat_percent, payment_method, count, net, vat)
+    SELECT 'sales',
+        CAST(strftime('%Y', OLD.timestamp) AS INTEGER),
+        CAST(strftime('%m', OLD.timestamp) AS INTEGER),
+        COALESCE(OLD.vat_percent, 0),
+        COALESCE(OLD.payment_method, ''),
+        -1,
+        -COALESCE(OLD.net_amount, 0),
+        -COALESCE(CAST(ROUND(OLD.net_amount * OLD.vat_percent / 10000.0) AS INTEGER), 0)
+    WHERE OLD.timestamp IS NOT NULL
+    ON CONFLICT DO UPDATE SET
+        count = count + excluded.count,
+        net = net + excluded.net,
+        vat = vat + excluded.vat;
+    DELETE FROM monthly_totals WHERE count = 0 AND kind = 'sales'
+        AND year = CAST(strftime('%Y', OLD.timestamp) AS INTEGER)
+        AND month = CAST(strftime('%m', OLD.timestamp) AS INTEGER)
+        AND vat_percent = COALESCE(OLD.vat_percent, 0)
+        AND payment_method = COALESCE(OLD.payment_method, '');
+END;
+
+CREATE TRIGGER IF NOT EXISTS sales_monthly_au
+AFTER UPDATE OF net_amount, vat_percent, payment_method, timestamp ON sales BEGIN
+    INSERT INTO monthly_totals (kind, year, month, vat_percent, payment_method, count, net, vat)
+    SELECT 'sales',
+        CAST(strftime('%Y', OLD.timestamp) AS INTEGER),
+        CAST(strftime('%m', OLD.timestamp) AS INTEGER),
+        COALESCE(OLD.vat_percent, 0),
+        COALESCE(OLD.payment_method, ''),
+        -1,
+        -COALESCE(OLD.net_amount, 0),
+        -COALESCE(CAST(ROUND(OLD.net_amount * OLD.vat_percent / 10000.0) AS INTEGER), 0)
+    WHERE OLD.timestamp IS NOT NULL
+    ON CONFLICT DO UPDATE SET
+        count = count + excluded.count,
+        net = net + excluded.net,
+        vat = vat + excluded.vat;
+    INSERT INTO monthly_totals (kind, year, month, vat_percent, payment_method, count, net, vat)
+    SELECT 'sales',
+        CAST(strftime('%Y', NEW.timestamp) AS INTEGER),
+        CAST(strftime('%m', NEW.timestamp) AS INTEGER),
+        COALESCE(NEW.vat_percent, 0),
+        COALESCE(NEW.payment_method, ''),
+        1,
+        COALESCE(NEW.net_amount, 0),
+        COALESCE(CAST(ROUND(NEW.net_amount * NEW.vat_percent / 10000.0) AS INTEGER), 0)
+    WHERE NEW.timestamp IS NOT NULL
+    ON CONFLICT DO UPDATE SET
+        count = count + excluded.count,
+        net = net + excluded.net,
+        vat = vat + excluded.vat;
+    DELETE FROM monthly_totals WHERE count = 0 AND kind = 'sales'
+        AND year = CAST(strftime('%Y', OLD.timestamp) AS INTEGER)
+        AND month = CAST(strftime('%m', OLD.timestamp) AS INTEGER)
+        AND vat_percent = COALESCE(OLD.vat_percent, 0)
+        AND payment_method = COALESCE(OLD.payment_method, '');
+END;
+
+CREATE TRIGGER IF NOT EXISTS purchases_monthly_ai AFTER INSERT ON purchases BEGIN
+    INSERT INTO monthly_totals (kind, year, month, vat_percent, payment_method, count, net, vat, goods, utilities, motor_expenses, sundries, miscellaneous)
+    SELECT 'purchases',
+        CAST(strftime('%Y', NEW.timestamp) AS INTEGER),
+        CAST(strftime('%m', NEW.timestamp) AS INTEGER),
+        COALESCE(NEW.vat_percent, 0),
+        COALESCE(NEW.payment_method, ''),
+        1,
+        COALESCE(NEW.net_amount, 0),
+        COALESCE(CAST(ROUND(NEW.net_amount * NEW.vat_percent / 10000.0) AS INTEGER), 0),
+        COALESCE(NEW.goods, 0),
+        COALESCE(NEW.utilities, 0),
+        COALESCE(NEW.motor_expenses, 0),
+        COALESCE(NEW.sundries, 0),
+        COALESCE(NEW.miscellaneous, 0)
+    WHERE NEW.timestamp IS NOT NULL
+    ON CONFLICT DO UPDATE SET
+        count = count + excluded.count,
+        net = net + excluded.net,
+        vat = vat + excluded.vat,
+        goods = goods + excluded.goods,
+        utilities = utilities + excluded.utilities,
+        motor_expenses = motor_expenses + excluded.motor_expenses,
+        sundries = sundries + excluded.sundries,
+        miscellaneous = miscellaneous + excluded.miscellaneous;
+END;
+
+CREATE TRIGGER IF NOT EXISTS purchases_monthly_ad AFTER DELETE ON purchases BEGIN
+    INSERT INTO monthly_totals (kind, year, month, vat_percent, payment_method, count, net, vat, goods, utilities, motor_expenses, sundries, miscellaneous)
+    SELECT 'purchases',
+        CAST(strftime('%Y', OLD.timestamp) AS INTEGER),
+        CAST(strftime('%m', OLD.timestamp) AS INTEGER),
+        COALESCE(OLD.vat_percent, 0),
+        COALESCE(OLD.payment_method, ''),
+        -1,
+        -COALESCE(OLD.net_amount, 0),
+        -COALESCE(CAST(ROUND(OLD.net_amount * OLD.vat_percent / 10000.0) AS INTEGER), 0),
+        -COALESCE(OLD.goods, 0),
+        -COALESCE(OLD.utilities, 0),
+        -COALESCE(OLD.motor_expenses, 0),
+        -COALESCE(OLD.sundries, 0),
+        -COALESCE(OLD.miscellaneous, 0)
+    WHERE OLD.timestamp IS NOT NULL
+    ON CONFLICT DO UPDATE SET
+        count = count + excluded.count,
+        net = net + excluded.net,
+        vat = vat + excluded.vat,
+        goods = goods + excluded.goods,
+        utilities = utilities + excluded.utilities,
+        motor_expenses = motor_expenses + excluded.motor_expenses,
+        sundries = sundries + excluded.sundries,
+        miscellaneous = miscellaneous + excluded.miscellaneous;
+    DELETE FROM monthly_totals WHERE count = 0 AND kind = 'purchases'
+        AND year = CAST(strftime('%Y', OLD.timestamp) AS INTEGER)
+        AND month = CAST(strftime('%m', OLD.timestamp) AS INTEGER)
+        AND vat_percent = COALESCE(OLD.vat_percent, 0)
+        AND payment_method = COALESCE(OLD.payment_method, '');
+END;
+
+CREATE TRIGGER IF NOT EXISTS purchases_monthly_au
+AFTER UPDATE OF net_amount, vat_percent, goods, utilities, motor_expenses, sundries, miscellaneous, payment_method, timestamp ON purchases BEGIN
+    INSERT INTO monthly_totals (kind, year, month, vat_percent, payment_method, count, net, vat, goods, utilities, motor_expenses, sundries, miscellaneous)
+    SELECT 'purchases',
+        CAST(strftime('%Y', OLD.timestamp) AS INTEGER),
+        CAST(strftime('%m', OLD.timestamp) AS INTEGER),
+        COALESCE(OLD.vat_percent, 0),
+        COALESCE(OLD.payment_method, ''),
+        -1,
+        -COALESCE(OLD.net_amount, 0),
+        -COALESCE(CAST(ROUND(OLD.net_amount * OLD.vat_percent / 10000.0) AS INTEGER), 0),
+        -COALESCE(OLD.goods, 0),
+        -COALESCE(OLD.utilities, 0),
+        -COALESCE(OLD.motor_expenses, 0),
+        -COALESCE(OLD.sundries, 0),
+        -COALESCE(OLD.miscellaneous, 0)
+    WHERE OLD.timestamp IS NOT NULL
+    ON CONFLICT DO UPDATE SET
+        count = count + excluded.count,
+        net = net + excluded.net,
+        vat = vat + excluded.vat,
+        goods = goods + excluded.goods,
+        utilities = utilities + excluded.utilities,
+        motor_expenses = motor_expenses + excluded.motor_expenses,
+        sundries = sundries + excluded.sundries,
+        miscellaneous = miscellaneous + excluded.miscellaneous;
+    INSERT INTO monthly_totals (kind, year, month, vat_percent, payment_method, count, net, vat, goods, utilities, motor_expenses, sundries, miscellaneous)
+    SELECT 'purchases',
+        CAST(strftime('%Y', NEW.timestamp) AS INTEGER),
+        CAST(strftime('%m', NEW.timestamp) AS INTEGER),
+        COALESCE(NEW.vat_percent, 0),
+        COALESCE(NEW.payment_method, ''),
+        1,
+        COALESCE(NEW.net_amount, 0),
+        COALESCE(CAST(ROUND(NEW.net_amount * NEW.vat_percent / 10000.0) AS INTEGER), 0),
+        COALESCE(NEW.goods, 0),
+        COALESCE(NEW.utilities, 0),
+        COALESCE(NEW.motor_expenses, 0),
+        COALESCE(NEW.sundries, 0),
+        COALESCE(NEW.miscellaneous, 0)
+    WHERE NEW.timestamp IS NOT NULL
+    ON CONFLICT DO UPDATE SET
+        count = count + excluded.count,
+        net = net + excluded.net,
+        vat = vat + excluded.vat,
+        goods = goods + excluded.goods,
+        utilities = utilities + excluded.utilities,
+        motor_expenses = motor_expenses + excluded.motor_expenses,
+        sundries = sundries + excluded.sundries,
+        miscellaneous = miscellaneous + excluded.miscellaneous;
+    DELETE FROM monthly_totals WHERE count = 0 AND kind = 'purchases'
+        AND year = CAST(strftime('%Y', OLD.timestamp) AS INTEGER)
+        AND month = CAST(strftime('%m', OLD.timestamp) AS INTEGER)
+        AND vat_percent = COALESCE(OLD.vat_percent, 0)
+        AND payment_method = COALESCE(OLD.payment_method, '');
+END;
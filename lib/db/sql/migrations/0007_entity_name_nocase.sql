@@ -0,0 +1,5 @@
+-- Name autocomplete matches a case-insensitive prefix with LIKE, which
+-- SQLite answers from an index only if the index uses NOCASE collation.
+CREATE INDEX IF NOT EXISTS idx_customers_name_nocase ON customers(name COLLATE NOCASE);
+
+CREATE INDEX IF NOT EXISTS idx_suppliers_name_nocase ON suppliers(name COLLATE NOCASE);
@@ -0,0 +1,10 @@
+-- Edits saved timestamps as entered, e.g. "2025-01-02T10:00" from a
+-- datetime-local input. Rewrite them in the stored "YYYY-MM-DD HH:MM:SS"
+-- form, which exports, date filters and keyset paging compare against.
+UPDATE sales SET timestamp = strftime('%Y-%m-%d %H:%M:%S', timestamp)
+WHERE strftime('%Y-%m-%d %H:%M:%S', timestamp) IS NOT NULL
+    AND timestamp <> strftime('%Y-%m-%d %H:%M:%S', timestamp);
+
+UPDATE purchases SET timestamp = strftime('%Y-%m-%d %H:%M:%S', timestamp)
+WHERE strftime('%Y-%m-%d %H:%M:%S', timestamp) IS NOT NULL
+    AND timestamp <> strftime('%Y-%m-%d %H:%M:%S', timestamp);
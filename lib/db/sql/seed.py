@@ -1,4 +1,5 @@
 from typing import Optional
+from lib.db.migrations import migrate
 from lib.db.utils import *
 
 
@@ -13,6 +14,7 @@ def run_sql_script(path: str, db_path: Optional[Path] = None) -> None:
 def refresh_tables() -> None:
     run_sql_script("lib/db/sql/drop_tables.sql")
     run_sql_script("lib/db/schema.sql")
+    migrate()
 
 
 def seed() -> None:
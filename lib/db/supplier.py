@@ -1,13 +1,25 @@
 import logging
-import sqlite3
 from pathlib import Path
-from typing import Optional, List
-from lib.db.entity import Entity, EntityRepository
+from typing import Iterable, Iterator, List, Optional, Tuple
+from lib.db.entity import SUGGEST_LIMIT, Entity, EntityRepository
 from lib.db.purchase import Purchase, PurchaseRepository
+from lib.db.bulk import DEFAULT_CHUNK_SIZE, insert_many, iter_rows
+from lib.db.cache import (
+    QueryCache,
+    bump_generation,
+    entity_index,
+    get_version,
+)
+from lib.db.fts import fts_tables, prefix_pattern, substring_condition
+from lib.db.pool import get_connection
 from lib.db.utils import get_db_path
 
 logger = logging.getLogger(__name__)
 
+# Stored rows are cached, since they are immutable, and each hit
+# hydrates new models from them
+_result_cache = QueryCache(version=get_version, name="suppliers")
+
 
 class Supplier(Entity):
     def __init__(self, id: Optional[int], name: str) -> None:
@@ -30,7 +42,7 @@ class SupplierRepository(EntityRepository[Supplier]):
         self.db_path = db_path or get_db_path()
 
     def _connect(self):
-        return sqlite3.connect(self.db_path)
+        return get_connection(self.db_path)
 
     def create(self, supplier: Supplier) -> Supplier:
         created_supplier = None
@@ -41,6 +53,8 @@ class SupplierRepository(EntityRepository[Supplier]):
                     "INSERT INTO suppliers (name) VALUES (?)", (supplier.name,)
                 )
                 conn.commit()
+                bump_generation(self.db_path)
+                entity_index.invalidate(self.db_path, "suppliers")
                 created_supplier = Supplier(cursor.lastrowid, supplier.name)
             else:
                 cursor.execute(
@@ -48,9 +62,28 @@ class SupplierRepository(EntityRepository[Supplier]):
                     (supplier.id, supplier.name),
                 )
                 conn.commit()
+                bump_generation(self.db_path)
+                entity_index.invalidate(self.db_path, "suppliers")
                 created_supplier = supplier
             return created_supplier
 
+    def create_many(
+        self,
+        suppliers: Iterable[Supplier],
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+    ) -> List[int]:
+        ids = insert_many(
+            self._connect(),
+            "suppliers",
+            ("name",),
+            suppliers,
+            lambda supplier: (supplier.name,),
+            chunk_size,
+        )
+        bump_generation(self.db_path)
+        entity_index.invalidate(self.db_path, "suppliers")
+        return ids
+
     def read(
         self, id: Optional[int] = None, name: Optional[str] = None
     ) -> Optional[Supplier]:
@@ -72,6 +105,24 @@ class SupplierRepository(EntityRepository[Supplier]):
             row = cursor.fetchone()
             return Supplier(*row) if row else None
 
+    def lookup(
+        self, id: Optional[int] = None, name: Optional[str] = None
+    ) -> Optional[Supplier]:
+        maps = entity_index.get(self.db_path, "suppliers", self._names)
+        if id is not None:
+            name = maps.by_id.get(id)
+            return Supplier(id, name) if name is not None else None
+        elif name is not None:
+            id = maps.by_name.get(name)
+            return Supplier(id, name) if id is not None else None
+        raise ValueError("Either id or name required to look up a supplier")
+
+    def _names(self) -> List[tuple]:
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT id, name FROM suppliers")
+            return cursor.fetchall()
+
     def update(self, supplier: Supplier) -> Supplier:
         with self._connect() as conn:
             cursor = conn.cursor()
@@ -84,6 +135,8 @@ class SupplierRepository(EntityRepository[Supplier]):
                 (supplier.name, supplier.id),
             )
             conn.commit()
+            bump_generation(self.db_path)
+            entity_index.invalidate(self.db_path, "suppliers")
             return self.read(id=supplier.id)
 
     def delete(self, id: int) -> Optional[Supplier]:
@@ -98,26 +151,76 @@ class SupplierRepository(EntityRepository[Supplier]):
                 "DELETE FROM purchases WHERE supplier_id = ?", (id,)
             )
             conn.commit()
+            bump_generation(self.db_path)
+            entity_index.invalidate(self.db_path, "suppliers")
             return supplier
 
     def search(self, name_query: str) -> List[Supplier]:
+        rows = _result_cache.get_or_compute(
+            self.db_path,
+            ("search", name_query.lower()),
+            lambda: self._search(name_query),
+        )
+        return [Supplier(id=row[0], name=row[1]) for row in rows]
+
+    def _search(self, name_query: str) -> Tuple[tuple, ...]:
         with self._connect() as conn:
+            use_fts = "suppliers_fts" in fts_tables(conn, self.db_path)
             cursor = conn.cursor()
             cursor.execute(
-                "SELECT id, name FROM suppliers WHERE LOWER(name) LIKE ?",
+                "SELECT id, name FROM suppliers WHERE "
+                + substring_condition("suppliers", "name", use_fts),
                 (f"%{name_query.lower()}%",),
             )
+            return tuple(cursor.fetchall())
+
+    def suggest(
+        self, prefix: str, limit: int = SUGGEST_LIMIT
+    ) -> List[Supplier]:
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                "SELECT id, name FROM suppliers WHERE name LIKE ? ESCAPE '\\' "
+                "ORDER BY name COLLATE NOCASE LIMIT ?",
+                (prefix_pattern(prefix), limit),
+            )
             rows = cursor.fetchall()
             return [Supplier(id=row[0], name=row[1]) for row in rows]
 
-    def all(self) -> list[Supplier]:
+    def iter_search(
+        self, name_query: str, batch_size: int = DEFAULT_CHUNK_SIZE
+    ) -> Iterator[Supplier]:
+        with self._connect() as conn:
+            use_fts = "suppliers_fts" in fts_tables(conn, self.db_path)
+            cursor = conn.cursor()
+            cursor.execute(
+                "SELECT id, name FROM suppliers WHERE "
+                + substring_condition("suppliers", "name", use_fts),
+                (f"%{name_query.lower()}%",),
+            )
+            for row in iter_rows(cursor, batch_size):
+                yield Supplier(id=row[0], name=row[1])
+
+    def all(self) -> List[Supplier]:
+        rows = _result_cache.get_or_compute(self.db_path, ("all",), self._all)
+        return [Supplier(id=row[0], name=row[1]) for row in rows]
+
+    def _all(self) -> Tuple[tuple, ...]:
         with self._connect() as conn:
             cursor = conn.cursor()
             cursor.execute(
                 "SELECT id, name FROM suppliers",
             )
-            rows = cursor.fetchall()
-            return [Supplier(id=row[0], name=row[1]) for row in rows]
+            return tuple(cursor.fetchall())
+
+    def iter_all(
+        self, batch_size: int = DEFAULT_CHUNK_SIZE
+    ) -> Iterator[Supplier]:
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT id, name FROM suppliers")
+            for row in iter_rows(cursor, batch_size):
+                yield Supplier(id=row[0], name=row[1])
 
     def transaction_repository(
         self, db_path: Optional[Path] = None
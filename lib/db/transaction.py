@@ -1,5 +1,15 @@
 from abc import ABC, abstractmethod
-from typing import Generic, List, Optional, Protocol, TypeVar
+from typing import (
+    Generic,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Protocol,
+    TypeVar,
+)
+from lib.db.bulk import DEFAULT_CHUNK_SIZE
+from lib.db.pagination import Cursor
 
 
 class HasID(Protocol):
@@ -7,7 +17,8 @@ class HasID(Protocol):
 
 
 class Transaction(ABC):
-    pass
+    # Subclasses list their fields in __slots__, so instances have no __dict__
+    __slots__ = ()
 
 
 T = TypeVar("T", bound=Transaction)
@@ -24,6 +35,13 @@ class TransactionRepository(ABC, Generic[T]):
         """Creates a transaction record in the database."""
         pass
 
+    @abstractmethod
+    def create_many(
+        self, transactions: Iterable[T], chunk_size: int = DEFAULT_CHUNK_SIZE
+    ) -> List[int]:
+        """Creates transaction records in chunked inserts within one transaction, returning their ids in order."""
+        pass
+
     @abstractmethod
     def read(self, id: int) -> Optional[T]:
         """Get a transaction by its ID, or return None."""
@@ -40,8 +58,30 @@ class TransactionRepository(ABC, Generic[T]):
         pass
 
     @abstractmethod
-    def search(self, filters: dict) -> List[T]:
-        """Returns a list of transactions matching the supplied filters."""
+    def search(
+        self,
+        filters: dict,
+        limit: Optional[int] = None,
+        page_cursor: Optional[Cursor] = None,
+    ) -> List[T]:
+        """Returns a list of transactions matching the supplied filters, ordered by timestamp and id, optionally limited to the rows after or before page_cursor."""
+        pass
+
+    @abstractmethod
+    def iter_search(
+        self, filters: dict, batch_size: int = DEFAULT_CHUNK_SIZE
+    ) -> Iterator[T]:
+        """Yields the transactions matching the supplied filters in timestamp order, fetching batch_size rows at a time."""
+        pass
+
+    @abstractmethod
+    def count(self, filters: dict) -> int:
+        """Returns the number of transactions matching the supplied filters."""
+        pass
+
+    @abstractmethod
+    def facets(self, filters: Optional[dict] = None) -> dict:
+        """Returns the distinct values of each facet column, with their counts, among transactions matching the supplied filters."""
         pass
 
     @abstractmethod
@@ -49,7 +89,19 @@ class TransactionRepository(ABC, Generic[T]):
         """Returns a list of transactions which correspond to the given entity."""
         pass
 
+    @abstractmethod
+    def iter_by_parent(
+        self, entity: HasID, batch_size: int = DEFAULT_CHUNK_SIZE
+    ) -> Iterator[T]:
+        """Yields the transactions which correspond to the given entity, fetching batch_size rows at a time."""
+        pass
+
     @abstractmethod
     def all(self) -> List[T]:
         """Returns a list of all transactions."""
         pass
+
+    @abstractmethod
+    def iter_all(self, batch_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[T]:
+        """Yields every transaction, fetching batch_size rows at a time."""
+        pass
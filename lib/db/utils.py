@@ -30,6 +30,11 @@ def get_recovery_path() -> Path:
     return get_app_data_folder_path() / "recovery"
 
 
+def get_recovery_journal_path() -> Path:
+    """Return the full path to the journal of deleted records, platform-aware."""
+    return get_recovery_path() / "journal.db"
+
+
 def database_exists() -> bool:
     """Check if the database file exists at the platform-specific location."""
     db_path = get_db_path()
@@ -40,17 +45,28 @@ def database_exists() -> bool:
     return exists
 
 
+def get_sql_path() -> Path:
+    """
+    Returns the path of the sql folder, whether in frozen mode or not
+    """
+    if getattr(sys, "frozen", False) and hasattr(sys, "_MEIPASS"):
+        return Path(sys._MEIPASS) / "lib" / "db" / "sql"
+    return Path(__file__).parent / "sql"
+
+
+def get_migrations_path() -> Path:
+    """
+    Returns the path of the folder of migration scripts, whether in frozen mode or not
+    """
+    return get_sql_path() / "migrations"
+
+
 def get_schema_path(retries=3, delay=0.3) -> Path:
     """
     Returns the path of the schema.sql, whether in frozen mode or not
     """
     for i in range(retries):
-        if getattr(sys, "frozen", False) and hasattr(sys, "_MEIPASS"):
-            base_path = Path(sys._MEIPASS) / "lib" / "db" / "sql"
-        else:
-            base_path = Path(__file__).parent / "sql"
-
-        schema_path = base_path / "schema.sql"
+        schema_path = get_sql_path() / "schema.sql"
 
         if schema_path.exists():
             return schema_path
@@ -90,92 +106,6 @@ def init_db() -> None:
     logger.info(f"[DB] Initialized new database at {db_path}")
 
 
-# --- Recovery DB utility ---
-def create_recovery_db() -> Path:
-    """Create a recovery SQLite DB."""
-    recovery_dir = get_recovery_path()
-    recovery_dir.mkdir(parents=True, exist_ok=True)
-
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    recovery_path = recovery_dir / f"{timestamp}.db"
-
-    # Create empty DB
-    schema_path = get_schema_path()
-    conn = sqlite3.connect(recovery_path)
-    with open(schema_path, "r", encoding="utf-8") as f:
-        schema_sql = f.read()
-        conn.executescript(schema_sql)
-
-    return recovery_path
-
-
-def backup_deleted_entity(entity, repo_class) -> None:
-    """Populate a recovery database with an entity and its related transactions."""
-    try:
-        recovery_db_path = create_recovery_db()
-        recovery_repo = repo_class(db_path=recovery_db_path)
-        recovery_repo.create(entity)
-        transactions_repo = recovery_repo.transaction_repository(
-            db_path=recovery_db_path
-        )
-        transactions = recovery_repo.get_transactions(entity)
-        for transaction in transactions:
-            transactions_repo.create(transaction)
-        logger.info(
-            "[RECOVERY] Successfully backed up entity and transactions."
-        )
-    except Exception as err:
-        logger.error(f"[RECOVERY] Recovery failed due to error:\n{err}")
-        raise
-
-    return
-
-
-def backup_deleted_transactions(transactions, repo_class) -> None:
-    """Populate a recovery database with an entity and its related transactions."""
-    try:
-        recovery_db_path = create_recovery_db()
-        recovery_repo = repo_class(db_path=recovery_db_path)
-        for transaction in transactions:
-            recovery_repo.create(transaction)
-
-        logger.info("[RECOVERY] Successfully backed up transaction(s).")
-    except Exception as err:
-        logger.error(f"[RECOVERY] Recovery failed due to error:\n{err}")
-        raise
-
-    return
-
-
-def delete_old_recovery_dbs(older_than_days: int = 30) -> None:
-    """Delete recovery database files older than a given number of days."""
-    recovery_dir = get_recovery_path()
-    if not recovery_dir.exists():
-        logger.warning("[CLEANUP] Recovery directory does not exist.")
-        return
-
-    cutoff = datetime.now().timestamp() - (older_than_days * 86400)
-    deleted_files = 0
-
-    for db_file in recovery_dir.glob("*.db"):
-        try:
-            # Check if filename matches the expected pattern: YYYYMMDD_HHMMSS.db
-            if db_file.stem.count("_") != 1:
-                continue
-            datetime.strptime(db_file.stem, "%Y%m%d_%H%M%S")  # Validate format
-
-            if db_file.stat().st_mtime < cutoff:
-                db_file.unlink()
-                deleted_files += 1
-                logger.info(
-                    f"[CLEANUP] Deleted old recovery DB: {db_file.name}"
-                )
-        except Exception as e:
-            logger.warning(f"[CLEANUP] Skipped {db_file.name}: {e}")
-
-    logger.info(f"[CLEANUP] Deleted {deleted_files} old recovery database(s).")
-
-
 def normalize_datetime(dt_str, output_format="%Y-%m-%d %H:%M:%S"):
     """Try to parse a datetime string using multiple possible formats.
 
@@ -200,3 +130,13 @@ def normalize_datetime(dt_str, output_format="%Y-%m-%d %H:%M:%S"):
             continue
 
     return None
+
+
+def canonical_datetime(dt_str) -> str:
+    """
+    Returns `dt_str` in the stored "%Y-%m-%d %H:%M:%S" form, raising
+    ValueError if it is not a datetime normalize_datetime() recognises.
+    """
+    if canonical := normalize_datetime(dt_str):
+        return canonical
+    raise ValueError(f"Invalid timestamp: '{dt_str}'")
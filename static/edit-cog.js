@@ -4,23 +4,27 @@ document.addEventListener("DOMContentLoaded", () => {
   cogButton.className = "cog-btn";
   cogButton.type = "button";
 
-  document.querySelectorAll(".clickable-row").forEach(row => {
-    const cell = row.querySelector("td.cog-col");
-    cell.style.position = "relative";
+  // Rows may be replaced when a new page is fetched, so binding is repeatable
+  window.bindCogRows = () => {
+    document.querySelectorAll(".clickable-row").forEach(row => {
+      const cell = row.querySelector("td.cog-col");
+      cell.style.position = "relative";
 
-    row.addEventListener("mouseenter", () => {
-      cogButton.dataset.href = row.dataset.href;
-      cell.innerHTML = "";
-      cell.appendChild(cogButton);
-    });
+      row.addEventListener("mouseenter", () => {
+        cogButton.dataset.href = row.dataset.href;
+        cell.innerHTML = "";
+        cell.appendChild(cogButton);
+      });
 
-    row.addEventListener("mouseleave", () => {
-      cell.innerHTML = "";
+      row.addEventListener("mouseleave", () => {
+        cell.innerHTML = "";
+      });
     });
-  });
+  };
+  window.bindCogRows();
 
   cogButton.addEventListener("click", (e) => {
     e.stopPropagation();
     window.location.href = cogButton.dataset.href;
   });
-});
\ No newline at end of file
+});
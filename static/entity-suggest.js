@@ -0,0 +1,27 @@
+// Fills the datalist of each input[data-suggest] with the names returned by
+// its suggest endpoint, so forms never embed every customer or supplier.
+document.addEventListener("DOMContentLoaded", () => {
+  document.querySelectorAll("input[data-suggest]").forEach(input => {
+    const list = document.getElementById(input.getAttribute("list"));
+    let timer = null;
+    let latest = 0;
+
+    input.addEventListener("input", () => {
+      clearTimeout(timer);
+      timer = setTimeout(async () => {
+        const request = ++latest;
+        const url = `${input.dataset.suggest}?q=${encodeURIComponent(input.value)}`;
+        const response = await fetch(url);
+        // Ignore replies to keystrokes which have since been superseded
+        if (!response.ok || request !== latest) return;
+
+        list.innerHTML = "";
+        (await response.json()).forEach(entity => {
+          const option = document.createElement("option");
+          option.value = entity.name;
+          list.appendChild(option);
+        });
+      }, 150);
+    });
+  });
+});
@@ -0,0 +1,45 @@
+document.addEventListener("DOMContentLoaded", () => {
+  const panel = document.getElementById("export-job");
+  if (!panel) return;
+
+  const status = document.getElementById("export-status");
+  const rows = document.getElementById("export-rows");
+  const sheets = document.getElementById("export-sheets");
+  const error = document.getElementById("export-error");
+  const cancelButton = document.getElementById("export-cancel");
+  const ready = document.getElementById("export-ready");
+
+  const show = (job) => {
+    status.textContent = job.cached ? `${job.status} (cached)` : job.status;
+    rows.textContent = job.rows_written;
+    sheets.textContent = job.sheets_done;
+
+    const finished = ["done", "cancelled", "failed"].includes(job.status);
+    cancelButton.style.display = finished ? "none" : "";
+    ready.style.display = job.status === "done" ? "" : "none";
+    if (job.error) {
+      error.textContent = `Export failed: ${job.error}`;
+      error.style.display = "";
+    }
+    return finished;
+  };
+
+  // Poll until the job finishes; the export itself runs on the server
+  const poll = () => {
+    fetch(panel.dataset.statusUrl)
+      .then(response => response.json())
+      .then(job => {
+        if (!show(job)) setTimeout(poll, 500);
+      })
+      .catch(() => setTimeout(poll, 2000));
+  };
+
+  cancelButton.addEventListener("click", () => {
+    cancelButton.disabled = true;
+    fetch(panel.dataset.cancelUrl, { method: "POST" })
+      .then(response => response.json())
+      .then(show);
+  });
+
+  poll();
+});
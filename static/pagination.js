@@ -35,7 +35,62 @@ function updatePaginationControls(totalPages, perPage) {
     }
 }
 
+// Server-side pagination: the server renders one page of rows and hands us
+// opaque cursor tokens for the neighbouring pages.
+function fetchServerPage(container, cursor) {
+    const params = new URLSearchParams(window.location.search);
+    params.set("cursor", cursor);
+    history.pushState(null, "", `${window.location.pathname}?${params}`);
+
+    params.set("partial", "1");
+    fetch(`${window.location.pathname}?${params}`)
+        .then(response => response.json())
+        .then(data => {
+            document.querySelector("#results table tbody").innerHTML = data.html;
+            container.dataset.page = data.page;
+            container.dataset.total = data.total;
+            container.dataset.next = data.next || "";
+            container.dataset.prev = data.prev || "";
+            updateServerPaginationControls(container);
+            if (window.bindCogRows) window.bindCogRows();
+        })
+        .catch(() => window.location.reload());
+}
+
+function updateServerPaginationControls(container) {
+    const perPage = window.PAGINATE_PER_PAGE || 10;
+    const page = parseInt(container.dataset.page);
+    const total = parseInt(container.dataset.total);
+    const totalPages = Math.max(1, Math.ceil(total / perPage));
+    container.innerHTML = "";
+
+    if (container.dataset.prev) {
+        const prev = document.createElement("button");
+        prev.textContent = "Previous";
+        prev.onclick = () => fetchServerPage(container, container.dataset.prev);
+        container.appendChild(prev);
+    }
+
+    const status = document.createElement("span");
+    status.textContent = ` Page ${page} of ${totalPages} (${total} results) `;
+    container.appendChild(status);
+
+    if (container.dataset.next) {
+        const next = document.createElement("button");
+        next.textContent = "Next";
+        next.onclick = () => fetchServerPage(container, container.dataset.next);
+        container.appendChild(next);
+    }
+}
+
 document.addEventListener("DOMContentLoaded", () => {
+    const container = document.getElementById("pagination-controls");
+    if (container.dataset.server) {
+        updateServerPaginationControls(container);
+        // Pages are fetched in place, so reload to show the page in the URL
+        window.addEventListener("popstate", () => window.location.reload());
+        return;
+    }
     const PER_PAGE = window.PAGINATE_PER_PAGE || 3;
     renderPage(1, PER_PAGE);
-});
\ No newline at end of file
+});
@@ -0,0 +1,34 @@
+import tempfile
+import pytest
+from pathlib import Path
+from lib.db.fts import forget_fts_tables
+from lib.db.pool import close_all_connections
+from tests.data_utils import create_db
+
+
+@pytest.fixture
+def tmp_dir():
+    """A temporary folder, whose pooled connections are closed afterwards."""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        yield Path(tmp_dir)
+        close_all_connections()
+        forget_fts_tables()
+
+
+@pytest.fixture
+def db_path(tmp_dir):
+    """A database created from schema.sql and fully migrated."""
+    return create_db(tmp_dir / "test.db")
+
+
+@pytest.fixture
+def app_data(tmp_dir, monkeypatch):
+    """
+    Points the app data folder at tmp_dir, so that code using the default
+    database, such as the export jobs, reads a migrated database there.
+    """
+    monkeypatch.setattr(
+        "lib.db.utils.get_app_data_folder_path", lambda: tmp_dir
+    )
+    create_db(tmp_dir / ".bookkeeppr.db")
+    return tmp_dir
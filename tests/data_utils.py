@@ -1,6 +1,12 @@
 import ast
 import json
+import sqlite3
+from pathlib import Path
 from typing import Any
+from lib.db.migrations import migrate
+from lib.db.purchase import Purchase
+from lib.db.sale import Sale
+from lib.db.utils import get_schema_path
 
 
 def get_test_data(filepath: str) -> Any:
@@ -17,3 +23,81 @@ def get_test_data(filepath: str) -> Any:
     if filepath.endswith(".json"):
         with open(filepath, "r") as data:
             return json.load(data)
+
+
+def create_db(db_path: Path, migrated: bool = True) -> Path:
+    """
+    Create a database at `db_path` from schema.sql, as init_db() does.
+
+    :param db_path: Path of the database file to create.
+    :param migrated: Whether to apply the migrations as well.
+    :return: `db_path`
+    """
+    conn = sqlite3.connect(db_path)
+    with open(get_schema_path(), "r", encoding="utf-8") as f:
+        conn.executescript(f.read())
+    conn.close()
+    if migrated:
+        migrate(db_path)
+    return db_path
+
+
+def count(db_path: Path, table: str) -> int:
+    """Return the number of rows in `table`."""
+    conn = sqlite3.connect(db_path)
+    (n,) = conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()
+    conn.close()
+    return n
+
+
+def make_sale(
+    n: int,
+    net_amount: float = 10.0,
+    vat_percent: float = 0.2,
+    timestamp: str = "2024-01-01",
+    payment_method: str = "Card",
+    id: int = None,
+) -> Sale:
+    """Return a sale to customer 1, Acme, with invoice number INV-<n>."""
+    return Sale(
+        id,
+        1,
+        "Acme",
+        f"INV-{n:04d}",
+        net_amount,
+        vat_percent,
+        payment_method,
+        timestamp,
+    )
+
+
+def make_purchase(
+    n: int,
+    goods: float = 100.0,
+    sundries: float = 0.0,
+    timestamp: str = "2024-01-01",
+    vat_percent: float = 0.2,
+    capital_spend: bool = False,
+    id: int = None,
+) -> Purchase:
+    """
+    Return a purchase from supplier 1, Supplies Ltd, with internal invoice
+    number P-<n>, whose net amount is its goods plus sundries.
+    """
+    return Purchase(
+        id,
+        1,
+        "Supplies Ltd",
+        f"SUP-{n}",
+        f"P-{n:04d}",
+        goods + sundries,
+        vat_percent,
+        goods,
+        0.0,
+        0.0,
+        sundries,
+        0.0,
+        "Bank Transfer",
+        timestamp,
+        capital_spend,
+    )
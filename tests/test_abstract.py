@@ -21,6 +21,13 @@ class DummyTransactionRepo(TransactionRepository[DummyTransaction]):
     def create(self, transaction: DummyTransaction) -> DummyTransaction:
         return transaction
 
+    def create_many(
+        self,
+        transactions: Iterable[DummyTransaction],
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+    ) -> List[int]:
+        return [i for i, _ in enumerate(transactions, start=1)]
+
     def read(self, id: int) -> Optional[DummyTransaction]:
         return DummyTransaction()
 
@@ -32,15 +39,41 @@ class DummyTransactionRepo(TransactionRepository[DummyTransaction]):
     def delete(self, id: int) -> Optional[DummyTransaction]:
         return DummyTransaction()
 
-    def search(self, filters: dict) -> List[DummyTransaction]:
+    def search(
+        self,
+        filters: dict,
+        limit: Optional[int] = None,
+        page_cursor: Optional[Cursor] = None,
+    ) -> List[DummyTransaction]:
         return [DummyTransaction()]
 
+    def count(self, filters: dict) -> int:
+        return 1
+
+    def facets(self, filters: Optional[dict] = None) -> dict:
+        return {}
+
+    def iter_search(
+        self, filters: dict, batch_size: int = DEFAULT_CHUNK_SIZE
+    ) -> Iterator[DummyTransaction]:
+        yield from self.search(filters)
+
     def search_by_parent(self, entity: HasID) -> List[DummyTransaction]:
         return [DummyTransaction()]
 
+    def iter_by_parent(
+        self, entity: HasID, batch_size: int = DEFAULT_CHUNK_SIZE
+    ) -> Iterator[DummyTransaction]:
+        yield from self.search_by_parent(entity)
+
     def all(self) -> List[DummyTransaction]:
         return [DummyTransaction()]
 
+    def iter_all(
+        self, batch_size: int = DEFAULT_CHUNK_SIZE
+    ) -> Iterator[DummyTransaction]:
+        yield from self.all()
+
 
 class DummyEntityRepo(EntityRepository[DummyEntity]):
     def _connect(self):
@@ -50,6 +83,13 @@ class DummyEntityRepo(EntityRepository[DummyEntity]):
         entity.id = 1  # simulate DB insert assigning ID
         return entity
 
+    def create_many(
+        self,
+        entities: Iterable[DummyEntity],
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+    ) -> List[int]:
+        return [i for i, _ in enumerate(entities, start=1)]
+
     def read(
         self, id: Optional[int] = None, name: Optional[str] = None
     ) -> Optional[DummyEntity]:
@@ -57,6 +97,11 @@ class DummyEntityRepo(EntityRepository[DummyEntity]):
             return DummyEntity(1, "Test")
         return None
 
+    def lookup(
+        self, id: Optional[int] = None, name: Optional[str] = None
+    ) -> Optional[DummyEntity]:
+        return self.read(id=id, name=name)
+
     def update(self, entity: DummyEntity) -> Optional[DummyEntity]:
         return entity if entity.id == 1 else None
 
@@ -66,9 +111,24 @@ class DummyEntityRepo(EntityRepository[DummyEntity]):
     def search(self, name_query: str) -> List[DummyEntity]:
         return [DummyEntity(1, "Test")] if "te" in name_query.lower() else []
 
+    def suggest(
+        self, prefix: str, limit: int = SUGGEST_LIMIT
+    ) -> List[DummyEntity]:
+        return [e for e in self.all() if e.name.startswith(prefix)][:limit]
+
+    def iter_search(
+        self, name_query: str, batch_size: int = DEFAULT_CHUNK_SIZE
+    ) -> Iterator[DummyEntity]:
+        yield from self.search(name_query)
+
     def all(self) -> List[DummyEntity]:
         return [DummyEntity(1, "Test"), DummyEntity(2, "Demo")]
 
+    def iter_all(
+        self, batch_size: int = DEFAULT_CHUNK_SIZE
+    ) -> Iterator[DummyEntity]:
+        yield from self.all()
+
     def transaction_repository(
         self, db_path: Optional[Path] = None
     ) -> DummyTransactionRepo:
@@ -87,6 +147,12 @@ class TestDummyEntityRepo(TestCase):
         created = self.repo.create(entity)
         self.assertEqual(created.id, 1)
 
+    def test_create_many_returns_ids(self):
+        ids = self.repo.create_many(
+            DummyEntity(None, name) for name in ["A", "B"]
+        )
+        self.assertEqual(ids, [1, 2])
+
     def test_read_by_id(self):
         result = self.repo.read(id=1)
         self.assertIsNotNone(result)
@@ -105,10 +171,18 @@ class TestDummyEntityRepo(TestCase):
         results = self.repo.search("TE")
         self.assertEqual(len(results), 1)
 
+    def test_suggest_matches_prefix(self):
+        self.assertEqual([e.name for e in self.repo.suggest("De")], ["Demo"])
+
     def test_all_returns_all_entities(self):
         results = self.repo.all()
         self.assertEqual(len(results), 2)
 
+    def test_iter_all_yields_all_entities(self):
+        self.assertEqual(
+            [e.name for e in self.repo.iter_all()], ["Test", "Demo"]
+        )
+
     def test_transaction_repository_instance(self):
         txn_repo = self.repo.transaction_repository()
         self.assertIsInstance(txn_repo, DummyTransactionRepo)
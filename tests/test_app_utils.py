@@ -0,0 +1,84 @@
+import pytest
+from io import BytesIO
+from flask import Flask
+from openpyxl import load_workbook
+from lib.app.utils import *
+from lib.db.customer import Customer, CustomerRepository
+from lib.db.purchase import Purchase, PurchaseRepository
+from lib.db.sale import Sale, SaleRepository
+from lib.db.supplier import Supplier, SupplierRepository
+from lib.db.utils import get_db_path
+from tests.data_utils import make_purchase, make_sale
+
+
+@pytest.fixture
+def client(app_data):
+    CustomerRepository(get_db_path()).create(Customer(None, "Acme"))
+    SupplierRepository(get_db_path()).create(Supplier(None, "Supplies Ltd"))
+    app = Flask(__name__)
+    app.secret_key = "test"
+    register_transaction_routes(
+        "sales",
+        "sales.html",
+        Sale,
+        SaleRepository,
+        CustomerRepository,
+        "Customer",
+        app,
+    )
+    register_transaction_routes(
+        "purchases",
+        "purchases.html",
+        Purchase,
+        PurchaseRepository,
+        SupplierRepository,
+        "Supplier",
+        app,
+    )
+    return app.test_client()
+
+
+def test_patched_timestamp_is_stored_canonically_and_exports(client):
+    repo = SaleRepository(get_db_path())
+    sale_id = repo.create(make_sale(1, timestamp="2025-01-01")).id
+
+    # The edit form's datetime-local input sends no seconds and a "T"
+    response = client.patch(
+        f"/sales/{sale_id}", data={"timestamp": "2025-01-02T10:00"}
+    )
+    assert response.status_code == 204
+    assert repo.read(id=sale_id).timestamp == "2025-01-02 10:00:00"
+
+    workbook = load_workbook(
+        export_to_xlsx("sales", "2025-01-01", "2025-01-31", BytesIO())
+    )
+    assert workbook.sheetnames == ["Front Sheet", "Jan '25"]
+    assert workbook["Jan '25"]["H2"].value == "02/01/2025"
+
+
+def test_patch_rejects_an_invalid_timestamp(client):
+    repo = SaleRepository(get_db_path())
+    sale_id = repo.create(make_sale(1, timestamp="2025-01-01")).id
+
+    response = client.patch(f"/sales/{sale_id}", data={"timestamp": "soon"})
+    assert response.status_code == 500
+    assert repo.read(id=sale_id).timestamp == "2025-01-01 00:00:00"
+
+
+def test_patch_revalidates_the_purchase_breakdown(client):
+    repo = PurchaseRepository(get_db_path())
+    purchase_id = repo.create(make_purchase(1, goods=100.0)).id
+
+    response = client.patch(
+        f"/purchases/{purchase_id}", data={"net_amount": "120"}
+    )
+    assert response.status_code == 500
+    assert b"does not equal sum of components" in response.data
+    assert repo.read(id=purchase_id).net_amount == 100.0
+
+    response = client.patch(
+        f"/purchases/{purchase_id}",
+        data={"net_amount": "120", "sundries": "20"},
+    )
+    assert response.status_code == 204
+    assert repo.read(id=purchase_id).sundries == 20.0
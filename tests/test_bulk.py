@@ -0,0 +1,121 @@
+import sqlite3
+import pytest
+from lib.db.bulk import *
+from lib.db.customer import Customer, CustomerRepository
+from lib.db.purchase import PurchaseRepository
+from lib.db.sale import SaleRepository
+from tests.data_utils import count, make_purchase, make_sale
+
+
+def test_create_many_sales_from_generator(db_path):
+    repo = SaleRepository(db_path)
+    ids = repo.create_many((make_sale(n) for n in range(25)), chunk_size=10)
+
+    assert ids == list(range(1, 26))
+    assert count(db_path, "sales") == 25
+    assert repo.read(ids[7]).invoice_number == "INV-0007"
+
+
+def test_create_many_keeps_explicit_ids(db_path):
+    repo = SaleRepository(db_path)
+    sales = [make_sale(0), make_sale(1, id=50), make_sale(2), make_sale(3)]
+    ids = repo.create_many(sales, chunk_size=3)
+
+    assert ids[1] == 50
+    for sale, id in zip(sales, ids):
+        assert repo.read(id).invoice_number == sale.invoice_number
+
+
+def test_create_many_purchases(db_path):
+    repo = PurchaseRepository(db_path)
+    ids = repo.create_many(
+        make_purchase(n, capital_spend=n % 2 == 0) for n in range(5)
+    )
+
+    assert len(ids) == 5
+    created = repo.read(ids[2])
+    assert created.internal_invoice_number == "P-0002"
+    assert created.capital_spend is True
+
+
+def test_create_many_customers_searchable(db_path):
+    repo = CustomerRepository(db_path)
+    repo.create_many(Customer(None, name) for name in ["Alpha", "Beta"])
+
+    assert [c.name for c in repo.search("lph")] == ["Alpha"]
+
+
+def test_create_many_rolls_back_whole_batch(db_path):
+    repo = SaleRepository(db_path)
+    sales = [make_sale(n) for n in range(12)]
+    sales.append(make_sale(3))  # duplicate invoice number
+
+    with pytest.raises(BulkCreateError) as exc_info:
+        repo.create_many(sales, chunk_size=5)
+
+    assert exc_info.value.index == 12
+    assert exc_info.value.record is sales[12]
+    assert isinstance(exc_info.value, sqlite3.IntegrityError)
+    assert count(db_path, "sales") == 0
+
+    # The connection is usable again after the rollback
+    assert repo.create_many([make_sale(99)]) == [1]
+
+
+def test_create_many_empty(db_path):
+    assert SaleRepository(db_path).create_many([]) == []
+
+
+def test_iter_rows_fetches_in_batches():
+    conn = sqlite3.connect(":memory:")
+    cursor = conn.execute(
+        "WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n "
+        "WHERE i < 25) SELECT i FROM n"
+    )
+    rows = iter_rows(cursor, batch_size=10)
+
+    assert next(rows) == (1,)
+    # Only the first batch has been fetched from the cursor
+    assert len(cursor.fetchmany(100)) == 15
+    rows.close()
+    conn.close()
+
+
+def test_iter_rows_closes_cursor_when_abandoned():
+    conn = sqlite3.connect(":memory:")
+    cursor = conn.execute("SELECT 1 UNION ALL SELECT 2")
+    rows = iter_rows(cursor, batch_size=1)
+    next(rows)
+    rows.close()
+
+    with pytest.raises(sqlite3.ProgrammingError):
+        cursor.fetchone()
+    conn.close()
+
+
+def test_iter_transactions(db_path):
+    repo = SaleRepository(db_path)
+    repo.create_many(make_sale(n) for n in range(25))
+
+    assert list(repo.iter_all(batch_size=7)) == repo.all()
+    assert list(
+        repo.iter_search({"invoice": "INV-001"}, batch_size=4)
+    ) == repo.search({"invoice": "INV-001"})
+    customer = Customer(1, "Acme")
+    assert list(repo.iter_by_parent(customer, batch_size=10)) == (
+        repo.search_by_parent(customer)
+    )
+
+    purchases = PurchaseRepository(db_path)
+    purchases.create_many(make_purchase(n) for n in range(5))
+    assert list(purchases.iter_all(batch_size=2)) == purchases.all()
+
+
+def test_iter_entities(db_path):
+    repo = CustomerRepository(db_path)
+    repo.create_many(Customer(None, f"Customer {n}") for n in range(12))
+
+    assert list(repo.iter_all(batch_size=5)) == repo.all()
+    assert list(repo.iter_search("customer 1", batch_size=2)) == (
+        repo.search("customer 1")
+    )
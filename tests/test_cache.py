@@ -0,0 +1,174 @@
+import sqlite3
+from pathlib import Path
+from unittest import TestCase
+from lib.db.cache import *
+from lib.db.customer import Customer, CustomerRepository
+from lib.db.migrations import migrate
+from tests.data_utils import create_db
+
+
+class TestQueryCache(TestCase):
+    def setUp(self):
+        self.db_path = Path("/fake/cache.db")
+        self.other_path = Path("/fake/other.db")
+        self.cache = QueryCache(max_entries=2)
+
+    def test_get_missing_returns_default(self):
+        self.assertIsNone(self.cache.get(self.db_path, "key"))
+        self.assertEqual(self.cache.get(self.db_path, "key", []), [])
+
+    def test_set_and_get(self):
+        generation = get_generation(self.db_path)
+        self.cache.set(self.db_path, "key", [1, 2], generation)
+        self.assertEqual(self.cache.get(self.db_path, "key"), [1, 2])
+        self.assertIsNone(self.cache.get(self.other_path, "key"))
+
+    def test_write_invalidates_entries_for_that_database(self):
+        self.cache.set(self.db_path, "key", 1, get_generation(self.db_path))
+        self.cache.set(
+            self.other_path, "key", 2, get_generation(self.other_path)
+        )
+        bump_generation(self.db_path)
+        self.assertIsNone(self.cache.get(self.db_path, "key"))
+        self.assertEqual(self.cache.get(self.other_path, "key"), 2)
+        self.assertEqual(len(self.cache), 1)
+
+    def test_value_computed_before_a_write_is_stale(self):
+        generation = get_generation(self.db_path)
+        bump_generation(self.db_path)
+        self.cache.set(self.db_path, "key", 1, generation)
+        self.assertIsNone(self.cache.get(self.db_path, "key"))
+
+    def test_evicts_least_recently_used(self):
+        generation = get_generation(self.db_path)
+        self.cache.set(self.db_path, "a", 1, generation)
+        self.cache.set(self.db_path, "b", 2, generation)
+        self.cache.get(self.db_path, "a")
+        self.cache.set(self.db_path, "c", 3, generation)
+        self.assertEqual(self.cache.get(self.db_path, "a"), 1)
+        self.assertIsNone(self.cache.get(self.db_path, "b"))
+        self.assertEqual(self.cache.get(self.db_path, "c"), 3)
+
+    def test_get_or_compute_counts_hits_and_misses(self):
+        calls = []
+        compute = lambda: calls.append(1) or len(calls)
+        self.assertEqual(
+            self.cache.get_or_compute(self.db_path, "k", compute), 1
+        )
+        self.assertEqual(
+            self.cache.get_or_compute(self.db_path, "k", compute), 1
+        )
+        bump_generation(self.db_path)
+        self.assertEqual(
+            self.cache.get_or_compute(self.db_path, "k", compute), 2
+        )
+        self.assertEqual(
+            self.cache.stats(),
+            {
+                "hits": 1,
+                "misses": 2,
+                "stale": 1,
+                "evictions": 0,
+                "entries": 1,
+                "max_entries": 2,
+            },
+        )
+
+    def test_clear(self):
+        self.cache.set(self.db_path, "a", 1, get_generation(self.db_path))
+        self.cache.clear()
+        self.assertEqual(len(self.cache), 0)
+
+
+class TestEntityIndex(TestCase):
+    def setUp(self):
+        self.db_path = Path("/fake/entities.db")
+        self.index = EntityIndex()
+        self.loads = 0
+
+    def load(self):
+        self.loads += 1
+        return [(1, "Acme"), (2, "Beta")]
+
+    def test_maps_are_loaded_once(self):
+        maps = self.index.get(self.db_path, "customers", self.load)
+        self.assertEqual(maps.by_name, {"Acme": 1, "Beta": 2})
+        self.assertEqual(maps.by_id, {1: "Acme", 2: "Beta"})
+        self.index.get(self.db_path, "customers", self.load)
+        self.assertEqual(self.loads, 1)
+
+    def test_invalidate_reloads_that_table(self):
+        self.index.get(self.db_path, "customers", self.load)
+        self.index.get(self.db_path, "suppliers", self.load)
+        self.index.invalidate(self.db_path, "customers")
+        self.index.get(self.db_path, "customers", self.load)
+        self.index.get(self.db_path, "suppliers", self.load)
+        self.assertEqual(self.loads, 3)
+
+    def test_load_overlapping_a_write_is_not_stored(self):
+        def load_then_write():
+            self.index.invalidate(self.db_path, "customers")
+            return self.load()
+
+        self.index.get(self.db_path, "customers", load_then_write)
+        self.index.get(self.db_path, "customers", self.load)
+        self.assertEqual(self.loads, 2)
+
+
+def test_bump_generation_increments():
+    db_path = Path("/fake/bump.db")
+    before = get_generation(db_path)
+    assert bump_generation(db_path) == before + 1
+    assert get_generation(db_path) == before + 1
+
+
+def test_cache_key_is_canonical():
+    assert cache_key({"b": [1], "a": {"min": 2}}) == cache_key(
+        {"a": {"min": 2}, "b": [1]}
+    )
+    assert cache_key(None) == cache_key({})
+    assert cache_key({"vat": [0.2]}) != cache_key({"vat": [0.0]})
+    assert cache_key({"vat": [0.2, 0.0]}) == cache_key({"vat": [0.0, 0.2]})
+    assert cache_key({"customer": "", "net": {}, "vat": []}) == cache_key({})
+
+
+def test_data_version_counts_writes(tmp_dir):
+    db_path = create_db(tmp_dir / "versions.db", migrated=False)
+    conn = sqlite3.connect(db_path)
+    assert get_data_version(conn, "sales") is None
+
+    migrate(db_path)
+    assert get_data_version(conn, "sales") == 0
+    conn.execute(
+        "INSERT INTO sales (customer_id, customer_name, invoice_number, net_amount, vat_percent, payment_method, timestamp) VALUES (1, 'A', 'I1', 1.0, 0.2, 'BACS', '2024-01-01 00:00:00')"
+    )
+    conn.execute("UPDATE sales SET net_amount = 2.0")
+    conn.commit()
+    assert get_data_version(conn, "sales") == 2
+    assert get_data_version(conn, "purchases") == 0
+    conn.execute("DELETE FROM sales")
+    conn.commit()
+    assert get_data_version(conn, "sales") == 3
+    assert get_data_version(conn, "customers") is None
+    conn.close()
+
+
+def test_repository_results_follow_data_version(db_path):
+    conn = sqlite3.connect(db_path)
+    repo = CustomerRepository(db_path)
+    repo.create(Customer(None, "Acme"))
+
+    before = cache_stats()["customers"]
+    assert repo.all() == [Customer(1, "Acme")]
+    assert repo.all() == [Customer(1, "Acme")]
+    after = cache_stats()["customers"]
+    assert after["hits"] == before["hits"] + 1
+
+    # A commit which bypasses the repositories changes data_version
+    conn.execute("INSERT INTO customers (name) VALUES ('Beta')")
+    conn.commit()
+    assert [c.name for c in repo.all()] == ["Acme", "Beta"]
+
+    repo.update(Customer(2, "Bolt"))
+    assert [c.name for c in repo.search("bol")] == ["Bolt"]
+    conn.close()
@@ -4,6 +4,8 @@ from unittest.mock import MagicMock, patch
 from unittest import TestCase
 from tests.data_utils import get_test_data
 from lib.db.customer import *
+from lib.db.cache import entity_index
+from lib.db.pool import close_all_connections
 
 DATA_DIR = f"{os.path.dirname(__file__)}/data/db.customer"
 
@@ -55,8 +57,9 @@ class TestCustomerRepository(TestCase):
             self.mock_cursor
         )
 
+        close_all_connections()
         patcher = patch(
-            "lib.db.customer.sqlite3.connect", return_value=self.mock_conn
+            "lib.db.pool.sqlite3.connect", return_value=self.mock_conn
         )
         self.mock_connect = patcher.start()
         self.addCleanup(patcher.stop)
@@ -64,9 +67,13 @@ class TestCustomerRepository(TestCase):
         self.repo = CustomerRepository(db_path=Path("/fake/db/path.db"))
 
     def test_connect(self):
-        with patch("lib.db.customer.sqlite3.connect") as mock_connect:
-            self.repo._connect()
-        mock_connect.assert_called_once_with(self.repo.db_path)
+        with patch("lib.db.pool.sqlite3.connect") as mock_connect:
+            first = self.repo._connect()
+            second = self.repo._connect()
+        mock_connect.assert_called_once_with(
+            self.repo.db_path, check_same_thread=False
+        )
+        self.assertIs(first, second)
 
     def test_create(self):
         customer = Customer(None, "CreateMe")
@@ -83,6 +90,36 @@ class TestCustomerRepository(TestCase):
         )
         assert result == expected
 
+    def test_lookup_loads_names_once(self):
+        entity_index.clear()
+        self.mock_cursor.fetchall.return_value = [(1, "Alice"), (2, "Bob")]
+        self.assertEqual(self.repo.lookup(name="Bob"), Customer(2, "Bob"))
+        self.assertEqual(self.repo.lookup(id=1), Customer(1, "Alice"))
+        self.assertIsNone(self.repo.lookup(name="Carol"))
+        self.mock_cursor.execute.assert_called_once_with(
+            "SELECT id, name FROM customers"
+        )
+        with self.assertRaises(ValueError):
+            self.repo.lookup()
+
+    def test_write_invalidates_lookup(self):
+        entity_index.clear()
+        self.mock_cursor.fetchall.return_value = [(1, "Alice")]
+        self.repo.lookup(name="Alice")
+        self.repo.create(Customer(None, "Bob"))
+        self.mock_cursor.fetchall.return_value = [(1, "Alice"), (2, "Bob")]
+        self.assertEqual(self.repo.lookup(name="Bob"), Customer(2, "Bob"))
+
+    def test_suggest(self):
+        self.mock_cursor.fetchall.return_value = [(2, "Bob"), (3, "bobby")]
+        result = self.repo.suggest("bo%", limit=5)
+        self.mock_cursor.execute.assert_called_once_with(
+            "SELECT id, name FROM customers WHERE name LIKE ? ESCAPE '\\' "
+            "ORDER BY name COLLATE NOCASE LIMIT ?",
+            ("bo\\%%", 5),
+        )
+        self.assertEqual(result, [Customer(2, "Bob"), Customer(3, "bobby")])
+
     def test_read_by_id(self):
         self.mock_cursor.fetchone.return_value = (1, "Alice")
         result = self.repo.read(id=1)
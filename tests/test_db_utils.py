@@ -107,67 +107,6 @@ def test_init_db(params, caplog):
         mock_conn.close.assert_called_once()
 
 
-def test_create_recovery_db():
-    mock_recovery_dir = Path("/tmp/recovery")
-    mock_timestamp = "20240728_123456"
-    mock_schema_sql = "CREATE TABLE dummy (id INTEGER);"
-
-    with (
-        patch(
-            "lib.db.utils.get_recovery_path", return_value=mock_recovery_dir
-        ),
-        patch("lib.db.utils.datetime") as mock_datetime,
-        patch("lib.db.utils.sqlite3.connect") as mock_connect,
-        patch("lib.db.utils.open", mock_open(read_data=mock_schema_sql)),
-    ):
-        mock_conn = MagicMock()
-        mock_connect.return_value = mock_conn
-        mock_datetime.now.return_value.strftime.return_value = mock_timestamp
-
-        result = create_recovery_db()
-
-    expected_path = mock_recovery_dir / f"{mock_timestamp}.db"
-    assert result == expected_path
-    mock_connect.assert_called_once_with(expected_path)
-    mock_conn.executescript.assert_called_once_with(mock_schema_sql)
-
-
-def test_backup_deleted_entity(caplog):
-    from lib.db.utils import backup_deleted_entity
-
-    mock_entity = MagicMock()
-    mock_transaction = MagicMock()
-    mock_recovery_path = Path("/tmp/recovery/test.db")
-
-    mock_repo_instance = MagicMock()
-    mock_txn_repo = MagicMock()
-    mock_repo_class = MagicMock(return_value=mock_repo_instance)
-
-    mock_repo_instance.get_transactions.return_value = [mock_transaction]
-    mock_repo_instance.transaction_repository.return_value = mock_txn_repo
-
-    with (
-        patch(
-            "lib.db.utils.create_recovery_db", return_value=mock_recovery_path
-        ),
-        caplog.at_level(logging.INFO),
-    ):
-        backup_deleted_entity(mock_entity, mock_repo_class)
-
-    mock_repo_class.assert_called_once_with(db_path=mock_recovery_path)
-    mock_repo_instance.create.assert_called_once_with(mock_entity)
-    mock_repo_instance.get_transactions.assert_called_once_with(mock_entity)
-    mock_repo_instance.transaction_repository.assert_called_once_with(
-        db_path=mock_recovery_path
-    )
-    mock_txn_repo.create.assert_called_once_with(mock_transaction)
-
-    assert (
-        "[RECOVERY] Successfully backed up entity and transactions."
-        in caplog.text
-    )
-
-
 @pytest.mark.parametrize(
     ("input_str", "expected"),
     [
@@ -0,0 +1,86 @@
+import os
+from pathlib import Path
+from lib.app.export_cache import *
+from lib.db.sale import SaleRepository
+from lib.db.utils import get_db_path
+from tests.data_utils import make_sale
+
+DB_PATH = Path("/fake/exports.db")
+
+
+def workbook(path, size=10):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(b"x" * size)
+    return path
+
+
+def test_key_depends_on_everything_exported():
+    key = ExportCache.key("sales", "2024-01-01", "2024-12-31", 3, DB_PATH)
+    assert key == ExportCache.key(
+        "Sales", "2024-01-01", "2024-12-31", 3, DB_PATH
+    )
+    assert (
+        len(
+            {
+                key,
+                ExportCache.key(
+                    "sales", "2024-01-01", "2024-12-31", 4, DB_PATH
+                ),
+                ExportCache.key(
+                    "sales",
+                    "2024-01-01",
+                    "2024-12-31",
+                    3,
+                    Path("/fake/other.db"),
+                ),
+                ExportCache.key(
+                    "sales", "2024-02-01", "2024-12-31", 3, DB_PATH
+                ),
+                ExportCache.key(
+                    "purchases", "2024-01-01", "2024-12-31", 3, DB_PATH
+                ),
+            }
+        )
+        == 5
+    )
+
+
+def test_put_moves_the_workbook_into_the_cache(tmp_dir):
+    cache = ExportCache(tmp_dir / "cache")
+    assert cache.get("k") is None
+
+    source = workbook(tmp_dir / "job.xlsx")
+    stored = cache.put("k", source)
+
+    assert not source.exists()
+    assert stored == tmp_dir / "cache" / "k.xlsx"
+    assert cache.get("k") == stored
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_evicts_least_recently_used(tmp_dir):
+    cache = ExportCache(tmp_dir / "cache", max_bytes=25)
+    for n, key in enumerate(["a", "b"]):
+        stored = cache.put(key, workbook(tmp_dir / f"{key}.xlsx"))
+        os.utime(stored, (n, n))
+    # Reading "a" makes "b" the least recently used
+    cache.get("a")
+
+    cache.put("c", workbook(tmp_dir / "c.xlsx"))
+    assert cache.get("b") is None
+    assert cache.get("a") and cache.get("c")
+    assert cache.size() == 20
+
+    # The workbook just stored is kept even if it alone is too large
+    cache.put("d", workbook(tmp_dir / "d.xlsx", size=50))
+    assert cache.get("d")
+    assert cache.size() == 50
+
+
+def test_data_version_changes_with_the_exported_table(app_data):
+    before = export_data_version("sales")
+    assert export_data_version("purchases") == 0
+
+    SaleRepository(get_db_path()).create(make_sale(1))
+    assert export_data_version("sales") == before + 1
+    assert export_data_version("purchases") == 0
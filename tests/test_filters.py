@@ -0,0 +1,131 @@
+import logging
+from lib.db.filters import *
+from lib.db.purchase import PurchaseRepository
+from lib.db.sale import SaleRepository
+
+
+def make_compiler():
+    return FilterCompiler(
+        "sales",
+        substrings={"customer": "customer_name"},
+        ranges={"net": "net_amount"},
+        flags={"paid": "paid"},
+    )
+
+
+def test_compile_empty_filters():
+    compiler = make_compiler()
+
+    assert compiler.compile({}) == ((False,), [])
+    assert compiler.sql("SELECT id FROM sales", (False,)) == (
+        "SELECT id FROM sales WHERE 1=1"
+    )
+
+
+def test_compile_params():
+    shape, params = make_compiler().compile(
+        {
+            "customer": "AcMe",
+            "net": {"min": 1.5, "max": 10},
+            "vat": [0.2, 0.05],
+            "payment": ["Card"],
+            "timeFrom": "2024-01-01",
+            "paid": "False",
+        }
+    )
+
+    assert shape == (
+        False,
+        ("like", "customer_name"),
+        (">=", "net_amount"),
+        ("<=", "net_amount"),
+        ("in", "vat_percent", 2),
+        ("in", "payment_method", 1),
+        (">=", "timestamp"),
+        (">=", "paid"),
+    )
+    assert params == [
+        "%acme%",
+        150,
+        1000,
+        2000,
+        500,
+        "Card",
+        "2024-01-01 00:00:00",
+        0,
+    ]
+
+
+def test_eq_range_ignores_bounds():
+    shape, params = make_compiler().compile(
+        {"net": {"eq": 5, "min": 1, "max": 10}}
+    )
+
+    assert shape == (False, ("=", "net_amount"))
+    assert params == [500]
+
+
+def test_shape_ignores_values():
+    compiler = make_compiler()
+    first, _ = compiler.compile({"customer": "a", "vat": [0.2]})
+    second, _ = compiler.compile({"customer": "b", "vat": [0.05]})
+    longer, _ = compiler.compile({"customer": "b", "vat": [0.05, 0.2]})
+
+    assert first == second
+    assert first != longer
+
+
+def test_sql_uses_shape():
+    compiler = make_compiler()
+    shape, _ = compiler.compile(
+        {"customer": "a", "vat": [0.2, 0.05], "paid": True}
+    )
+
+    assert compiler.sql("SELECT id FROM sales", shape, " LIMIT ?") == (
+        "SELECT id FROM sales WHERE 1=1 AND LOWER(customer_name) LIKE ?"
+        " AND vat_percent IN (?,?) AND paid >= ? LIMIT ?"
+    )
+    fts_shape, _ = compiler.compile({"customer": "a"}, use_fts=True)
+    assert "sales_fts" in compiler.conditions(fts_shape)
+
+
+def test_sql_generated_once_per_shape():
+    compiler = make_compiler()
+    for customer in ("a", "b", "c"):
+        shape, _ = compiler.compile({"customer": customer})
+        query = compiler.sql("SELECT id FROM sales", shape)
+    compiler.sql("SELECT id FROM sales", compiler.compile({})[0])
+
+    info = compiler.sql.cache_info()
+    assert (info.hits, info.misses) == (2, 2)
+    assert query is compiler.sql("SELECT id FROM sales", shape)
+
+
+def test_repository_filters_match_conditions():
+    shape, params = SaleRepository.FILTERS.compile(
+        {"invoice": "INV", "net": {"eq": 2}}
+    )
+    assert SaleRepository.FILTERS.conditions(shape) == (
+        " AND LOWER(invoice_number) LIKE ? AND net_amount = ?"
+    )
+    assert params == ["%inv%", 200]
+
+    shape, params = PurchaseRepository.FILTERS.compile(
+        {"sundries": {"max": 3}, "capital_spend": "True"}
+    )
+    assert PurchaseRepository.FILTERS.conditions(shape) == (
+        " AND sundries <= ? AND capital_spend >= ?"
+    )
+    assert params == [300, 1]
+
+
+def test_compile_logs_only_at_debug(caplog):
+    compiler = make_compiler()
+
+    with caplog.at_level(logging.INFO, logger="lib.db.filters"):
+        compiler.compile({"customer": "a"})
+    assert caplog.records == []
+
+    with caplog.at_level(logging.DEBUG, logger="lib.db.filters"):
+        compiler.compile({"customer": "a"})
+    assert "[FILTERS]" in caplog.text
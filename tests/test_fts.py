@@ -0,0 +1,149 @@
+import sqlite3
+import pytest
+from unittest.mock import patch
+from lib.db.customer import Customer, CustomerRepository
+from lib.db.fts import *
+from lib.db.purchase import Purchase, PurchaseRepository
+from lib.db.sale import Sale, SaleRepository
+from tests.data_utils import create_db
+
+
+def create_fts_db(tmp_dir, fts=True):
+    if fts:
+        return create_db(tmp_dir / "fts.db")
+    with patch.dict(
+        "lib.db.migrations.FEATURES",
+        {"fts5-trigram": lambda conn: False},
+    ):
+        return create_db(tmp_dir / "fts.db")
+
+
+@pytest.fixture(params=[True, False], ids=["fts", "fallback"])
+def db_path(request, tmp_dir):
+    return create_fts_db(tmp_dir, fts=request.param)
+
+
+def test_substring_condition():
+    assert substring_condition("sales", "invoice_number", False) == (
+        "LOWER(invoice_number) LIKE ?"
+    )
+    assert substring_condition("sales", "invoice_number", True) == (
+        "id IN (SELECT rowid FROM sales_fts WHERE invoice_number LIKE ?)"
+    )
+
+
+def test_fts_tables_after_migration(tmp_dir):
+    db_path = create_fts_db(tmp_dir)
+    conn = sqlite3.connect(db_path)
+    assert fts_tables(conn, db_path) == {
+        "customers_fts",
+        "suppliers_fts",
+        "sales_fts",
+        "purchases_fts",
+    }
+    conn.close()
+
+
+def test_fts_migration_skipped_when_unavailable(tmp_dir):
+    db_path = create_fts_db(tmp_dir, fts=False)
+    conn = sqlite3.connect(db_path)
+    assert fts_tables(conn, db_path) == set()
+    assert conn.execute("PRAGMA user_version").fetchone()[0] >= 3
+    conn.close()
+
+
+def test_prefix_pattern_escapes_wildcards():
+    assert prefix_pattern("Ac") == "Ac%"
+    assert prefix_pattern("50%_\\") == "50\\%\\_\\\\%"
+
+
+def test_customer_suggest_matches_prefix(db_path):
+    repo = CustomerRepository(db_path=db_path)
+    repo.create_many(
+        Customer(None, name)
+        for name in ["acme", "Acme Widgets", "Bolt", "ACMF", "Ac_e"]
+    )
+
+    assert [c.name for c in repo.suggest("ac")] == [
+        "Ac_e",
+        "acme",
+        "Acme Widgets",
+        "ACMF",
+    ]
+    assert [c.name for c in repo.suggest("AC_")] == ["Ac_e"]
+    assert [c.name for c in repo.suggest("acm", limit=2)] == [
+        "acme",
+        "Acme Widgets",
+    ]
+    assert repo.suggest("z") == []
+
+    conn = sqlite3.connect(db_path)
+    (plan,) = conn.execute(
+        "EXPLAIN QUERY PLAN SELECT id, name FROM customers "
+        "WHERE name LIKE 'ac%' ESCAPE '\\' ORDER BY name COLLATE NOCASE"
+    ).fetchall()
+    conn.close()
+    assert "idx_customers_name_nocase" in plan[3]
+
+
+def test_customer_search_tracks_writes(db_path):
+    repo = CustomerRepository(db_path=db_path)
+    acme = repo.create(Customer(None, "Acme Widgets"))
+    repo.create(Customer(None, "Bolt Supplies"))
+    assert repo.search("WIDG") == [acme]
+    assert repo.search("me w") == [acme]
+
+    repo.update(Customer(acme.id, "Acme Gadgets"))
+    assert repo.search("widg") == []
+    assert repo.search("gadg") == [Customer(acme.id, "Acme Gadgets")]
+
+    repo.delete(acme.id)
+    assert repo.search("gadg") == []
+
+
+def test_sale_search_substring_filters(db_path):
+    repo = SaleRepository(db_path=db_path)
+    for i, name in enumerate(["Acme Widgets", "Bolt Supplies", "Acme Bolts"]):
+        repo.create(
+            Sale(
+                None,
+                i,
+                name,
+                f"INV-{2023 + i}-00{i}",
+                10.0,
+                0.2,
+                "BACS",
+                "2024-01-01 09:00:00",
+            )
+        )
+    results = repo.search({"customer": "acme", "invoice": "2025"})
+    assert [s.customer_name for s in results] == ["Acme Bolts"]
+    assert repo.count({"customer": "bolt"}) == 2
+    assert repo.count({"customer": "ac"}) == 2
+
+
+def test_purchase_search_substring_filters(db_path):
+    repo = PurchaseRepository(db_path=db_path)
+    for i, code in enumerate(["ABC-100", "XYZ-200"]):
+        repo.create(
+            Purchase(
+                None,
+                1,
+                "Widgets Ltd",
+                code,
+                f"P-{i}",
+                10.0,
+                0.2,
+                10.0,
+                0,
+                0,
+                0,
+                0,
+                "Cash",
+                "2024-01-01 09:00:00",
+                False,
+            )
+        )
+    results = repo.search({"supplier_invoice": "xyz", "supplier": "widgets"})
+    assert [p.internal_invoice_number for p in results] == ["P-1"]
+    assert repo.count({"internal_invoice": "p-"}) == 2
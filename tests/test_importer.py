@@ -0,0 +1,172 @@
+import io
+import sqlite3
+import pytest
+from lib.db.customer import Customer, CustomerRepository
+from lib.db.importer import *
+from lib.db.purchase import PurchaseRepository
+from lib.db.sale import SaleRepository
+from lib.db.supplier import Supplier, SupplierRepository
+
+SALES_HEADER = (
+    "customer_name,invoice_number,net_amount,vat_percent,"
+    "payment_method,timestamp\n"
+)
+PURCHASES_HEADER = (
+    "supplier_name,supplier_invoice_code,internal_invoice_number,"
+    "net_amount,vat_percent,goods,utilities,motor_expenses,sundries,"
+    "miscellaneous,payment_method,timestamp,capital_spend\n"
+)
+
+
+@pytest.fixture
+def db_path(db_path):
+    CustomerRepository(db_path).create(Customer(None, "Acme"))
+    SupplierRepository(db_path).create(Supplier(None, "Supplies Ltd"))
+    return db_path
+
+
+def test_import_sales(db_path):
+    data = SALES_HEADER + "".join(
+        f"Acme,INV-{n:03d},{n}.50,0.2,BACS,2024-03-{n + 1:02d}T09:30\n"
+        for n in range(20)
+    )
+    report = import_csv(io.StringIO(data), "sales", db_path, batch_size=7)
+
+    assert report.rows_read == 20
+    assert report.rows_imported == 20
+    assert report.errors == []
+    sales = SaleRepository(db_path).search({})
+    assert len(sales) == 20
+    assert sales[3].invoice_number == "INV-003"
+    assert sales[3].timestamp == "2024-03-04 09:30:00"
+    assert sales[3].customer_id == 1
+
+
+def test_import_purchases(db_path):
+    data = PURCHASES_HEADER + (
+        "Supplies Ltd,S-1,P-001,30,0.2,10,20,,,,BACS,2024-03-01,yes\n"
+        "Supplies Ltd,S-2,P-002,30,0.2,10,10,,,,BACS,2024-03-02,\n"
+    )
+    report = import_csv(io.StringIO(data), "purchases", db_path)
+
+    assert report.rows_imported == 1
+    assert report.errors == [
+        (
+            3,
+            "Net amount (30.0) does not equal sum of components (20.0).",
+        )
+    ]
+    (purchase,) = PurchaseRepository(db_path).search({})
+    assert purchase.internal_invoice_number == "P-001"
+    assert purchase.capital_spend
+    assert purchase.sundries == 0.0
+
+
+def test_import_reports_bad_rows(db_path):
+    data = SALES_HEADER + (
+        "Acme,INV-1,10,0.2,BACS,2024-03-01\n"
+        "Nobody,INV-2,10,0.2,BACS,2024-03-01\n"
+        "Acme,INV-3,ten,0.2,BACS,2024-03-01\n"
+        "Acme,INV-4,10,0.2,BACS,March\n"
+        "Acme,INV-1,10,0.2,BACS,2024-03-02\n"
+        "Acme,INV-5,10,0.2,BACS,2024-03-02\n"
+    )
+    report = import_csv(io.StringIO(data), "sales", db_path, batch_size=10)
+
+    assert report.rows_read == 6
+    assert report.rows_imported == 2
+    assert report.rows_failed == 4
+    lines = [line for line, _ in report.errors]
+    assert sorted(lines) == [3, 4, 5, 6]
+    messages = dict(report.errors)
+    assert messages[3] == "Unknown customer: 'Nobody'"
+    assert messages[4] == "Invalid net_amount: 'ten'"
+    assert messages[5] == "Unrecognised timestamp: 'March'"
+    assert "UNIQUE" in messages[6]
+    invoices = [s.invoice_number for s in SaleRepository(db_path).search({})]
+    assert invoices == ["INV-1", "INV-5"]
+
+
+def test_import_rejects_non_finite_amounts(db_path):
+    data = SALES_HEADER + (
+        "Acme,INV1,nan,0.2,BACS,2024-03-01\n"
+        "Acme,INV2,10,inf,BACS,2024-03-01\n"
+        "Acme,INV3,10,0.2,BACS,2024-03-01\n"
+    )
+    report = import_csv(io.StringIO(data), "sales", db_path)
+
+    assert report.rows_imported == 1
+    assert report.errors == [
+        (2, "Invalid net_amount: 'nan'"),
+        (3, "Invalid vat_percent: 'inf'"),
+    ]
+    invoices = [s.invoice_number for s in SaleRepository(db_path).search({})]
+    assert invoices == ["INV3"]
+
+
+def test_import_resumes_after_rejected_rows(db_path, monkeypatch):
+    executed = []
+    to_row = SaleRepository._to_row
+
+    def counting_to_row(sale):
+        executed.append(sale.invoice_number)
+        return to_row(sale)
+
+    monkeypatch.setattr(
+        SaleRepository, "_to_row", staticmethod(counting_to_row)
+    )
+    data = SALES_HEADER + "".join(
+        f"Acme,{'DUP' if n % 3 == 0 else f'INV-{n}'},1,0.2,BACS,2024-03-01\n"
+        for n in range(60)
+    )
+    report = import_csv(io.StringIO(data), "sales", db_path, batch_size=60)
+
+    assert report.rows_imported == 41
+    assert [line for line, _ in report.errors] == list(range(5, 62, 3))
+    # A row is executed at most three times: in the failed attempt, while
+    # finding the failure and when inserted, however many rows fail
+    assert len(executed) <= 3 * 60
+
+
+def test_import_caps_error_list(db_path, monkeypatch):
+    monkeypatch.setattr("lib.db.importer.MAX_REPORTED_ERRORS", 2)
+    data = SALES_HEADER + "Nobody,,1,0,BACS,2024-03-01\n" * 5
+    report = import_csv(io.StringIO(data), "sales", db_path)
+
+    assert report.rows_failed == 5
+    assert len(report.errors) == 2
+
+
+def test_import_unknown_type(db_path):
+    with pytest.raises(ValueError):
+        import_csv(io.StringIO(""), "invoices", db_path)
+
+
+def test_import_stops_at_malformed_csv(db_path):
+    data = SALES_HEADER + (
+        "Acme,INV-1,10,0.2,BACS,2024-03-01\n"
+        "Acme,INV-2,10,0.2,BACS,2024-03-02\n"
+        f"Acme,{'x' * 200000},10,0.2,BACS,2024-03-03\n"
+        "Acme,INV-4,10,0.2,BACS,2024-03-04\n"
+    )
+    report = import_csv(io.StringIO(data), "sales", db_path, batch_size=5)
+
+    # The rows before the bad line are kept, and the report says so
+    assert (report.rows_read, report.rows_imported) == (2, 2)
+    assert report.aborted.startswith("Unreadable data after line 3")
+    assert len(SaleRepository(db_path).search({})) == 2
+
+
+def test_import_stops_at_undecodable_bytes(db_path):
+    lines = "".join(
+        f"Acme,INV-{n},10,0.2,BACS,2024-03-01\n" for n in range(1000)
+    )
+    data = (SALES_HEADER + lines).encode() + b"Acme,\xff\xfe,1,0,BACS,\n"
+    stream = io.TextIOWrapper(io.BytesIO(data), encoding="utf-8", newline="")
+    report = import_csv(stream, "sales", db_path)
+
+    # Text is decoded a chunk at a time, so the rows in earlier chunks
+    # have been read and imported by the time the bad bytes are reached
+    assert "can't decode" in report.aborted
+    assert 0 < report.rows_imported == report.rows_read < 1000
+    assert len(SaleRepository(db_path).search({})) == report.rows_imported
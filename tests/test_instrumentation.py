@@ -0,0 +1,146 @@
+import sqlite3
+import pytest
+from unittest.mock import patch
+from lib.db.instrumentation import *
+from lib.db.pool import ConnectionPool, close_all_connections
+from lib.db.sale import Sale, SaleRepository
+from tests.data_utils import create_db
+
+
+@pytest.fixture
+def db_path(tmp_dir):
+    with patch("lib.db.instrumentation._enabled", True):
+        db_path = create_db(tmp_dir / "instrumented.db")
+        reset_stats()
+        yield db_path
+        close_all_connections()
+        reset_stats()
+
+
+def make_sales(db_path, n=5):
+    return SaleRepository(db_path).create_many(
+        Sale(None, 1, "Acme", f"INV-{i}", 1.0 + i, 0.2, "Card", "2024-01-01")
+        for i in range(n)
+    )
+
+
+def stats_for(caller):
+    return [s for s in get_stats()["statements"] if s["caller"] == caller]
+
+
+def test_disabled_by_default(tmp_dir):
+    pool = ConnectionPool()
+    with patch.dict("os.environ", {ENABLED_ENV_VAR: ""}):
+        assert not is_enabled()
+        conn = pool.connect(tmp_dir / "plain.db")
+    assert type(conn) is sqlite3.Connection
+    pool.close_all()
+
+
+def test_env_settings():
+    with patch.dict(
+        "os.environ", {ENABLED_ENV_VAR: "1", SLOW_MS_ENV_VAR: "12.5"}
+    ):
+        assert is_enabled()
+        assert get_slow_ms() == 12.5
+    with patch.dict("os.environ", {SLOW_MS_ENV_VAR: "slow"}):
+        assert get_slow_ms() == DEFAULT_SLOW_MS
+
+
+def test_records_reads_by_repository_method(db_path):
+    make_sales(db_path)
+    sales = SaleRepository(db_path)._search({"net": {"min": 1}})
+
+    (search,) = stats_for("SaleRepository._search")
+    assert len(sales) == 5
+    assert search["calls"] == 1
+    assert search["rows"] == 5
+    assert search["statements"] == 1
+    assert "net_amount >= ?" in search["sql"]
+    assert sum(search["histogram"]) == 1
+    assert len(search["histogram"]) == len(LATENCY_BUCKETS_MS) + 1
+
+
+def test_records_writes_and_trigger_statements(db_path):
+    repo = SaleRepository(db_path)
+    repo.create(Sale(None, 1, "Acme", "INV-1", 1.0, 0.2, "Card", None))
+
+    (insert,) = stats_for("SaleRepository.create")
+    assert insert["rows"] == 1
+    # The monthly totals triggers run alongside the insert
+    assert insert["statements"] > 1
+
+
+def test_streamed_rows_are_counted(db_path):
+    make_sales(db_path, n=7)
+    rows = list(SaleRepository(db_path).iter_all(batch_size=3))
+
+    (iterated,) = stats_for("SaleRepository._iter_query")
+    assert len(rows) == 7
+    assert iterated["rows"] == 7
+    assert iterated["calls"] == 1
+
+
+def test_slow_queries_are_explained(db_path, caplog):
+    make_sales(db_path)
+    with patch("lib.db.instrumentation._slow_ms", 0):
+        SaleRepository(db_path)._search({"invoice": "INV-3"})
+
+    slow = [
+        q
+        for q in get_stats()["slow_queries"]
+        if q["caller"] == "SaleRepository._search"
+    ]
+    assert len(slow) == 1
+    assert "'%inv-3%'" in slow[0]["expanded_sql"]
+    assert slow[0]["plan"]
+    assert slow[0]["rows"] == 1
+    assert "[QUERY] Slow query" in caplog.text
+    assert "LIKE ?" in caplog.text
+    assert "inv-3" not in caplog.text
+
+
+def test_unfinished_cursor_is_recorded_without_plan(db_path):
+    make_sales(db_path)
+    conn = SaleRepository(db_path)._connect()
+    with patch("lib.db.instrumentation._slow_ms", 0), patch(
+        "lib.db.instrumentation.explain"
+    ) as mock_explain:
+        cursor = conn.cursor()
+        cursor.execute("SELECT id FROM sales")
+        cursor.fetchone()
+        del cursor
+
+    mock_explain.assert_not_called()
+    (select,) = [
+        q for q in get_stats()["slow_queries"] if q["sql"].startswith("SELECT")
+    ]
+    assert select["rows"] == 1
+    assert select["plan"] == []
+
+
+def test_fast_queries_are_not_logged(db_path):
+    make_sales(db_path)
+    with patch("lib.db.instrumentation._slow_ms", 60_000):
+        SaleRepository(db_path)._search({})
+    assert get_stats()["slow_queries"] == []
+
+
+def test_histogram_buckets():
+    stats = QueryStats()
+    for elapsed_ms in (0.5, 1, 3, 30, 600):
+        stats.record("caller", "SELECT 1", elapsed_ms, 1, 1)
+
+    (entry,) = stats.statements()
+    assert entry["histogram"] == [2, 1, 0, 1, 0, 1]
+    assert entry["max_ms"] == 600
+    assert entry["mean_ms"] == pytest.approx(634.5 / 5)
+    stats.reset()
+    assert stats.statements() == []
+
+
+def test_slow_log_keeps_most_recent():
+    stats = QueryStats(slow_log_size=2)
+    for n in range(3):
+        stats.record_slow({"sql": n})
+    assert [q["sql"] for q in stats.slow_queries()] == [2, 1]
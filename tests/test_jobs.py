@@ -0,0 +1,180 @@
+import threading
+import time
+import pytest
+from openpyxl import load_workbook
+from lib.app.export_cache import ExportCache
+from lib.app.jobs import *
+from lib.db.sale import SaleRepository
+from lib.db.utils import get_db_path
+from tests.data_utils import make_sale
+
+
+@pytest.fixture
+def manager(app_data):
+    manager = JobManager(
+        max_workers=1, cache=ExportCache(app_data / "export_cache")
+    )
+    yield manager
+    manager.shutdown()
+
+
+@pytest.fixture
+def blocked_export(monkeypatch):
+    """
+    Replaces the export with one which writes part of a file and waits for
+    `release` before reporting progress, and so checking for cancellation.
+    """
+    started, release = threading.Event(), threading.Event()
+
+    def export(transaction_name, start_date, end_date, file, progress):
+        file.write_bytes(b"partial")
+        started.set()
+        release.wait(10)
+        progress(1, 0)
+
+    monkeypatch.setattr("lib.app.jobs.export_to_xlsx", export)
+    yield started, release
+    release.set()
+
+
+def wait(job, timeout=10):
+    deadline = time.time() + timeout
+    while not job.finished:
+        assert time.time() < deadline, f"job still {job.status}"
+        time.sleep(0.01)
+    return job
+
+
+def sheet_rows(path):
+    workbook = load_workbook(path)
+    return {
+        ws.title: [row for row in ws.iter_rows(values_only=True)]
+        for ws in workbook.worksheets
+    }
+
+
+def test_export_writes_a_sheet_per_month(manager):
+    SaleRepository(get_db_path()).create_many(
+        [
+            make_sale(1, 10.0, timestamp="2024-01-05"),
+            make_sale(2, 20.0, timestamp="2024-01-20"),
+            make_sale(3, 30.0, timestamp="2024-02-01"),
+            make_sale(4, 40.0, timestamp="2025-01-01"),
+        ]
+    )
+    job = wait(manager.submit_export("sales", "2024-01-01", "2024-12-31"))
+
+    assert job.status == "done"
+    assert (job.rows_written, job.sheets_done) == (3, 2)
+    sheets = sheet_rows(job.path)
+    assert list(sheets) == ["Front Sheet", "Jan '24", "Feb '24"]
+    assert sheets["Front Sheet"][1][:3] == (
+        "sales",
+        "2024-01-01",
+        "2024-12-31",
+    )
+    january = sheets["Jan '24"]
+    assert january[0][:3] == ("Customer", "Invoice Number", "Net")
+    assert january[1] == (
+        "Acme",
+        "INV-0001",
+        10.0,
+        0.2,
+        "=C2*D2",
+        "=C2+E2",
+        "Card",
+        "05/01/2024",
+    )
+    assert [row[1] for row in january[1:3]] == ["INV-0001", "INV-0002"]
+    assert january[3][:3] == ("TOTAL", None, "=SUM(C2:C3)")
+    assert [row[1] for row in sheets["Feb '24"]] == [
+        "Invoice Number",
+        "INV-0003",
+        None,
+    ]
+
+
+def test_export_is_cached_until_the_table_changes(manager):
+    first = wait(manager.submit_export("sales", "2024-01-01", "2024-12-31"))
+    second = manager.submit_export("sales", "2024-01-01", "2024-12-31")
+
+    # A cached export finishes at once, without a worker
+    assert second.status == "done"
+    assert first.cached and second.cached
+    assert second.path == first.path
+    assert manager.cache.hits == 1
+
+    SaleRepository(get_db_path()).create(make_sale(1, timestamp="2024-06-01"))
+    third = wait(manager.submit_export("sales", "2024-01-01", "2024-12-31"))
+    assert third.path != first.path
+    assert "INV-0001" in str(sheet_rows(third.path)["Jun '24"])
+    # The stale workbook stays cached until evicted, but is never served
+    assert first.path.exists()
+
+
+def test_cancelled_jobs_delete_their_files(manager, blocked_export):
+    started, release = blocked_export
+    running = manager.submit_export("sales", "2024-01-01", "2024-12-31")
+    # With one worker, the second job waits behind the first
+    queued = manager.submit_export("sales", "2024-01-01", "2024-12-31")
+    assert started.wait(10)
+    assert (running.status, queued.status) == ("running", "pending")
+
+    manager.cancel(queued.id)
+    manager.cancel(running.id)
+    release.set()
+
+    for job in (running, queued):
+        assert wait(job).status == "cancelled"
+        assert not job.available
+    assert not running.path.exists()
+    assert not manager.cache.path.exists()
+
+
+def test_failed_job_reports_the_error(manager, monkeypatch):
+    def export(transaction_name, start_date, end_date, file, progress):
+        file.write_bytes(b"partial")
+        raise ValueError("disk full")
+
+    monkeypatch.setattr("lib.app.jobs.export_to_xlsx", export)
+    job = wait(manager.submit_export("sales", "2024-01-01", "2024-12-31"))
+
+    assert job.status == "failed"
+    assert job.to_dict()["error"] == "disk full"
+    assert not job.path.exists()
+    assert not job.cached
+
+
+def test_finished_jobs_are_pruned(manager, monkeypatch):
+    monkeypatch.setattr("lib.app.jobs.MAX_FINISHED_JOBS", 1)
+    first = wait(manager.submit_export("sales", "2024-01-01", "2024-06-30"))
+    second = wait(manager.submit_export("sales", "2024-07-01", "2024-12-31"))
+    manager.submit_export("sales", "2024-01-01", "2024-01-31")
+
+    assert manager.get(first.id) is None
+    assert manager.get(second.id) is second
+    # Pruning a cached job leaves its workbook to the cache
+    assert first.path.exists()
+
+
+def test_shutdown_cancels_running_jobs(manager, blocked_export):
+    started, release = blocked_export
+    job = manager.submit_export("sales", "2024-01-01", "2024-12-31")
+    assert started.wait(10)
+
+    threading.Timer(0.1, release.set).start()
+    manager.shutdown()
+
+    assert job.status == "cancelled"
+    assert not job.path.exists()
+    assert manager.get(job.id) is None
+
+
+def test_submit_after_shutdown_is_rejected(manager):
+    job = wait(manager.submit_export("sales", "2024-01-01", "2024-12-31"))
+    assert job.status == "done"
+    manager.shutdown()
+
+    assert manager.get(job.id) is None
+    with pytest.raises(RuntimeError):
+        manager.submit_export("sales", "2024-01-01", "2024-12-31")
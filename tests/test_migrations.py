@@ -0,0 +1,221 @@
+import sqlite3
+import pytest
+from unittest.mock import patch
+from lib.db.migrations import *
+from tests.data_utils import create_db
+
+
+@pytest.fixture
+def db_path(tmp_dir):
+    return create_db(tmp_dir / "migrate.db", migrated=False)
+
+
+@pytest.fixture
+def migrations_dir(tmp_dir):
+    migrations_dir = tmp_dir / "migrations"
+    migrations_dir.mkdir()
+    return migrations_dir
+
+
+def get_indexes(path):
+    conn = sqlite3.connect(path)
+    rows = conn.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'index' AND name LIKE 'idx_%'"
+    ).fetchall()
+    conn.close()
+    return {row[0] for row in rows}
+
+
+def get_version(path):
+    conn = sqlite3.connect(path)
+    version = get_schema_version(conn)
+    conn.close()
+    return version
+
+
+def test_discover_migrations_is_ordered():
+    migrations = discover_migrations()
+    versions = [m.version for m in migrations]
+    assert versions == sorted(versions)
+    assert versions[:2] == [1, 2]
+
+
+def test_discover_migrations_ignores_unrecognised_files(migrations_dir):
+    (migrations_dir / "0002_second.sql").write_text("SELECT 1;")
+    (migrations_dir / "0001_first.sql").write_text("SELECT 1;")
+    (migrations_dir / "notes.sql").write_text("SELECT 1;")
+    migrations = discover_migrations(migrations_dir)
+    assert [(m.version, m.name) for m in migrations] == [
+        (1, "first"),
+        (2, "second"),
+    ]
+
+
+def test_discover_migrations_rejects_duplicate_versions(migrations_dir):
+    (migrations_dir / "0001_first.sql").write_text("SELECT 1;")
+    (migrations_dir / "0001_again.sql").write_text("SELECT 1;")
+    with pytest.raises(ValueError):
+        discover_migrations(migrations_dir)
+
+
+def test_statements_keep_trigger_bodies(migrations_dir):
+    path = migrations_dir / "0001_trigger.sql"
+    path.write_text(
+        "-- comment\n"
+        "CREATE TABLE t (x);\n"
+        "CREATE TRIGGER tr AFTER INSERT ON t BEGIN\n"
+        "    UPDATE t SET x = 1;\n"
+        "    UPDATE t SET x = 2;\n"
+        "END;\n"
+    )
+    statements = Migration(1, "trigger", path).statements()
+    assert len(statements) == 2
+    assert statements[1].startswith("CREATE TRIGGER")
+    assert statements[1].endswith("END;")
+
+
+def test_migrate_adds_indexes(db_path):
+    results = migrate(db_path)
+    assert [r[0] for r in results] == [
+        m.version for m in discover_migrations()
+    ]
+    assert get_version(db_path) == discover_migrations()[-1].version
+    assert {
+        "idx_sales_timestamp",
+        "idx_sales_customer_id",
+        "idx_purchases_timestamp",
+        "idx_purchases_supplier_id",
+        "idx_customers_name_nocase",
+        "idx_suppliers_name_nocase",
+    } <= get_indexes(db_path)
+
+
+def test_migrate_is_idempotent(db_path):
+    migrate(db_path)
+    assert migrate(db_path) == []
+
+
+def test_migrate_dry_run_rolls_back(db_path):
+    results = migrate(db_path, dry_run=True)
+    assert results
+    assert all(elapsed >= 0 for _, _, elapsed in results)
+    assert get_version(db_path) == 0
+    assert get_indexes(db_path) == set()
+
+
+def test_failed_migration_rolls_back_only_itself(db_path, migrations_dir):
+    (migrations_dir / "0001_good.sql").write_text(
+        "CREATE INDEX idx_good ON sales(timestamp);"
+    )
+    (migrations_dir / "0002_bad.sql").write_text(
+        "CREATE INDEX idx_bad ON sales(timestamp);\n"
+        "CREATE INDEX idx_broken ON no_such_table(x);\n"
+    )
+    with pytest.raises(sqlite3.OperationalError):
+        migrate(db_path, migrations_path=migrations_dir)
+    assert get_version(db_path) == 1
+    assert get_indexes(db_path) == {"idx_good"}
+
+
+def test_main_dry_run_prints_timings(db_path, capsys):
+    main(["--dry-run", "--db", str(db_path)])
+    out = capsys.readouterr().out
+    assert "0001_index_sales:" in out
+    assert "Dry run: all changes rolled back." in out
+    assert get_version(db_path) == 0
+
+
+def test_requires_directive(migrations_dir):
+    path = migrations_dir / "0001_optional.sql"
+    path.write_text("-- requires: fts5-trigram\n-- note\nSELECT 1;\n")
+    assert Migration(1, "optional", path).requires() == ["fts5-trigram"]
+
+
+def test_requires_unknown_feature(migrations_dir):
+    path = migrations_dir / "0001_optional.sql"
+    path.write_text("-- requires: time-travel\nSELECT 1;\n")
+    with pytest.raises(ValueError):
+        Migration(1, "optional", path).requires()
+
+
+def test_migration_skipped_when_feature_missing(db_path, migrations_dir):
+    (migrations_dir / "0001_optional.sql").write_text(
+        "-- requires: fts5-trigram\nCREATE INDEX idx_skipped ON sales(timestamp);\n"
+    )
+    (migrations_dir / "0002_next.sql").write_text(
+        "CREATE INDEX idx_next ON sales(timestamp);"
+    )
+    with patch.dict(FEATURES, {"fts5-trigram": lambda conn: False}):
+        migrate(db_path, migrations_path=migrations_dir)
+    assert get_version(db_path) == 2
+    assert get_indexes(db_path) == {"idx_next"}
+
+
+def test_skipped_migration_applied_once_feature_available(
+    db_path, migrations_dir
+):
+    (migrations_dir / "0001_optional.sql").write_text(
+        "-- requires: fts5-trigram\nCREATE INDEX idx_skipped ON sales(timestamp);\n"
+    )
+    (migrations_dir / "0002_next.sql").write_text(
+        "CREATE INDEX idx_next ON sales(timestamp);"
+    )
+    with patch.dict(FEATURES, {"fts5-trigram": lambda conn: False}):
+        migrate(db_path, migrations_path=migrations_dir)
+        assert migrate(db_path, migrations_path=migrations_dir) == []
+
+    with patch.dict(FEATURES, {"fts5-trigram": lambda conn: True}):
+        results = migrate(db_path, migrations_path=migrations_dir)
+        assert [version for version, _, _ in results] == [1]
+        assert migrate(db_path, migrations_path=migrations_dir) == []
+    assert get_version(db_path) == 2
+    assert get_indexes(db_path) == {"idx_next", "idx_skipped"}
+
+
+def test_migrate_stores_money_as_integers(db_path):
+    conn = sqlite3.connect(db_path)
+    conn.execute(
+        "INSERT INTO sales (customer_id, customer_name, invoice_number, net_amount, vat_percent, payment_method, timestamp) VALUES (1, 'A', 'I1', 10.1, 0.2, 'BACS', '2024-01-01 00:00:00')"
+    )
+    conn.execute(
+        "INSERT INTO purchases (supplier_id, supplier_name, supplier_invoice_code, internal_invoice_number, net_amount, vat_percent, goods, utilities, motor_expenses, sundries, miscellaneous, payment_method, timestamp, capital_spend) VALUES (1, 'S', 'SI1', 'P1', 0.3, 0.05, 0.1, 0.2, 0, 0, 0, 'BACS', '2024-01-01 00:00:00', 1)"
+    )
+    conn.commit()
+    conn.close()
+
+    migrate(db_path)
+
+    conn = sqlite3.connect(db_path)
+    assert conn.execute(
+        "SELECT net_amount, vat_percent, typeof(net_amount) FROM sales"
+    ).fetchone() == (1010, 2000, "integer")
+    assert conn.execute(
+        "SELECT net_amount, vat_percent, goods, utilities, motor_expenses FROM purchases"
+    ).fetchone() == (30, 500, 10, 20, 0)
+    columns = {
+        row[1]: row[2]
+        for row in conn.execute("PRAGMA table_info(purchases)").fetchall()
+    }
+    assert columns["net_amount"] == "INTEGER"
+    assert columns["miscellaneous"] == "INTEGER"
+    conn.close()
+
+
+def test_migrate_canonicalises_timestamps(db_path):
+    conn = sqlite3.connect(db_path)
+    for n, timestamp in enumerate(["2025-01-02T10:00", "2025-01-03 09:30:00"]):
+        conn.execute(
+            "INSERT INTO sales (customer_id, customer_name, invoice_number, net_amount, vat_percent, payment_method, timestamp) VALUES (1, 'A', ?, 1.0, 0.2, 'BACS', ?)",
+            (f"I{n}", timestamp),
+        )
+    conn.commit()
+    conn.close()
+
+    migrate(db_path)
+
+    conn = sqlite3.connect(db_path)
+    assert [
+        row[0]
+        for row in conn.execute("SELECT timestamp FROM sales ORDER BY id")
+    ] == ["2025-01-02 10:00:00", "2025-01-03 09:30:00"]
+    conn.close()
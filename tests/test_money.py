@@ -0,0 +1,43 @@
+import pytest
+from lib.db.money import *
+
+
+@pytest.mark.parametrize(
+    "pounds, pence",
+    [
+        (0, 0),
+        (12.34, 1234),
+        (0.1 + 0.2, 30),
+        (1.005, 101),
+        (-2.5, -250),
+        ("19.99", 1999),
+        (None, None),
+    ],
+)
+def test_to_pence(pounds, pence):
+    assert to_pence(pounds) == pence
+
+
+@pytest.mark.parametrize(
+    "rate, basis_points",
+    [(0.2, 2000), (0.05, 500), (0.175, 1750), (0, 0), (None, None)],
+)
+def test_basis_points_round_trip(rate, basis_points):
+    assert to_basis_points(rate) == basis_points
+    assert from_basis_points(basis_points) == rate
+
+
+def test_from_pence_round_trips_two_decimal_places():
+    for pence in range(-1000, 100000, 7):
+        assert to_pence(from_pence(pence)) == pence
+    assert from_pence(None) is None
+
+
+def test_sum_in_pence_is_exact():
+    total = 0.0
+    total_pence = 0
+    for _ in range(1000):
+        total += 0.1
+        total_pence += to_pence(0.1)
+    assert total != 100.0
+    assert from_pence(total_pence) == 100.0
@@ -0,0 +1,142 @@
+import sqlite3
+import pytest
+from lib.db.migrations import migrate
+from lib.db.monthly_totals import *
+from lib.db.purchase import PurchaseRepository
+from lib.db.reports import summarize
+from lib.db.sale import SaleRepository
+from tests.data_utils import create_db, make_purchase, make_sale
+
+
+def stored(db_path):
+    conn = sqlite3.connect(db_path)
+    rows = conn.execute(
+        "SELECT kind, year, month, payment_method, count, net, vat, goods, sundries "
+        "FROM monthly_totals ORDER BY kind, year, month, payment_method"
+    ).fetchall()
+    conn.close()
+    return rows
+
+
+def test_triggers_follow_inserts_updates_and_deletes(db_path):
+    repo = SaleRepository(db_path)
+    first, second, third = repo.create_many(
+        [
+            make_sale(1, 10.0, payment_method="Card", timestamp="2024-01-05"),
+            make_sale(2, 5.55, payment_method="Card", timestamp="2024-01-20"),
+            make_sale(3, 1.0, payment_method="Cash", timestamp="2024-02-01"),
+        ]
+    )
+    assert stored(db_path) == [
+        ("sales", 2024, 1, "Card", 2, 1555, 311, 0, 0),
+        ("sales", 2024, 2, "Cash", 1, 100, 20, 0, 0),
+    ]
+
+    moved = repo.read(second)
+    moved.timestamp = "2024-02-10 00:00:00"
+    moved.payment_method = "Cash"
+    repo.update(moved)
+    assert stored(db_path) == [
+        ("sales", 2024, 1, "Card", 1, 1000, 200, 0, 0),
+        ("sales", 2024, 2, "Cash", 2, 655, 131, 0, 0),
+    ]
+
+    repo.delete(first)
+    assert stored(db_path) == [("sales", 2024, 2, "Cash", 2, 655, 131, 0, 0)]
+    assert check(db_path) == []
+
+
+def test_purchase_categories_are_totalled(db_path):
+    repo = PurchaseRepository(db_path)
+    ids = repo.create_many(
+        [
+            make_purchase(1, 10.0, 2.5, "2024-03-01", vat_percent=0.05),
+            make_purchase(2, 5.0, 0.0, "2024-03-20", vat_percent=0.05),
+        ]
+    )
+    assert stored(db_path) == [
+        ("purchases", 2024, 3, "Bank Transfer", 2, 1750, 88, 1500, 250),
+    ]
+
+    repo.delete(ids[0])
+    repo.delete(ids[1])
+    assert stored(db_path) == []
+
+
+def test_migration_fills_totals_for_existing_rows(tmp_dir):
+    db_path = create_db(tmp_dir / "existing.db", migrated=False)
+    conn = sqlite3.connect(db_path)
+    conn.execute(
+        "INSERT INTO sales (customer_id, customer_name, invoice_number, net_amount, vat_percent, payment_method, timestamp) VALUES (1, 'A', 'I1', 12.34, 0.2, 'BACS', '2023-11-30 10:00:00')"
+    )
+    conn.commit()
+    conn.close()
+
+    migrate(db_path)
+
+    assert stored(db_path) == [("sales", 2023, 11, "BACS", 1, 1234, 247, 0, 0)]
+    assert check(db_path) == []
+
+
+def test_check_reports_drift_and_rebuild_repairs_it(db_path):
+    SaleRepository(db_path).create_many(
+        [
+            make_sale(1, 10.0, payment_method="Card", timestamp="2024-01-05"),
+            make_sale(2, 20.0, payment_method="Cash", timestamp="2024-02-05"),
+        ]
+    )
+    conn = sqlite3.connect(db_path)
+    conn.execute("UPDATE monthly_totals SET net = net + 1 WHERE month = 1")
+    conn.execute("DELETE FROM monthly_totals WHERE month = 2")
+    conn.commit()
+    conn.close()
+
+    mismatches = check(db_path)
+    assert [(m[0], m[3]) for m in mismatches] == [
+        ("expected", 1),
+        ("stored", 1),
+        ("expected", 2),
+    ]
+
+    assert rebuild(db_path) == 2
+    assert check(db_path) == []
+
+
+def test_reports_agree_with_transactions(db_path):
+    SaleRepository(db_path).create_many(
+        make_sale(
+            n,
+            0.01 * n + 1,
+            payment_method="Card",
+            timestamp=f"2024-{n % 12 + 1:02d}-15",
+        )
+        for n in range(60)
+    )
+
+    from_totals = summarize("sales", "quarter", db_path=db_path)
+    # A range which does not cover whole months is read from the sales
+    from_sales = summarize(
+        "sales", "quarter", "2024-01-01", "2024-12-30", db_path=db_path
+    )
+
+    assert from_totals == from_sales
+    assert sum(s.count for s in from_totals) == 60
+
+
+def test_main_check_exit_code(db_path, capsys):
+    main(["--check", "--db", str(db_path)])
+    assert "consistent" in capsys.readouterr().out
+
+    conn = sqlite3.connect(db_path)
+    conn.execute(
+        "INSERT INTO monthly_totals (kind, year, month, vat_percent, payment_method, count) "
+        "VALUES ('sales', 2020, 1, 0, '', 1)"
+    )
+    conn.commit()
+    conn.close()
+    with pytest.raises(SystemExit) as exc_info:
+        main(["--check", "--db", str(db_path)])
+    assert exc_info.value.code == 1
+
+    main(["--db", str(db_path)])
+    assert check(db_path) == []
@@ -0,0 +1,101 @@
+import pytest
+from lib.db.pagination import *
+from lib.db.sale import Sale, SaleRepository
+from tests.data_utils import create_db
+
+
+@pytest.fixture
+def sale_repo(tmp_dir):
+    db_path = create_db(tmp_dir / "paginate.db", migrated=False)
+    repo = SaleRepository(db_path=db_path)
+    # Two sales share a timestamp, so ordering must fall back to id
+    for i in range(1, 8):
+        repo.create(
+            Sale(
+                None,
+                1,
+                "Customer",
+                f"INV-{i:03d}",
+                10.0 * i,
+                0.2,
+                "BACS" if i % 2 else "Cash",
+                f"2024-01-{min(i, 6):02d} 09:00:00",
+            )
+        )
+    return repo
+
+
+def invoices(items):
+    return [item.invoice_number for item in items]
+
+
+def test_cursor_round_trip():
+    cursor = Cursor("2024-01-01 09:00:00", 5, "next", 2)
+    assert decode_cursor(encode_cursor(cursor)) == cursor
+
+
+@pytest.mark.parametrize(
+    "token",
+    [
+        None,
+        "",
+        "not-base64!",
+        "bm90IGpzb24=",
+        encode_cursor(("a", 1, "up", 2)),
+    ],
+)
+def test_decode_invalid_cursor(token):
+    assert decode_cursor(token) is None
+
+
+def test_keyset_clause():
+    assert keyset_clause(None) == ("", [], " ORDER BY timestamp, id")
+    condition, params, order = keyset_clause(Cursor("ts", 3, "next", 2))
+    assert condition == " AND (timestamp, id) > (?, ?)"
+    assert params == ["ts", 3]
+    assert order == " ORDER BY timestamp, id"
+    condition, params, order = keyset_clause(Cursor("ts", 3, "prev", 1))
+    assert condition == " AND (timestamp, id) < (?, ?)"
+    assert order == " ORDER BY timestamp DESC, id DESC"
+
+
+def test_fetch_page_walks_forwards_and_backwards(sale_repo):
+    first = fetch_page(sale_repo, {}, per_page=3)
+    assert invoices(first.items) == ["INV-001", "INV-002", "INV-003"]
+    assert (first.page, first.total) == (1, 7)
+    assert first.prev_cursor is None
+
+    second = fetch_page(sale_repo, {}, per_page=3, token=first.next_cursor)
+    assert invoices(second.items) == ["INV-004", "INV-005", "INV-006"]
+    assert second.page == 2
+
+    third = fetch_page(sale_repo, {}, per_page=3, token=second.next_cursor)
+    assert invoices(third.items) == ["INV-007"]
+    assert third.page == 3
+    assert third.next_cursor is None
+
+    back = fetch_page(sale_repo, {}, per_page=3, token=third.prev_cursor)
+    assert invoices(back.items) == invoices(second.items)
+    assert back.page == 2
+    assert back.next_cursor and back.prev_cursor
+
+    start = fetch_page(sale_repo, {}, per_page=3, token=back.prev_cursor)
+    assert invoices(start.items) == invoices(first.items)
+    assert start.page == 1
+    assert start.prev_cursor is None
+
+
+def test_fetch_page_applies_filters(sale_repo):
+    page = fetch_page(sale_repo, {"payment": ["Cash"]}, per_page=2)
+    assert invoices(page.items) == ["INV-002", "INV-004"]
+    assert page.total == 3
+    following = fetch_page(
+        sale_repo, {"payment": ["Cash"]}, per_page=2, token=page.next_cursor
+    )
+    assert invoices(following.items) == ["INV-006"]
+    assert following.next_cursor is None
+
+
+def test_fetch_page_empty(sale_repo):
+    page = fetch_page(sale_repo, {"invoice": "missing"}, per_page=3)
+    assert page == Page([], 0, 1, None, None)
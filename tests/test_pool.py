@@ -0,0 +1,122 @@
+import sqlite3
+import tempfile
+import threading
+from pathlib import Path
+from unittest import TestCase
+from unittest.mock import patch
+from lib.db.pool import *
+
+
+class TestConnectionPool(TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp_dir.cleanup)
+        self.db_path = Path(self.tmp_dir.name) / "pool.db"
+        self.pool = ConnectionPool(max_size=2)
+        self.addCleanup(self.pool.close_all)
+
+    def test_reuses_connection_within_thread(self):
+        first = self.pool.connect(self.db_path)
+        second = self.pool.connect(self.db_path)
+        self.assertIs(first, second)
+        self.assertEqual(self.pool.size(), 1)
+
+    def test_separate_connections_per_db_path(self):
+        other_path = Path(self.tmp_dir.name) / "other.db"
+        first = self.pool.connect(self.db_path)
+        second = self.pool.connect(other_path)
+        self.assertIsNot(first, second)
+        self.assertEqual(self.pool.size(), 2)
+
+    def test_separate_connections_per_thread(self):
+        main_conn = self.pool.connect(self.db_path)
+        results = []
+
+        def worker():
+            results.append(self.pool.connect(self.db_path))
+
+        thread = threading.Thread(target=worker)
+        thread.start()
+        thread.join()
+
+        self.assertEqual(len(results), 1)
+        self.assertIsNot(results[0], main_conn)
+
+    def test_unhealthy_connection_is_replaced(self):
+        first = self.pool.connect(self.db_path)
+        first.close()
+        second = self.pool.connect(self.db_path)
+        self.assertIsNot(first, second)
+        self.assertEqual(second.execute("SELECT 1").fetchone(), (1,))
+        self.assertEqual(self.pool.size(), 1)
+
+    def test_dead_thread_connections_are_reaped_when_full(self):
+        def worker():
+            self.pool.connect(self.db_path)
+
+        for _ in range(2):
+            thread = threading.Thread(target=worker)
+            thread.start()
+            thread.join()
+        self.assertEqual(self.pool.size(), 2)
+
+        self.pool.connect(self.db_path)
+        self.assertEqual(self.pool.size(), 1)
+
+    def test_full_pool_hands_out_unpooled_connection(self):
+        release = threading.Event()
+        ready = threading.Barrier(3)
+
+        def worker():
+            self.pool.connect(self.db_path)
+            ready.wait()
+            release.wait()
+
+        threads = [threading.Thread(target=worker) for _ in range(2)]
+        for thread in threads:
+            thread.start()
+        ready.wait()
+
+        conn = self.pool.connect(self.db_path)
+        self.assertEqual(conn.execute("SELECT 1").fetchone(), (1,))
+        self.assertEqual(self.pool.size(), 2)
+
+        release.set()
+        for thread in threads:
+            thread.join()
+
+    def test_release(self):
+        conn = self.pool.connect(self.db_path)
+        self.pool.release(self.db_path)
+        self.assertEqual(self.pool.size(), 0)
+        with self.assertRaises(sqlite3.ProgrammingError):
+            conn.execute("SELECT 1")
+
+    def test_close_all(self):
+        conn = self.pool.connect(self.db_path)
+        self.pool.close_all()
+        self.assertEqual(self.pool.size(), 0)
+        with self.assertRaises(sqlite3.ProgrammingError):
+            conn.execute("SELECT 1")
+        self.assertIsNot(self.pool.connect(self.db_path), conn)
+
+
+def test_configure_pool_replaces_shared_pool():
+    old_pool = get_pool()
+    with patch.object(old_pool, "close_all") as mock_close_all:
+        configure_pool(max_size=4, health_check=False)
+    mock_close_all.assert_called_once()
+    assert get_pool() is not old_pool
+    assert get_pool().max_size == 4
+    assert get_pool().health_check is False
+    configure_pool()
+
+
+def test_pooled_connections_use_active_profile():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        pool = ConnectionPool()
+        with patch("lib.db.profiles._active_profile", "fast-read"):
+            conn = pool.connect(Path(tmp_dir) / "profiled.db")
+        assert conn.execute("PRAGMA journal_mode").fetchone() == ("wal",)
+        assert conn.execute("PRAGMA mmap_size").fetchone() == (268435456,)
+        pool.close_all()
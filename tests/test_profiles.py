@@ -0,0 +1,86 @@
+import sqlite3
+import tempfile
+import pytest
+from pathlib import Path
+from unittest.mock import patch
+from lib.db.profiles import *
+
+
+@pytest.fixture
+def db_conn():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        conn = sqlite3.connect(Path(tmp_dir) / "profile.db")
+        yield conn
+        conn.close()
+
+
+@pytest.fixture(autouse=True)
+def reset_profile():
+    with patch("lib.db.profiles._active_profile", None):
+        yield
+
+
+@pytest.mark.parametrize(
+    ("name", "expected"),
+    [
+        (
+            "safe",
+            {
+                "journal_mode": "delete",
+                "synchronous": 2,
+                "mmap_size": 0,
+                "busy_timeout": 10000,
+            },
+        ),
+        (
+            "balanced",
+            {
+                "journal_mode": "wal",
+                "synchronous": 1,
+                "temp_store": 2,
+                "cache_size": -16000,
+            },
+        ),
+        (
+            "fast-read",
+            {
+                "journal_mode": "wal",
+                "cache_size": -65536,
+                "mmap_size": 268435456,
+            },
+        ),
+    ],
+)
+def test_apply_profile(db_conn, name, expected):
+    apply_profile(db_conn, name)
+    report = report_profile(db_conn)
+    assert set(report) == set(PROFILES[DEFAULT_PROFILE])
+    for pragma, value in expected.items():
+        assert report[pragma] == value
+
+
+def test_get_profile_name_defaults_to_balanced(monkeypatch):
+    monkeypatch.delenv(PROFILE_ENV_VAR, raising=False)
+    assert get_profile_name() == DEFAULT_PROFILE
+
+
+def test_get_profile_name_from_environment(monkeypatch):
+    monkeypatch.setenv(PROFILE_ENV_VAR, "fast-read")
+    assert get_profile_name() == "fast-read"
+
+
+def test_get_profile_name_unknown_environment_value(monkeypatch, caplog):
+    monkeypatch.setenv(PROFILE_ENV_VAR, "turbo")
+    assert get_profile_name() == DEFAULT_PROFILE
+    assert "Unknown performance profile 'turbo'" in caplog.text
+
+
+def test_set_profile_overrides_environment(monkeypatch):
+    monkeypatch.setenv(PROFILE_ENV_VAR, "fast-read")
+    set_profile("safe")
+    assert get_profile_name() == "safe"
+
+
+def test_set_profile_rejects_unknown_name():
+    with pytest.raises(ValueError):
+        set_profile("turbo")
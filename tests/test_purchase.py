@@ -5,10 +5,31 @@ from unittest.mock import MagicMock, patch
 from unittest import TestCase
 from tests.data_utils import get_test_data
 from lib.db.purchase import *
+from lib.db.purchase import _facet_cache
+from lib.db.money import to_basis_points, to_pence
+from lib.db.pool import close_all_connections
 
 
 DATA_DIR = f"{os.path.dirname(__file__)}/data/db.purchase"
 
+MONEY_COLUMNS = [
+    "net_amount",
+    "goods",
+    "utilities",
+    "motor_expenses",
+    "sundries",
+    "miscellaneous",
+]
+
+
+def stored(params: dict) -> dict:
+    """The values stored for a purchase: money in pence and VAT in basis points."""
+    return {
+        **params,
+        **{column: to_pence(params[column]) for column in MONEY_COLUMNS},
+        "vat_percent": to_basis_points(params["vat_percent"]),
+    }
+
 
 class TestPurchase(TestCase):
     def test_init_eq_repr(self):
@@ -31,26 +52,84 @@ class TestPurchase(TestCase):
                 )
 
 
+    def test_cost_breakdown_compared_in_pence(self):
+        params = {
+            "id": None,
+            "supplier_id": 1,
+            "supplier_name": "Supplier",
+            "supplier_invoice_code": "SUPINV",
+            "internal_invoice_number": "PUR",
+            "net_amount": 0.3,
+            "vat_percent": 0.2,
+            "goods": 0.1,
+            "utilities": 0.2,
+            "motor_expenses": 0.0,
+            "sundries": 0.0,
+            "miscellaneous": 0.0,
+            "payment_method": "BACS",
+            "timestamp": "2024-01-01 00:00:00",
+            "capital_spend": False,
+        }
+        # 0.1 + 0.2 != 0.3 in floating point, but is exact in pence
+        self.assertEqual(Purchase(**params).net_amount, 0.3)
+        with self.assertRaises(ValueError):
+            Purchase(**{**params, "net_amount": 0.31})
+
+    def test_from_row(self):
+        test_cases = get_test_data(f"{DATA_DIR}/Purchase.txt")
+        for params in test_cases:
+            with self.subTest(params=params):
+                purchase = Purchase.from_row(tuple(stored(params).values()))
+                self.assertEqual(purchase, Purchase(**params))
+                self.assertFalse(hasattr(purchase, "__dict__"))
+
+    def test_from_row_trusts_stored_values(self):
+        # Stored rows were validated on write, so from_row does not recheck
+        row = (1, 1, "S", "SUP", "PUR", 500, 2000, 100, 0, 0, 0, 0, "BACS")
+        purchase = Purchase.from_row((*row, "2024-01-01 00:00:00", 1))
+        self.assertEqual(purchase.net_amount, 5.0)
+        self.assertEqual(purchase.goods, 1.0)
+        self.assertIs(purchase.capital_spend, True)
+
+
 class TestPurchaseRepository(TestCase):
     def setUp(self):
         self.mock_cursor = MagicMock()
+        # Like sqlite3, the fetched rows go through the cursor's row_factory
+        self.mock_cursor.row_factory = None
+        self.mock_cursor.fetchone.side_effect = lambda: self.hydrate(
+            self.mock_cursor.fetchone.return_value
+        )
+        self.mock_cursor.fetchall.side_effect = lambda: [
+            self.hydrate(row)
+            for row in self.mock_cursor.fetchall.return_value
+        ]
         self.mock_conn = MagicMock()
         self.mock_conn.__enter__.return_value.cursor.return_value = (
             self.mock_cursor
         )
 
+        close_all_connections()
         patcher = patch(
-            "lib.db.purchase.sqlite3.connect", return_value=self.mock_conn
+            "lib.db.pool.sqlite3.connect", return_value=self.mock_conn
         )
         self.mock_connect = patcher.start()
         self.addCleanup(patcher.stop)
 
         self.repo = PurchaseRepository(db_path=Path("/fake/path.db"))
 
+    def hydrate(self, row):
+        factory = self.mock_cursor.row_factory
+        return factory(self.mock_cursor, row) if factory and row else row
+
     def test_connect(self):
-        with patch("lib.db.purchase.sqlite3.connect") as mock_connect:
-            self.repo._connect()
-        mock_connect.assert_called_once_with(self.repo.db_path)
+        with patch("lib.db.pool.sqlite3.connect") as mock_connect:
+            first = self.repo._connect()
+            second = self.repo._connect()
+        mock_connect.assert_called_once_with(
+            self.repo.db_path, check_same_thread=False
+        )
+        self.assertIs(first, second)
 
     def test_create(self):
         test_cases = get_test_data(f"{DATA_DIR}/create.txt")
@@ -62,7 +141,7 @@ class TestPurchaseRepository(TestCase):
                     args = [
                         "supplier_id, supplier_name, supplier_invoice_code, internal_invoice_number, net_amount, vat_percent, goods, utilities, motor_expenses, sundries, miscellaneous, payment_method, timestamp, capital_spend",
                         "(?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
-                        (*list(params.values())[1:],),
+                        (*list(stored(params).values())[1:],),
                     ]
                     expected = Purchase(
                         self.mock_cursor.lastrowid, *list(params.values())[1:]
@@ -71,7 +150,7 @@ class TestPurchaseRepository(TestCase):
                     args = [
                         "id, supplier_id, supplier_name, supplier_invoice_code, internal_invoice_number, net_amount, vat_percent, goods, utilities, motor_expenses, sundries, miscellaneous, payment_method, timestamp, capital_spend",
                         "(?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
-                        (*params.values(),),
+                        (*stored(params).values(),),
                     ]
                 purchase = Purchase(**params)
                 result = self.repo.create(purchase)
@@ -97,9 +176,12 @@ class TestPurchaseRepository(TestCase):
         for params in test_cases:
             self.setUp()
             with self.subTest(params=params):
-                self.mock_cursor.fetchone.return_value = list(params.values())
+                self.mock_cursor.fetchone.return_value = list(
+                    stored(params).values()
+                )
                 result = self.repo.read(params["id"])
                 self.assertIsInstance(result, Purchase)
+                self.assertEqual(result, Purchase(**params))
                 self.assertEqual(result.id, params["id"])
                 self.assertEqual(
                     result.internal_invoice_number,
@@ -157,7 +239,10 @@ class TestPurchaseRepository(TestCase):
                     assert f"{key} = ?" in query
                 assert "WHERE id = ?" in query
 
-                assert query_data == (*list(params.values())[1:], params["id"])
+                assert query_data == (
+                    *list(stored(params).values())[1:],
+                    params["id"],
+                )
                 self.assertEqual(result, purchase)
                 mock_read.assert_called_once_with(purchase.id)
 
@@ -196,13 +281,13 @@ class TestPurchaseRepository(TestCase):
                     "Test Supplier",
                     "SUP-INV",
                     "INT-INV",
-                    142.50,
-                    "20%",
-                    100.0,
-                    20.0,
-                    15.0,
-                    5.0,
-                    2.5,
+                    14250,
+                    2000,
+                    10000,
+                    2000,
+                    1500,
+                    500,
+                    250,
                     "Bank",
                     "2024-01-15 10:30:00",
                     1,
@@ -214,6 +299,8 @@ class TestPurchaseRepository(TestCase):
                 self.assertEqual(len(results), 1)
                 self.assertIsInstance(results[0], Purchase)
                 self.assertEqual(results[0].supplier_name, "Test Supplier")
+                self.assertEqual(results[0].net_amount, 142.5)
+                self.assertEqual(results[0].miscellaneous, 2.5)
 
                 query, args = self.mock_cursor.execute.call_args.args
 
@@ -248,19 +335,19 @@ class TestPurchaseRepository(TestCase):
                         values = params[field]
                         if "eq" in values:
                             self.assertIn(f"{field_name} = ?", query)
-                            self.assertIn(values["eq"], args)
+                            self.assertIn(to_pence(values["eq"]), args)
                         else:
                             if "min" in values:
                                 self.assertIn(f"{field_name} >= ?", query)
-                                self.assertIn(values["min"], args)
+                                self.assertIn(to_pence(values["min"]), args)
                             if "max" in values:
                                 self.assertIn(f"{field_name} <= ?", query)
-                                self.assertIn(values["max"], args)
+                                self.assertIn(to_pence(values["max"]), args)
 
                 if "vat" in params:
                     self.assertIn("vat_percent IN", query)
                     for val in params["vat"]:
-                        self.assertIn(val, args)
+                        self.assertIn(to_basis_points(val), args)
 
                 if "payment" in params:
                     self.assertIn("payment_method IN", query)
@@ -279,6 +366,49 @@ class TestPurchaseRepository(TestCase):
                     self.assertIn("capital_spend >= ?", query)
                     self.assertIn(int(params["capital_spend"] == "True"), args)
 
+    def test_facets(self):
+        _facet_cache.clear()
+        vat_rows = [(0, 2), (2000, 3)]
+        payment_rows = [("BACS", 4), ("Cash", 1)]
+        self.mock_cursor.fetchall.side_effect = [vat_rows, payment_rows]
+        filters = {"vat": [0.2], "payment": ["BACS"], "supplier": "acme"}
+
+        result = self.repo.facets(filters)
+
+        self.assertEqual(
+            result,
+            {
+                "vat_percent": [(0.0, 2), (0.2, 3)],
+                "payment_method": payment_rows,
+            },
+        )
+        vat_query, vat_params = self.mock_cursor.execute.call_args_list[
+            0
+        ].args
+        self.assertIn("GROUP BY vat_percent", vat_query)
+        self.assertNotIn("vat_percent IN", vat_query)
+        self.assertIn("payment_method IN", vat_query)
+        self.assertIn("BACS", vat_params)
+        payment_query, payment_params = (
+            self.mock_cursor.execute.call_args_list[1].args
+        )
+        self.assertIn("GROUP BY payment_method", payment_query)
+        self.assertIn("vat_percent IN", payment_query)
+        self.assertNotIn("payment_method IN", payment_query)
+        self.assertIn("%acme%", payment_params)
+
+    def test_facets_cached_until_write(self):
+        _facet_cache.clear()
+        self.mock_cursor.fetchall.return_value = [(2000, 1)]
+        first = self.repo.facets({})
+        second = self.repo.facets({})
+        self.assertIs(first, second)
+        self.assertEqual(self.mock_cursor.execute.call_count, 2)
+
+        bump_generation(self.repo.db_path)
+        self.repo.facets({})
+        self.assertEqual(self.mock_cursor.execute.call_count, 4)
+
     def test_search_by_parent_purchase(self):
         test_cases = get_test_data(f"{DATA_DIR}/search_by_parent.txt")
         for params in test_cases:
@@ -288,12 +418,10 @@ class TestPurchaseRepository(TestCase):
                 purchases = params["purchases"]
                 supplier = MagicMock(**supplier_params)
 
-                with patch.object(
-                    self.mock_cursor,
-                    "fetchall",
-                    return_value=[list(p.values()) for p in purchases],
-                ) as mock_fetchall:
-                    result = self.repo.search_by_parent(supplier)
+                self.mock_cursor.fetchall.return_value = [
+                    list(stored(p).values()) for p in purchases
+                ]
+                result = self.repo.search_by_parent(supplier)
 
                 exec_call = self.mock_cursor.execute.call_args_list[0]
                 query = exec_call.args[0]
@@ -308,7 +436,7 @@ class TestPurchaseRepository(TestCase):
 
                 assert query_data == (supplier_params["id"],)
                 self.assertEqual(result, [Purchase(**p) for p in purchases])
-                mock_fetchall.assert_called_once()
+                self.mock_cursor.fetchall.assert_called_once()
 
     def test_all(self):
         test_cases = get_test_data(f"{DATA_DIR}/all.txt")
@@ -316,7 +444,7 @@ class TestPurchaseRepository(TestCase):
             self.setUp()
             with self.subTest(params=params):
                 purchases = params["purchases"]
-                rows = [(*list(purchase.values()),) for purchase in purchases]
+                rows = [(*stored(purchase).values(),) for purchase in purchases]
                 self.mock_cursor.fetchall.return_value = rows
                 result = self.repo.all()
                 exec_call_arg = self.mock_cursor.execute.call_args_list[
@@ -341,6 +469,5 @@ class TestPurchaseRepository(TestCase):
                 assert "timestamp" in exec_call_arg
                 assert "FROM purchases" in exec_call_arg
                 self.assertEqual(
-                    result,
-                    [Purchase(*purchase_args) for purchase_args in rows],
+                    result, [Purchase(**purchase) for purchase in purchases]
                 )
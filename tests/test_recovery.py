@@ -0,0 +1,251 @@
+import json
+import sqlite3
+import pytest
+from unittest.mock import patch
+from lib.db.customer import Customer, CustomerRepository
+from lib.db.recovery import *
+from lib.db.sale import Sale, SaleRepository
+from tests.data_utils import count, create_db
+
+
+@pytest.fixture
+def db_path(db_path):
+    customers = CustomerRepository(db_path)
+    customers.create_many([Customer(None, "Acme"), Customer(None, "Beta")])
+    SaleRepository(db_path).create_many(
+        Sale(
+            None,
+            1 + n % 2,
+            "Acme" if n % 2 == 0 else "Beta",
+            f"INV-{n:04d}",
+            10.0 + n,
+            0.2,
+            "Card",
+            "2024-01-01",
+        )
+        for n in range(10)
+    )
+    return db_path
+
+
+@pytest.fixture
+def journal(db_path, tmp_dir):
+    return RecoveryJournal(db_path, tmp_dir / "recovery" / "journal.db")
+
+
+def journal_rows(journal):
+    conn = sqlite3.connect(journal.journal_path)
+    rows = conn.execute(
+        "SELECT batch_id, table_name, record_id, payload, deleted_at "
+        "FROM deleted_records ORDER BY id"
+    ).fetchall()
+    conn.close()
+    return rows
+
+
+def test_delete_transaction_journals_stored_row(journal, db_path):
+    batch = journal.delete_transaction("sales", 3)
+
+    assert SaleRepository(db_path).read(3) is None
+    ((row_batch, table, record_id, payload, _),) = journal_rows(journal)
+    assert (row_batch, table, record_id) == (batch.batch_id, "sales", 3)
+    assert batch.record == json.loads(payload)
+    assert batch.cascaded == 0
+    assert json.loads(payload) == {
+        "id": 3,
+        "customer_id": 1,
+        "customer_name": "Acme",
+        "invoice_number": "INV-0002",
+        "net_amount": 1200,
+        "vat_percent": 2000,
+        "payment_method": "Card",
+        "timestamp": "2024-01-01 00:00:00",
+    }
+
+
+def test_delete_entity_journals_its_transactions(journal, db_path):
+    batch = journal.delete_entity("customers", 2)
+
+    assert batch.record == {"id": 2, "name": "Beta"}
+    assert batch.cascaded == 5
+    rows = journal_rows(journal)
+    assert {row[0] for row in rows} == {batch.batch_id}
+    assert [(row[1], row[2]) for row in rows] == [
+        ("customers", 2),
+        ("sales", 2),
+        ("sales", 4),
+        ("sales", 6),
+        ("sales", 8),
+        ("sales", 10),
+    ]
+    assert CustomerRepository(db_path).read(id=2) is None
+    assert count(db_path, "sales") == 5
+
+
+def test_delete_missing_record(journal):
+    assert journal.delete_transaction("sales", 99) is None
+    assert journal.delete_entity("customers", 99) is None
+    assert journal_rows(journal) == []
+
+
+def test_unknown_table(journal):
+    with pytest.raises(ValueError):
+        journal.delete_transaction("customers", 1)
+    with pytest.raises(ValueError):
+        journal.delete_entity("sales", 1)
+
+
+def test_failed_delete_keeps_live_rows_and_journal(journal, db_path):
+    conn = sqlite3.connect(db_path)
+    conn.execute(
+        "CREATE TRIGGER block_delete BEFORE DELETE ON customers "
+        "BEGIN SELECT RAISE(ABORT, 'blocked'); END"
+    )
+    conn.commit()
+    conn.close()
+
+    with pytest.raises(sqlite3.IntegrityError):
+        journal.delete_entity("customers", 1)
+
+    assert journal_rows(journal) == []
+    assert count(db_path, "sales") == 10
+    assert count(db_path, "customers") == 2
+
+
+def test_failed_commit_removes_journaled_batch(journal, db_path):
+    class FailingCommit:
+        def __init__(self, conn):
+            self.conn = conn
+
+        def __getattr__(self, name):
+            return getattr(self.conn, name)
+
+        def commit(self):
+            self.conn.rollback()
+            raise sqlite3.OperationalError("disk I/O error")
+
+    connect = journal._connect
+    with patch.object(journal, "_connect", lambda: FailingCommit(connect())):
+        with pytest.raises(sqlite3.OperationalError):
+            journal.delete_entity("customers", 1)
+
+    assert journal_rows(journal) == []
+    assert count(db_path, "sales") == 10
+    assert count(db_path, "customers") == 2
+
+
+def test_journal_is_append_only(journal):
+    journal.delete_transaction("sales", 1)
+    conn = sqlite3.connect(journal.journal_path)
+    with pytest.raises(sqlite3.IntegrityError):
+        conn.execute("UPDATE deleted_records SET record_id = 2")
+    conn.close()
+
+
+def test_purge_removes_old_records(journal):
+    with patch("lib.db.recovery.datetime") as mock_datetime:
+        mock_datetime.now.return_value = datetime(2024, 1, 1, 12, 0, 0)
+        journal.delete_transaction("sales", 1)
+    journal.delete_transaction("sales", 2)
+
+    assert journal.purge(older_than_days=30) == 1
+    assert [row[2] for row in journal_rows(journal)] == [2]
+
+
+def test_restore_entity_with_transactions(journal, db_path):
+    deleted = journal.delete_entity("customers", 2)
+
+    assert [b.batch_id for b in journal.recoverable()] == [deleted.batch_id]
+    restored = journal.restore(deleted.batch_id)
+
+    assert restored.label == "Beta"
+    assert restored.cascaded == 5
+    assert CustomerRepository(db_path).read(id=2) == Customer(2, "Beta")
+    sale = SaleRepository(db_path).read(4)
+    assert (sale.customer_id, sale.net_amount, sale.vat_percent) == (
+        2,
+        13.0,
+        0.2,
+    )
+    assert count(db_path, "sales") == 10
+    assert journal.recoverable() == []
+    with pytest.raises(ValueError):
+        journal.restore(deleted.batch_id)
+
+
+def test_restore_detects_conflicts_up_front(journal, db_path):
+    deleted = journal.delete_entity("customers", 1)
+    CustomerRepository(db_path).create(Customer(None, "Acme"))
+    SaleRepository(db_path).create(
+        Sale(1, 2, "Beta", "NEW-1", 1.0, 0.2, "Card", "2024-01-01")
+    )
+
+    with pytest.raises(RestoreConflictError) as exc_info:
+        journal.restore(deleted.batch_id)
+
+    assert sorted(exc_info.value.conflicts) == [
+        ("customers", 1, "name"),
+        ("sales", 1, "id"),
+    ]
+    assert count(db_path, "sales") == 6
+    assert [b.batch_id for b in journal.recoverable()] == [deleted.batch_id]
+
+
+def test_restore_unknown_batch(journal):
+    assert journal.restore("missing") is None
+
+
+def test_recoverable_lists_newest_first(journal):
+    first = journal.delete_transaction("sales", 1)
+    second = journal.delete_entity("customers", 2)
+
+    batches = journal.recoverable()
+    assert [(b.batch_id, b.table, b.cascaded) for b in batches] == [
+        (second.batch_id, "customers", 5),
+        (first.batch_id, "sales", 0),
+    ]
+    assert batches[1].label == "INV-0000"
+
+
+def test_delete_and_restore_invalidate_entity_lookup(journal, db_path):
+    customers = CustomerRepository(db_path)
+    assert customers.lookup(name="Beta") == Customer(2, "Beta")
+
+    deleted = journal.delete_entity("customers", 2)
+    assert customers.lookup(name="Beta") is None
+
+    journal.restore(deleted.batch_id)
+    assert customers.lookup(id=2) == Customer(2, "Beta")
+
+
+def test_import_legacy_backups(journal, db_path, tmp_dir):
+    recovery_dir = tmp_dir / "recovery"
+    recovery_dir.mkdir(exist_ok=True)
+    legacy_path = recovery_dir / "20240102_030405.db"
+    conn = sqlite3.connect(create_db(legacy_path, migrated=False))
+    conn.execute("INSERT INTO customers VALUES (3, 'Gamma')")
+    conn.execute(
+        "INSERT INTO sales VALUES "
+        "(11, 3, 'Gamma', 'OLD-1', 12.34, 0.175, 'Cash', '2023-06-01 00:00:00')"
+    )
+    conn.commit()
+    conn.close()
+    (recovery_dir / "notes.db").touch()
+
+    assert journal.import_legacy_backups(recovery_dir) == 1
+    assert not legacy_path.exists()
+    assert (recovery_dir / "notes.db").exists()
+    [batch] = journal.recoverable()
+    assert (batch.table, batch.deleted_at) == (
+        "customers",
+        "2024-01-02 03:04:05",
+    )
+
+    journal.restore(batch.batch_id)
+    assert CustomerRepository(db_path).read(id=3) == Customer(3, "Gamma")
+    sale = SaleRepository(db_path).read(11)
+    assert (sale.invoice_number, sale.net_amount, sale.vat_percent) == (
+        "OLD-1",
+        12.34,
+        0.175,
+    )
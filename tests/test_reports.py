@@ -0,0 +1,113 @@
+import pytest
+from lib.db.purchase import PurchaseRepository
+from lib.db.reports import *
+from lib.db.sale import SaleRepository
+from tests.data_utils import make_purchase, make_sale
+
+
+@pytest.fixture
+def sales(db_path):
+    SaleRepository(db_path).create_many(
+        [
+            make_sale(1, 0.1, 0.2, "2024-01-05 09:00:00"),
+            make_sale(2, 0.2, 0.2, "2024-01-31 23:59:59"),
+            make_sale(3, 10.05, 0.05, "2024-02-01 00:00:00"),
+            make_sale(4, 100.0, 0.0, "2024-04-15 12:00:00"),
+            make_sale(5, 50.0, 0.2, "2025-01-01 08:00:00"),
+        ]
+    )
+    return db_path
+
+
+def test_sales_by_month(sales):
+    summaries = summarize("sales", "month", db_path=sales)
+
+    assert [s.period for s in summaries] == [
+        "2024-01",
+        "2024-02",
+        "2024-04",
+        "2025-01",
+    ]
+    january = summaries[0]
+    assert january.count == 2
+    assert january.net == 30
+    assert january.vat == 6
+    assert january.gross == 36
+    assert january.categories == {}
+    # VAT is rounded per transaction: 10.05 * 5% = 50.25p -> 50p
+    assert summaries[1].vat == 50
+
+
+def test_sales_by_quarter_and_year(sales):
+    quarters = summarize("Sales", "quarter", db_path=sales)
+    assert [(s.period, s.count) for s in quarters] == [
+        ("2024-Q1", 3),
+        ("2024-Q2", 1),
+        ("2025-Q1", 1),
+    ]
+
+    years = summarize("sales", "year", db_path=sales)
+    assert [(s.period, s.net) for s in years] == [
+        ("2024", 11035),
+        ("2025", 5000),
+    ]
+
+
+def test_date_range_includes_whole_end_day(sales):
+    summaries = summarize(
+        "sales", "day", "2024-01-06", "2024-01-31", db_path=sales
+    )
+
+    assert [(s.period, s.net) for s in summaries] == [("2024-01-31", 20)]
+
+
+def test_purchase_categories(db_path):
+    PurchaseRepository(db_path).create_many(
+        [
+            make_purchase(1, 10.0, 2.5, "2024-03-01"),
+            make_purchase(2, 5.0, 0.0, "2024-03-20"),
+        ]
+    )
+
+    (march,) = summarize("purchases", "month", db_path=db_path)
+
+    assert march.net == 1750
+    assert march.vat == 350
+    assert march.categories == {
+        "goods": 1500,
+        "utilities": 0,
+        "motor_expenses": 0,
+        "sundries": 250,
+        "miscellaneous": 0,
+    }
+    assert march.to_dict()["categories"]["sundries"] == 2.5
+
+
+def test_total_and_to_dict(sales):
+    grand_total = total(summarize("sales", "month", db_path=sales))
+
+    assert grand_total.period == "total"
+    assert grand_total.count == 5
+    assert grand_total.to_dict() == {
+        "period": "total",
+        "count": 5,
+        "net": 160.35,
+        "vat": 10.56,
+        "gross": 170.91,
+    }
+
+
+def test_empty_database(db_path):
+    summaries = summarize("purchases", "year", db_path=db_path)
+
+    assert summaries == []
+    assert total(summaries).gross == 0
+
+
+@pytest.mark.parametrize(
+    "transaction_name, period",
+    [("customers", "month"), ("sales", "week")],
+)
+def test_invalid_arguments(db_path, transaction_name, period):
+    with pytest.raises(ValueError):
+        summarize(transaction_name, period, db_path=db_path)
@@ -5,11 +5,22 @@ from unittest.mock import MagicMock, patch
 from unittest import TestCase
 from tests.data_utils import get_test_data
 from lib.db.sale import *
-
+from lib.db.sale import _facet_cache, _result_cache
+from lib.db.money import to_basis_points, to_pence
+from lib.db.pool import close_all_connections
 
 DATA_DIR = f"{os.path.dirname(__file__)}/data/db.sale"
 
 
+def stored(params: dict) -> dict:
+    """The values stored for a sale: money in pence and VAT in basis points."""
+    return {
+        **params,
+        "net_amount": to_pence(params["net_amount"]),
+        "vat_percent": to_basis_points(params["vat_percent"]),
+    }
+
+
 class TestSale(TestCase):
     def test_init_eq_repr(self):
         test_cases = get_test_data(f"{DATA_DIR}/Sale.txt")
@@ -27,27 +38,57 @@ class TestSale(TestCase):
                     f"Sale(id={params['id']}, invoice_number='{params['invoice_number']}', customer_name='{params['customer_name']}')",
                 )
 
+    def test_from_row(self):
+        test_cases = get_test_data(f"{DATA_DIR}/Sale.txt")
+        for params in test_cases:
+            with self.subTest(params=params):
+                sale = Sale.from_row(tuple(stored(params).values()))
+                self.assertEqual(sale, Sale(**params))
+                self.assertFalse(hasattr(sale, "__dict__"))
+
+    def test_unknown_attribute(self):
+        sale = Sale(1, 1, "Acme", "INV-1", 1.0, 0.2, "Card", "2024-01-01")
+        with self.assertRaises(AttributeError):
+            sale.notes = "not a sale field"
+
 
 class TestSaleRepository(TestCase):
     def setUp(self):
         self.mock_cursor = MagicMock()
+        # Like sqlite3, the fetched rows go through the cursor's row_factory
+        self.mock_cursor.row_factory = None
+        self.mock_cursor.fetchone.side_effect = lambda: self.hydrate(
+            self.mock_cursor.fetchone.return_value
+        )
+        self.mock_cursor.fetchall.side_effect = lambda: [
+            self.hydrate(row) for row in self.mock_cursor.fetchall.return_value
+        ]
         self.mock_conn = MagicMock()
         self.mock_conn.__enter__.return_value.cursor.return_value = (
             self.mock_cursor
         )
 
+        close_all_connections()
         patcher = patch(
-            "lib.db.sale.sqlite3.connect", return_value=self.mock_conn
+            "lib.db.pool.sqlite3.connect", return_value=self.mock_conn
         )
         self.mock_connect = patcher.start()
         self.addCleanup(patcher.stop)
 
         self.repo = SaleRepository(db_path=Path("/fake/path.db"))
 
+    def hydrate(self, row):
+        factory = self.mock_cursor.row_factory
+        return factory(self.mock_cursor, row) if factory and row else row
+
     def test_connect(self):
-        with patch("lib.db.sale.sqlite3.connect") as mock_connect:
-            self.repo._connect()
-        mock_connect.assert_called_once_with(self.repo.db_path)
+        with patch("lib.db.pool.sqlite3.connect") as mock_connect:
+            first = self.repo._connect()
+            second = self.repo._connect()
+        mock_connect.assert_called_once_with(
+            self.repo.db_path, check_same_thread=False
+        )
+        self.assertIs(first, second)
 
     def test_create(self):
         test_cases = get_test_data(f"{DATA_DIR}/create.txt")
@@ -59,7 +100,7 @@ class TestSaleRepository(TestCase):
                     args = [
                         "(customer_id, customer_name, invoice_number, net_amount, vat_percent, payment_method, timestamp)",
                         "(?, ?, ?, ?, ?, ?, ?)",
-                        (*list(params.values())[1:],),
+                        (*list(stored(params).values())[1:],),
                     ]
                     expected = Sale(
                         self.mock_cursor.lastrowid, *list(params.values())[1:]
@@ -68,7 +109,7 @@ class TestSaleRepository(TestCase):
                     args = [
                         "(id, customer_id, customer_name, invoice_number, net_amount, vat_percent, payment_method, timestamp)",
                         "(?, ?, ?, ?, ?, ?, ?, ?)",
-                        (*params.values(),),
+                        (*stored(params).values(),),
                     ]
                 sale = Sale(**params)
                 result = self.repo.create(sale)
@@ -91,7 +132,9 @@ class TestSaleRepository(TestCase):
         for params in test_cases:
             self.setUp()
             with self.subTest(params=params):
-                self.mock_cursor.fetchone.return_value = list(params.values())
+                self.mock_cursor.fetchone.return_value = list(
+                    stored(params).values()
+                )
                 [
                     6,
                     203,
@@ -103,6 +146,7 @@ class TestSaleRepository(TestCase):
                 ]
                 result = self.repo.read(params["id"])
                 self.assertIsInstance(result, Sale)
+                self.assertEqual(result, Sale(**params))
                 self.assertEqual(result.id, params["id"])
                 self.assertEqual(
                     result.invoice_number, params["invoice_number"]
@@ -138,7 +182,10 @@ class TestSaleRepository(TestCase):
                     assert f"{key} = ?" in query
                 assert "WHERE id = ?" in query
 
-                assert query_data == (*list(params.values())[1:], params["id"])
+                assert query_data == (
+                    *list(stored(params).values())[1:],
+                    params["id"],
+                )
                 self.assertEqual(result, sale)
                 mock_read.assert_called_once_with(sale.id)
 
@@ -176,8 +223,8 @@ class TestSaleRepository(TestCase):
                     2001,
                     "Test Customer",
                     "INV-TEST",
-                    123.45,
-                    "20%",
+                    12345,
+                    2000,
                     "Card",
                     "2024-01-15 10:30:00",
                 )
@@ -189,6 +236,8 @@ class TestSaleRepository(TestCase):
                 self.assertEqual(len(results), 1)
                 self.assertIsInstance(results[0], Sale)
                 self.assertEqual(results[0].customer_name, "Test Customer")
+                self.assertEqual(results[0].net_amount, 123.45)
+                self.assertEqual(results[0].vat_percent, 0.2)
 
                 # Validate query and parameters
                 query, params = self.mock_cursor.execute.call_args.args
@@ -205,18 +254,18 @@ class TestSaleRepository(TestCase):
                     net = params["net"]
                     if "eq" in net:
                         self.assertIn("net_amount = ?", query)
-                        self.assertIn(net["eq"], params)
+                        self.assertIn(to_pence(net["eq"]), params)
                     else:
                         if "min" in net:
                             self.assertIn("net_amount >= ?", query)
-                            self.assertIn(net["min"], params)
+                            self.assertIn(to_pence(net["min"]), params)
                         if "max" in net:
                             self.assertIn("net_amount <= ?", query)
-                            self.assertIn(net["max"], params)
+                            self.assertIn(to_pence(net["max"]), params)
 
                 if "vat" in params:
                     for val in params["vat"]:
-                        self.assertIn(val, params)
+                        self.assertIn(to_basis_points(val), params)
                     self.assertIn("vat_percent IN", query)
 
                 if "payment" in params:
@@ -234,6 +283,62 @@ class TestSaleRepository(TestCase):
                     self.assertIn("timestamp <= ?", query)
                     self.assertIn(normalize_datetime(params["timeTo"]), params)
 
+    def test_facets(self):
+        _facet_cache.clear()
+        vat_rows = [(0, 2), (2000, 3)]
+        payment_rows = [("BACS", 4), ("Cash", 1)]
+        self.mock_cursor.fetchall.side_effect = [vat_rows, payment_rows]
+        filters = {"vat": [0.2], "payment": ["BACS"], "customer": "acme"}
+
+        result = self.repo.facets(filters)
+
+        self.assertEqual(
+            result,
+            {
+                "vat_percent": [(0.0, 2), (0.2, 3)],
+                "payment_method": payment_rows,
+            },
+        )
+        vat_query, vat_params = self.mock_cursor.execute.call_args_list[0].args
+        self.assertIn("GROUP BY vat_percent", vat_query)
+        self.assertNotIn("vat_percent IN", vat_query)
+        self.assertIn("payment_method IN", vat_query)
+        self.assertIn("BACS", vat_params)
+        payment_query, payment_params = (
+            self.mock_cursor.execute.call_args_list[1].args
+        )
+        self.assertIn("GROUP BY payment_method", payment_query)
+        self.assertIn("vat_percent IN", payment_query)
+        self.assertNotIn("payment_method IN", payment_query)
+        self.assertIn("%acme%", payment_params)
+        self.assertIn(2000, payment_params)
+
+    def test_facets_cached_until_write(self):
+        _facet_cache.clear()
+        self.mock_cursor.fetchall.return_value = [(2000, 1)]
+        first = self.repo.facets({})
+        second = self.repo.facets({})
+        self.assertIs(first, second)
+        self.assertEqual(self.mock_cursor.execute.call_count, 2)
+
+        bump_generation(self.repo.db_path)
+        self.repo.facets({})
+        self.assertEqual(self.mock_cursor.execute.call_count, 4)
+
+    def test_cached_search_returns_new_models(self):
+        _result_cache.clear()
+        self.mock_cursor.fetchall.return_value = [
+            (1, 2001, "Acme", "INV-1", 12345, 2000, "Card", "2024-01-15")
+        ]
+        first = self.repo.search({"invoice": "INV"})
+        first[0].customer_name = "Changed"
+        second = self.repo.search({"invoice": "INV"})
+
+        self.assertIsNot(first[0], second[0])
+        self.assertEqual(second[0].customer_name, "Acme")
+        self.assertEqual(second[0].net_amount, 123.45)
+        self.assertEqual(self.mock_cursor.fetchall.call_count, 1)
+
     def test_search_by_parent(self):
         test_cases = get_test_data(f"{DATA_DIR}/search_by_parent.txt")
         for params in test_cases:
@@ -242,12 +347,10 @@ class TestSaleRepository(TestCase):
                 customer_params = params["customer"]
                 sales = params["sales"]
                 customer = MagicMock(**customer_params)
-                with patch.object(
-                    self.mock_cursor,
-                    "fetchall",
-                    return_value=[list(sale.values()) for sale in sales],
-                ) as mock_fetchall:
-                    result = self.repo.search_by_parent(customer)
+                self.mock_cursor.fetchall.return_value = [
+                    list(stored(sale).values()) for sale in sales
+                ]
+                result = self.repo.search_by_parent(customer)
 
                 exec_call = self.mock_cursor.execute.call_args_list[0]
                 query = exec_call.args[0]
@@ -262,7 +365,7 @@ class TestSaleRepository(TestCase):
 
                 assert query_data == (customer_params["id"],)
                 self.assertEqual(result, [Sale(**sale) for sale in sales])
-                mock_fetchall.assert_called_once()
+                self.mock_cursor.fetchall.assert_called_once()
 
     def test_all(self):
         test_cases = get_test_data(f"{DATA_DIR}/all.txt")
@@ -270,7 +373,7 @@ class TestSaleRepository(TestCase):
             self.setUp()
             with self.subTest(params=params):
                 sales = params["sales"]
-                rows = [(*list(sale.values()),) for sale in sales]
+                rows = [(*stored(sale).values(),) for sale in sales]
                 self.mock_cursor.fetchall.return_value = rows
                 result = self.repo.all()
                 exec_call_arg = self.mock_cursor.execute.call_args_list[
@@ -288,7 +391,4 @@ class TestSaleRepository(TestCase):
                     assert f"{i}," in exec_call_arg
                 assert "timestamp" in exec_call_arg
                 assert "FROM sales" in exec_call_arg
-                self.assertEqual(
-                    result,
-                    [Sale(*sale_args) for sale_args in rows],
-                )
+                self.assertEqual(result, [Sale(**sale) for sale in sales])